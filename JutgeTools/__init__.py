@@ -1,9 +1,17 @@
 __all__ = [
+    'bench',
     'compilef',
+    'complexity',
     'debug',
     'download',
     'genconfig',
+    'minimize',
+    'pipeline',
+    'profiler',
+    'serve',
     'shrc',
     'skel',
-    'test'
+    'stress',
+    'test',
+    'test_all'
 ]
@@ -0,0 +1,93 @@
+import hashlib
+import json
+import os
+import re
+import threading
+from pathlib import Path
+from .memo import FileMemo
+
+CACHE_FILE = '.build_cache'
+
+_LOCAL_INCLUDE = re.compile(rb'^\s*#\s*include\s*"([^"]+)"', re.MULTILINE)
+
+# Builds of several profiles may record at the same time
+_record_lock = threading.Lock()
+
+_digests = FileMemo('digest')
+_includes = FileMemo('local_includes')
+
+def _digest(path):
+    with open(path, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+def file_digest(path):
+    return _digests.get(path, _digest)
+
+def _scan_includes(path):
+    with open(path, 'rb') as f:
+        return [m.group(1).decode('utf-8', 'replace')
+                for m in _LOCAL_INCLUDE.finditer(f.read())]
+
+# Local (quoted) headers reachable from sources, sorted
+def local_headers(sources):
+    seen = set()
+    pending = [Path(s).resolve() for s in sources]
+    headers = set()
+    while pending:
+        current = pending.pop()
+        if current in seen:
+            continue
+        seen.add(current)
+        try:
+            includes = _includes.get(current, _scan_includes)
+        except OSError:
+            continue
+        for include in includes:
+            header = current.parent / include
+            if header.is_file():
+                header = header.resolve()
+                headers.add(header)
+                pending.append(header)
+    return sorted(headers)
+
+def build_key(command, sources, flags):
+    h = hashlib.sha256()
+    h.update(command.encode('utf-8'))
+    h.update(b'\0')
+    h.update(' '.join(flags).encode('utf-8'))
+    for f in sorted(Path(s).resolve() for s in sources) + \
+            local_headers(sources):
+        h.update(b'\0' + str(f).encode('utf-8') + b'\0')
+        h.update(file_digest(f).encode('ascii'))
+    return h.hexdigest()
+
+def _stamp(output):
+    st = output.stat()
+    return [st.st_size, st.st_mtime]
+
+def _load(cache_file):
+    try:
+        with cache_file.open('r') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def is_fresh(output, key):
+    output = Path(output).resolve()
+    if not output.exists():
+        return False
+    entry = _load(output.parent / CACHE_FILE).get(output.name)
+    # The stamp detects executables rebuilt by hand (e.g.: with p1++)
+    return (entry is not None and entry.get('key') == key and
+            entry.get('stamp') == _stamp(output))
+
+def record(output, key):
+    output = Path(output).resolve()
+    cache_file = output.parent / CACHE_FILE
+    with _record_lock:
+        entries = _load(cache_file)
+        entries[output.name] = {'key': key, 'stamp': _stamp(output)}
+        tmp = cache_file.with_name(cache_file.name + '.tmp')
+        with tmp.open('w') as f:
+            json.dump(entries, f, indent=1, sort_keys=True)
+        os.replace(str(tmp), str(cache_file))
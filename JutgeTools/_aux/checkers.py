@@ -0,0 +1,292 @@
+import math
+import re
+from collections import namedtuple
+from pathlib import Path
+from .errors import CheckerError
+
+EXACT = 'exact'
+TOKENS = 'tokens'
+NUMERIC = 'numeric'
+CHECKERS = (EXACT, TOKENS, NUMERIC)
+DEFAULT_ABS_EPS = 1e-6
+DEFAULT_REL_EPS = 1e-6
+SECTION_PREFIX = 'problem:'
+
+# How the output of a case is compared with the expected one:
+#   exact: byte by byte
+#   tokens: the same whitespace-separated tokens, whatever the whitespace
+#   numeric: like tokens, but numbers may differ by abs_eps or rel_eps
+Checker = namedtuple('Checker', ['name', 'abs_eps', 'rel_eps'])
+EXACT_CHECKER = Checker(EXACT, None, None)
+
+_TOKEN = re.compile(rb'\S+')
+_WHITESPACE = b' \t\n\r\v\f'
+
+def _numbers_equal(abs_eps, rel_eps):
+    def equal(a, b):
+        if a == b:
+            return True
+        try:
+            x, y = float(a), float(b)
+        except ValueError:
+            return False
+        if math.isnan(x) or math.isnan(y):
+            return math.isnan(x) and math.isnan(y)
+        if math.isinf(x) or math.isinf(y):
+            return x == y  # No tolerance makes a finite number infinite
+        diff = abs(x - y)
+        return diff <= abs_eps or diff <= rel_eps * abs(y)
+    return equal
+
+def _token_start(data, end):
+    # Start of the token that goes on at `end` (or `end` after whitespace)
+    start = end
+    while start > 0 and data[start - 1] not in _WHITESPACE:
+        start -= 1
+    return start
+
+class TokenComparator:
+    # Same interface as the exact comparator of runner. While the output is
+    # the same byte by byte it is compared as such, which is much faster;
+    # from the first difference on, both are split into tokens as they come,
+    # keeping only the token that may go on in the next chunk. The expected
+    # output is a mmap (or bytes), so it is never loaded whole either.
+    def __init__(self, expected, window, equal):
+        self.expected = expected
+        self.window = window
+        self.equal = equal
+        self.size = 0
+        self.before = bytearray()  # Tail of the output before the mismatch
+        self.after = bytearray()  # Output from the mismatch onwards
+        self.mismatch = None
+        self.expected_mismatch = None
+        self.newlines = 0  # Lines before the mismatch
+        self._same = True  # Byte for byte the same so far
+        self._pending = b''  # Output not split into tokens yet
+        self._pending_at = 0  # Offset of _pending on the output
+        self._expected_at = None  # Where to look for the next token
+        # Offsets of the last tokens found equal, where the windows start
+        self._last_out = 0
+        self._last_expected = 0
+
+    def feed(self, chunk):
+        if self.mismatch is not None:
+            self.after += chunk[:self.window - len(self.after)]
+        elif self._same:
+            expected = self.expected[self.size:self.size + len(chunk)]
+            if chunk == expected:
+                self._keep(chunk)
+            else:
+                i = 0
+                n = min(len(chunk), len(expected))
+                while i < n and chunk[i] == expected[i]:
+                    i += 1
+                self._keep(chunk[:i])
+                self._split(self.size + i, chunk[i:])
+        else:
+            self._tokens(chunk, False)
+        self.size += len(chunk)
+        return self.mismatch is None or len(self.after) < self.window
+
+    def _keep(self, data):
+        self.newlines += data.count(b'\n')
+        self.before += data
+        if len(self.before) > self.window:
+            del self.before[:len(self.before) - self.window]
+
+    # Go on token by token from the start of the token at `offset`, where
+    # the output (`rest` from there on) stops being the same as the expected
+    # one. The part of the token before it is the same on both.
+    def _split(self, offset, rest):
+        self._same = False
+        start = _token_start(self.expected, offset)
+        prefix = bytes(self.expected[start:offset])  # No newlines in it
+        del self.before[max(len(self.before) - len(prefix), 0):]
+        self._pending_at = start
+        self._last_out = self._last_expected = start
+        self._expected_at = start
+        self._tokens(prefix + rest, False)
+
+    # Offset and value of the next expected token, or None. No match objects
+    # are kept, as they would not let the mmap be closed.
+    def _next_expected(self):
+        m = _TOKEN.search(self.expected, self._expected_at)
+        if m is None:
+            return None
+        self._expected_at = m.end()
+        return m.start(), m.group()
+
+    def _tokens(self, chunk, last):
+        data = self._pending + chunk
+        at = self._pending_at
+        done = 0  # data[:done] is already checked (and kept)
+        for m in _TOKEN.finditer(data):
+            if m.end() == len(data) and not last:
+                break  # It may go on in the next chunk
+            expected = self._next_expected()
+            if expected is None or not self.equal(m.group(), expected[1]):
+                self._keep(data[done:m.start()])
+                self.mismatch = at + m.start()
+                self.expected_mismatch = expected[0] \
+                    if expected is not None else len(self.expected)
+                self.after += data[m.start():m.start() + self.window]
+                return
+            self._keep(data[done:m.end()])
+            done = m.end()
+            self._last_out = at + m.start()
+            self._last_expected = expected[0]
+        # What is left is whitespace, maybe followed by an unfinished token
+        m = _TOKEN.search(data, done)
+        end = m.start() if m is not None else len(data)
+        self._keep(data[done:end])
+        self._pending = data[end:]
+        self._pending_at = at + end
+
+    def finish(self):
+        if self.mismatch is not None:
+            return False
+        if self._same:
+            if self.size == len(self.expected):
+                return True
+            self._split(self.size, b'')  # The output is a prefix of it
+        self._tokens(b'', True)
+        if self.mismatch is None:
+            expected = self._next_expected()
+            if expected is not None:
+                # The output ends before the expected one
+                self.mismatch = self.size
+                self.expected_mismatch = expected[0]
+        return self.mismatch is None
+
+    # The outputs may be spaced differently, so each window starts on its
+    # own line of the last token that was equal on both
+    def windows(self):
+        if self.mismatch is None:
+            return bytes(self.before), b'', 0, False
+        before = bytes(self.before)  # Ends at the mismatch
+        last = max(len(before) - (self.mismatch - self._last_out), 0)
+        line_start = before.rfind(b'\n', 0, last) + 1
+        out = before[line_start:] + bytes(self.after)
+        cor_start = self.expected.rfind(
+            b'\n', max(self._last_expected - self.window, 0),
+            self._last_expected) + 1
+        end = self.expected_mismatch + self.window
+        cor = bytes(self.expected[cor_start:end])
+        out_cut = len(self.after) >= self.window
+        cor_cut = end < len(self.expected)
+        if out_cut:
+            out = out[:out.rfind(b'\n') + 1] or out
+        if cor_cut:
+            cor = cor[:cor.rfind(b'\n') + 1] or cor
+        return (out, cor, self.newlines - before[line_start:].count(b'\n'),
+                out_cut and cor_cut)
+
+# None for the exact comparison, which runner does on its own
+def comparator(checker, expected, window):
+    if checker is None or checker.name == EXACT or expected is None:
+        return None
+    if checker.name == TOKENS:
+        equal = bytes.__eq__
+    else:
+        equal = _numbers_equal(checker.abs_eps, checker.rel_eps)
+    return TokenComparator(expected, window, equal)
+
+def make(name, abs_eps=None, rel_eps=None):
+    if name not in CHECKERS:
+        raise CheckerError('unknown checker "{}" (available: {})'.format(
+            name, ', '.join(CHECKERS)))
+    if name != NUMERIC:
+        return Checker(name, None, None)
+    return Checker(
+        name,
+        DEFAULT_ABS_EPS if abs_eps is None else float(abs_eps),
+        DEFAULT_REL_EPS if rel_eps is None else float(rel_eps)
+    )
+
+def _float(value, what):
+    if value is None:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        raise CheckerError('{} must be a number, not "{}"'.format(what, value))
+
+# The checker settings from the command line or, failing that, from
+# `section` (of a single problem) and then from the defaults of the config
+# file. Those in the section are strings.
+def _settings(config, section=None):
+    settings = {
+        'checker': config.get('checker', EXACT),
+        'abs_eps': config.getfloat('abs_eps'),
+        'rel_eps': config.getfloat('rel_eps')
+    }
+    for key, value in (section or {}).items():
+        if key in settings and config.given(key) is None:
+            settings[key] = value
+    return settings
+
+def _make(settings):
+    return make(settings['checker'],
+                _float(settings['abs_eps'], 'abs_eps'),
+                _float(settings['rel_eps'], 'rel_eps'))
+
+# --checker and the like, or their values on the config file
+def default_checker(config):
+    return _make(_settings(config))
+
+# Checkers set for single problems in the config file, as sections like:
+#
+#   [problem:P12345]
+#   checker = numeric
+#   abs_eps = 1e-4
+#
+# The name may be the whole dir name (P12345_en) or just the ID (P12345).
+# Settings given on the command line (--checker and the like) win over the
+# section; those in neither are taken from the defaults of the file.
+def problem_checkers(config):
+    return {
+        name: _make(_settings(config, section))
+        for name, section in config.sections(SECTION_PREFIX).items()
+    }
+
+def for_problem(directory, problems=None, default=None):
+    problems = problems or {}
+    name = Path(directory).name
+    return problems.get(name, problems.get(name.split('_')[0],
+                                           default or EXACT_CHECKER))
+
+def from_config(config, directory):
+    return for_problem(directory, problem_checkers(config),
+                       default_checker(config))
+
+def describe(checker):
+    if checker.name == NUMERIC:
+        return '{} (abs {:g}, rel {:g})'.format(checker.name, checker.abs_eps,
+                                                checker.rel_eps)
+    return checker.name
+
+def add_checker_arguments(parser):
+    parser.add_argument(
+        '--checker',
+        choices=CHECKERS,
+        help='how to compare the output: {} (byte by byte), {} (ignore'
+             ' spacing) or {} (also accept numbers within --abs-eps or'
+             ' --rel-eps). Single problems may set their own in the config'
+             ' file, as [{}ID], which this option overrides.'
+             ' Default: {}'.format(
+                 EXACT, TOKENS, NUMERIC, SECTION_PREFIX, EXACT)
+    )
+    parser.add_argument(
+        '--abs-eps',
+        type=float,
+        metavar='EPS',
+        help='absolute tolerance of the numeric checker.'
+             ' Default: {:g}'.format(DEFAULT_ABS_EPS)
+    )
+    parser.add_argument(
+        '--rel-eps',
+        type=float,
+        metavar='EPS',
+        help='relative tolerance of the numeric checker.'
+             ' Default: {:g}'.format(DEFAULT_REL_EPS)
+    )
@@ -1,31 +1,46 @@
 import argparse
-import pkg_resources
+import importlib
 import sys
-import os.path
 
-from ..download import _setup_parser as download_sp
-from ..compilef import _setup_parser as compile_sp
-from ..test import _setup_parser as test_sp
-from ..skel import _setup_parser as skel_sp
-from ..shrc import Shells, _setup_parser as shrc_sp
-from ..debug import _setup_parser as debug_sp
-from ..genconfig import _setup_parser as genconfig_sp
-
-from .errors import *
+from .errors import ProcessError
 from .config_file import ConfigFile
+from .commands import COMMANDS, command_name
+
+UNKNOWN_VERSION = '(could not determine version)'
+
+def _version():
+    try:
+        from importlib.metadata import version, PackageNotFoundError
+    except ImportError:
+        # Python < 3.8
+        try:
+            import pkg_resources
+            return pkg_resources.require('jutge-tools')[0].version
+        except Exception:
+            return UNKNOWN_VERSION
+    try:
+        return version('jutge-tools')
+    except PackageNotFoundError:
+        return UNKNOWN_VERSION
+
+class _VersionAction(argparse.Action):
+    # Like action='version', but the version is only looked up when asked for
+    def __init__(self, option_strings, dest=argparse.SUPPRESS,
+                 default=argparse.SUPPRESS, help=None):
+        super().__init__(option_strings=option_strings, dest=dest,
+                         default=default, nargs=0, help=help)
 
-try:
-    version = pkg_resources.require("jutge-tools")[0].version
-except:
-    version = '(could not determine version)'
+    def __call__(self, parser, namespace, values, option_string=None):
+        print('{} {}'.format(parser.prog, _version()))
+        parser.exit()
 
 def main():
     parser = argparse.ArgumentParser(description='Tool for helping with'
                                                  ' Jutge exercices')
     parser.add_argument(
         '--version',
-        action='version',
-        version='%(prog)s {}'.format(version)
+        action=_VersionAction,
+        help="show program's version number and exit"
     )
     parser.add_argument(
         '--config',
@@ -36,27 +51,24 @@ def main():
         title='actions'
     )
 
-    download_parser = download_sp(subparsers)
-    compile_parser = compile_sp(subparsers)
-    test_parser = test_sp(subparsers)
-    debug_parser = debug_sp(subparsers)
-    skel_parser = skel_sp(subparsers)
-    shrc_parser = shrc_sp(subparsers)
-    genconfig_parser = genconfig_sp(subparsers)
+    selected = command_name(sys.argv[1:])
+    command_parser = parser
+    for module, name, aliases, help in COMMANDS:
+        if selected == name or selected in aliases:
+            module = importlib.import_module('..' + module, __package__)
+            command_parser = module._setup_parser(subparsers)
+        else:
+            # Listed on the help, but never parsed
+            subparsers.add_parser(name, aliases=aliases, help=help,
+                                  add_help=False)
 
     args = parser.parse_args()
     if 'action' not in args:
         parser.print_usage()
         return
     config = ConfigFile(args)
-    fn = args.action(config)
     try:
+        fn = args.action(config)
         fn()
-    except DownloadError as ex:
-        download_parser.error(ex)
-    except CompileError as ex:
-        compile_parser.error(ex)
-    except TestError as ex:
-        test_parser.error(ex)
     except ProcessError as ex:
-        parser.error(ex)
+        command_parser.error(ex)
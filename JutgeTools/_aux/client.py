@@ -0,0 +1,81 @@
+import os
+import signal
+import socket
+import sys
+from . import commands, ipc
+
+PROG = 'jutge-tools'
+FORWARDED_SIGNALS = (signal.SIGINT, signal.SIGTERM, signal.SIGHUP,
+                     signal.SIGQUIT)
+
+class _Forwarder:
+    # The command does not run on our process group, so Ctrl-C and friends
+    # have to be passed on. They may come before the server tells which
+    # process runs it: those are kept until then.
+    def __init__(self):
+        self.pid = None
+        self.pending = []
+
+    def __call__(self, signum, frame):
+        if self.pid is None:
+            self.pending.append(signum)
+            return
+        try:
+            os.kill(self.pid, signum)
+        except OSError:
+            pass
+
+    def start(self, pid):
+        self.pid = pid
+        while self.pending:
+            self(self.pending.pop(0), None)
+
+def _run_here():
+    from .cli import main as cli_main
+    return cli_main()
+
+# Entry point of jutge-tools-client: run the command on `serve` if it is
+# running, or in this process otherwise. Kept small (and its imports
+# cheap), because avoiding the startup cost is the whole point.
+def main():
+    sys.argv[0] = PROG
+    if commands.is_interactive(sys.argv[1:]):
+        return _run_here()
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(ipc.socket_path())
+    except OSError:
+        sock.close()
+        return _run_here()
+
+    forwarder = _Forwarder()
+    for signum in FORWARDED_SIGNALS:
+        signal.signal(signum, forwarder)
+    with sock:
+        umask = os.umask(0)
+        os.umask(umask)
+        try:
+            ipc.send_request(sock, {
+                'argv': sys.argv[1:],
+                'cwd': os.getcwd(),
+                'env': dict(os.environ),
+                'umask': umask
+            }, ipc.STDIO)
+            forwarder.start(ipc.recv_int(sock))
+            status = ipc.recv_int(sock)
+        except OSError as ex:
+            print('{}: lost connection to the server: {}'.format(PROG, ex),
+                  file=sys.stderr)
+            status = 1
+    sys.exit(status)
+
+# Ask a running `serve` to exit. Returns False if it was not running.
+def stop_server():
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.connect(ipc.socket_path())
+            ipc.send_request(sock, {'control': 'stop'})
+            ipc.recv_int(sock)
+    except OSError:
+        return False
+    return True
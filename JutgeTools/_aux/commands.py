@@ -0,0 +1,48 @@
+# Subcommands as (module, name, aliases, help). Only the module of the
+# selected subcommand is imported: this runs on every shell alias, so
+# importing all of them (and what they import) on each call adds up. Not in
+# cli.py, so that the client can tell them apart without importing argparse.
+COMMANDS = [
+    ('download', 'download', ['dl'],
+     'download an exercise and its test cases'),
+    ('compilef', 'compile', ['c'],
+     'compile the current exercise, but do not test it'),
+    ('test', 'test', ['t'], 'test the current exercise with the test cases'),
+    ('test_all', 'test-all', ['ta'], 'test every exercise under a dir'),
+    ('pipeline', 'pipeline', [],
+     'download, compile and test several exercises'),
+    ('debug', 'debug', ['dbg'], 'run on a debugger'),
+    ('profiler', 'profile', ['prof'], 'find the hot functions'),
+    ('skel', 'skel', [], 'create a skeleton file structure'),
+    ('shrc', 'shrc', [], 'set up shell for development'),
+    ('genconfig', 'genconfig', [], 'generate or update a config file'),
+    ('bench', 'bench', [], 'benchmark the current exercise'),
+    ('complexity', 'complexity', ['cx'], 'estimate the time complexity'),
+    ('minimize', 'minimize', ['min'], 'shrink a failing test case'),
+    ('serve', 'serve', [], 'run commands from jutge-tools-client faster'),
+    ('stress', 'stress', [],
+     'look for a failing input using a generator and a reference'),
+]
+
+# Subcommands that take over the terminal (e.g. the debugger). The client
+# runs them itself, on the foreground process group of the terminal: on
+# `serve` they would run on its background job, and stop on SIGTTIN.
+INTERACTIVE = ('debug', 'profile')
+
+def command_name(argv):
+    # The first positional argument, skipping the value of --config (which
+    # argparse also accepts abbreviated)
+    args = iter(argv)
+    for arg in args:
+        if arg == '--':
+            return next(args, None)
+        if not arg.startswith('-'):
+            return arg
+        if '=' not in arg and len(arg) > 2 and '--config'.startswith(arg):
+            next(args, None)
+    return None
+
+def is_interactive(argv):
+    selected = command_name(argv)
+    return any(selected == name or selected in aliases
+               for _, name, aliases, _ in COMMANDS if name in INTERACTIVE)
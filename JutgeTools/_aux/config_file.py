@@ -61,6 +61,23 @@ class ConfigFile(MutableMapping):
             ret = self.config.getboolean('DEFAULT', key, fallback=fallback)
         return ret
 
+    # The value given on the command line, or None. For settings that a
+    # section of the file may also set, which it must not override.
+    def given(self, key):
+        return getattr(self.override, key, None)
+
+    # Sections whose name starts with prefix, by name without it. Only the
+    # keys set on each section (not inherited from DEFAULT) are included.
+    def sections(self, prefix=''):
+        defaults = self.config.defaults()
+        return {
+            name[len(prefix):]: {
+                k: v for k, v in self.config[name].items()
+                if k not in defaults or v != defaults[k]
+            }
+            for name in self.config.sections() if name.startswith(prefix)
+        }
+
     def save(self):
         if self.file is not None:
             with self.file.open('w') as cfg:
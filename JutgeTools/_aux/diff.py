@@ -0,0 +1,153 @@
+CONTEXT = 3
+# Beyond this many differing lines the edit script is not worth computing:
+# the rest of the mismatching region is shown as a single replacement
+MAX_EDITS = 1000
+# Removed or added lines shown in a row, at most
+MAX_LINES = 20
+
+def _myers(a, b, max_d):
+    # Myers' O((N+M)D) algorithm. Returns the opcodes, or None if the edit
+    # distance is greater than max_d.
+    n, m = len(a), len(b)
+    offset = max_d + 1
+    v = [0] * (2 * max_d + 3)
+    trace = []
+    for d in range(max_d + 1):
+        for k in range(-d, d + 1, 2):
+            if k == -d or (k != d and v[offset + k - 1] < v[offset + k + 1]):
+                x = v[offset + k + 1]
+            else:
+                x = v[offset + k - 1] + 1
+            y = x - k
+            while x < n and y < m and a[x] == b[y]:
+                x += 1
+                y += 1
+            v[offset + k] = x
+            if x >= n and y >= m:
+                trace.append(v[offset - d:offset + d + 1])
+                return _backtrack(trace, n, m)
+        trace.append(v[offset - d:offset + d + 1])
+    return None
+
+def _backtrack(trace, n, m):
+    ops = []
+    x, y = n, m
+    for d in range(len(trace) - 1, 0, -1):
+        prev = trace[d - 1]  # Diagonals -(d - 1)..(d - 1)
+        k = x - y
+        if k == -d or (k != d and prev[k - 1 + d - 1] < prev[k + 1 + d - 1]):
+            prev_k = k + 1
+        else:
+            prev_k = k - 1
+        prev_x = prev[prev_k + d - 1]
+        prev_y = prev_x - prev_k
+        if x > prev_x and y > prev_y:
+            snake = min(x - prev_x, y - prev_y)
+            ops.append(('equal', x - snake, x, y - snake, y))
+            x -= snake
+            y -= snake
+        if x == prev_x:
+            ops.append(('insert', x, x, prev_y, y))
+        else:
+            ops.append(('delete', prev_x, x, y, y))
+        x, y = prev_x, prev_y
+    if x > 0:
+        ops.append(('equal', 0, x, 0, y))
+    ops.reverse()
+    return _merge(ops)
+
+def _merge(ops):
+    # Join runs of the same tag, and adjacent deletes/inserts into
+    # replacements, like difflib
+    merged = []
+    for op in ops:
+        if merged and (op[0] == merged[-1][0] or
+                       'equal' not in (op[0], merged[-1][0])):
+            tag, i1, _, j1, _ = merged[-1]
+            if tag != op[0]:
+                tag = 'replace'
+            merged[-1] = (tag, i1, op[2], j1, op[4])
+        else:
+            merged.append(op)
+    return merged
+
+def opcodes(a, b, max_edits=MAX_EDITS):
+    # Common prefix and suffix are stripped first, so the cost depends
+    # only on the size of the differing region
+    n, m = len(a), len(b)
+    pre = 0
+    while pre < n and pre < m and a[pre] == b[pre]:
+        pre += 1
+    suf = 0
+    while (suf < n - pre and suf < m - pre and
+           a[n - 1 - suf] == b[m - 1 - suf]):
+        suf += 1
+    middle = _myers(a[pre:n - suf], b[pre:m - suf], max_edits)
+    if middle is None:
+        middle = [('replace', 0, n - suf - pre, 0, m - suf - pre)]
+    ops = []
+    if pre:
+        ops.append(('equal', 0, pre, 0, pre))
+    ops.extend((tag, i1 + pre, i2 + pre, j1 + pre, j2 + pre)
+               for tag, i1, i2, j1, j2 in middle
+               if i1 != i2 or j1 != j2)
+    if suf:
+        ops.append(('equal', n - suf, n, m - suf, m))
+    return _merge(ops)
+
+def _hunks(ops, context):
+    # Same grouping as difflib's get_grouped_opcodes
+    if not ops:
+        return
+    ops = list(ops)
+    if ops[0][0] == 'equal':
+        tag, i1, i2, j1, j2 = ops[0]
+        ops[0] = (tag, max(i1, i2 - context), i2, max(j1, j2 - context), j2)
+    if ops[-1][0] == 'equal':
+        tag, i1, i2, j1, j2 = ops[-1]
+        ops[-1] = (tag, i1, min(i2, i1 + context), j1, min(j2, j1 + context))
+    hunk = []
+    for tag, i1, i2, j1, j2 in ops:
+        if tag == 'equal' and i2 - i1 > 2 * context:
+            hunk.append((tag, i1, min(i2, i1 + context), j1,
+                         min(j2, j1 + context)))
+            yield hunk
+            hunk = []
+            i1, j1 = max(i1, i2 - context), max(j1, j2 - context)
+        hunk.append((tag, i1, i2, j1, j2))
+    if hunk and not (len(hunk) == 1 and hunk[0][0] == 'equal'):
+        yield hunk
+
+# Lines removed or added in a row, each prefixed, but no more than
+# max_lines of them (e.g. a runaway output is one huge block)
+def _block(prefix, lines, max_lines):
+    shown = [prefix + line for line in lines[:max_lines]]
+    if len(lines) > max_lines:
+        shown.append('... {} more lines'.format(len(lines) - max_lines))
+    return shown
+
+# Unified diff of two lists of lines (without line endings). first_line is
+# the number of lines that come before both lists (they may be windows of a
+# bigger output). If both are truncated, a difference at the very end is
+# just where each window was cut, so it is not shown.
+def unified_diff(a, b, from_name, to_name, context=CONTEXT, first_line=0,
+                 truncated=False, max_lines=MAX_LINES):
+    ops = opcodes(a, b)
+    if truncated and len(ops) > 1 and ops[-1][0] != 'equal':
+        ops.pop()
+    lines = []
+    for hunk in _hunks(ops, context):
+        i1, j1 = hunk[0][1], hunk[0][3]
+        i2, j2 = hunk[-1][2], hunk[-1][4]
+        if not lines:
+            lines.append('--- ' + from_name)
+            lines.append('+++ ' + to_name)
+        lines.append('@@ -{},{} +{},{} @@'.format(
+            first_line + i1 + 1, i2 - i1, first_line + j1 + 1, j2 - j1))
+        for tag, i1, i2, j1, j2 in hunk:
+            if tag == 'equal':
+                lines.extend(' ' + line for line in a[i1:i2])
+                continue
+            lines.extend(_block('-', a[i1:i2], max_lines))
+            lines.extend(_block('+', b[j1:j2], max_lines))
+    return lines
@@ -17,3 +17,33 @@ class DebugError(ProcessError):
 
 class SkelError(ProcessError):
     pass
+
+class BenchError(ProcessError):
+    pass
+
+class ServeError(ProcessError):
+    pass
+
+class StressError(ProcessError):
+    pass
+
+class ProgramError(ProcessError):
+    pass
+
+class MinimizeError(ProcessError):
+    pass
+
+class BuildProfileError(ProcessError):
+    pass
+
+class PipelineError(ProcessError):
+    pass
+
+class CheckerError(ProcessError):
+    pass
+
+class ProfilerError(ProcessError):
+    pass
+
+class ComplexityError(ProcessError):
+    pass
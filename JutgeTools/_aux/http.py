@@ -0,0 +1,111 @@
+import threading
+import time
+from http.client import HTTPConnection, HTTPSConnection, HTTPException
+from urllib.parse import urlsplit, urljoin
+from .errors import DownloadError
+
+READ_SIZE = 1024 * 1024
+RETRIES = 3
+BACKOFF = 0.5  # Seconds, doubled after each failed attempt
+MAX_REDIRECTS = 5
+DEFAULT_HEADERS = {'User-Agent': 'jutge-tools'}
+
+class ConnectionPool:
+    # Keep-alive connections, one per (thread, host), so that downloads from
+    # many threads reuse their connections without sharing them
+    def __init__(self, timeout=30, retries=RETRIES, backoff=BACKOFF):
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.bytes_read = 0
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._all = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _connection(self, scheme, netloc):
+        conns = getattr(self._local, 'conns', None)
+        if conns is None:
+            conns = self._local.conns = {}
+        conn = conns.get((scheme, netloc))
+        if conn is None:
+            cls = HTTPSConnection if scheme == 'https' else HTTPConnection
+            conn = conns[(scheme, netloc)] = cls(netloc, timeout=self.timeout)
+            with self._lock:
+                self._all.append(conn)
+        return conn
+
+    def _discard(self, scheme, netloc):
+        conn = self._local.conns.pop((scheme, netloc), None)
+        if conn is not None:
+            conn.close()
+
+    def close(self):
+        with self._lock:
+            for conn in self._all:
+                conn.close()
+            self._all = []
+
+    # Stream the body of `url` into the file object `dest`. Returns the
+    # response, already read.
+    def get(self, url, dest, headers=None):
+        headers = dict(DEFAULT_HEADERS, **(headers or {}))
+        for _ in range(MAX_REDIRECTS + 1):
+            response = self._get_once(url, dest, headers)
+            if response.status in (301, 302, 303, 307, 308):
+                url = urljoin(url, response.getheader('Location'))
+                continue
+            if response.status >= 400:
+                raise DownloadError('download failed with code {} {}'.format(
+                    response.status, response.reason
+                ))
+            return response
+        raise DownloadError('too many redirects')
+
+    def _get_once(self, url, dest, headers):
+        parts = urlsplit(url)
+        path = parts.path + ('?' + parts.query if parts.query else '')
+        delay = self.backoff
+        for attempt in range(self.retries + 1):
+            start = dest.tell() if dest.seekable() else None
+            try:
+                conn = self._connection(parts.scheme, parts.netloc)
+                conn.request('GET', path, headers=headers)
+                response = conn.getresponse()
+                retry = response.status >= 500
+                if response.status < 300 and not retry:
+                    self._copy(response, dest)
+                else:
+                    response.read()
+                if not retry:
+                    return response
+                error = DownloadError('download failed with code {} {}'.format(
+                    response.status, response.reason
+                ))
+            except (OSError, HTTPException) as ex:
+                # Stale keep-alive connection, reset, timeout...
+                self._discard(parts.scheme, parts.netloc)
+                error = DownloadError('download of {} failed: {}'.format(
+                    url, ex))
+            if start is None:
+                break  # What was already written cannot be undone
+            dest.seek(start)
+            dest.truncate()
+            if attempt < self.retries:
+                time.sleep(delay)
+                delay *= 2
+        raise error
+
+    def _copy(self, response, dest):
+        while True:
+            data = response.read(READ_SIZE)
+            if not data:
+                break
+            dest.write(data)
+            with self._lock:
+                self.bytes_read += len(data)
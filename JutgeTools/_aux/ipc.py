@@ -0,0 +1,87 @@
+import array
+import json
+import os
+import socket
+import struct
+
+# Messages between the client and `serve`: a request (JSON, prefixed by its
+# length) with the client's stdin, stdout and stderr attached (SCM_RIGHTS),
+# then two ints back: the pid that runs the request, and its exit status.
+STDIO = (0, 1, 2)
+SOCKET_NAME = 'serve.sock'
+
+_LENGTH = struct.Struct('!I')
+_INT = struct.Struct('!i')
+
+# Private per-user dir for the socket: under $XDG_RUNTIME_DIR, or one in
+# /tmp that only we can access. Not in paths.py (nor using tempfile): this
+# runs on every client call, and importing pathlib or tempfile is slow.
+def user_runtime_dir():
+    base = os.environ.get('XDG_RUNTIME_DIR')
+    if base:
+        path = os.path.join(base, 'jutge-tools')
+    else:
+        path = os.path.join(os.environ.get('TMPDIR') or '/tmp',
+                            'jutge-tools-{}'.format(os.getuid()))
+    try:
+        os.mkdir(path, 0o700)
+    except FileExistsError:
+        pass
+    st = os.lstat(path)
+    if st.st_uid != os.getuid() or st.st_mode & 0o077:
+        raise PermissionError('{} is not a private dir'.format(path))
+    return path
+
+def socket_path():
+    return os.path.join(user_runtime_dir(), SOCKET_NAME)
+
+def _recv_exactly(sock, size):
+    data = bytearray()
+    while len(data) < size:
+        chunk = sock.recv(size - len(data))
+        if not chunk:
+            raise ConnectionError('connection closed')
+        data += chunk
+    return bytes(data)
+
+def send_request(sock, request, fds=()):
+    data = json.dumps(request).encode('utf-8')
+    ancillary = []
+    if fds:
+        ancillary.append((socket.SOL_SOCKET, socket.SCM_RIGHTS,
+                          array.array('i', fds)))
+    sock.sendmsg([_LENGTH.pack(len(data))], ancillary)
+    sock.sendall(data)
+
+# Returns the request and the list of received fds, which the caller owns
+def recv_request(sock, max_fds=len(STDIO)):
+    fds = array.array('i')
+    header, ancillary, _, _ = sock.recvmsg(
+        _LENGTH.size, socket.CMSG_SPACE(max_fds * fds.itemsize))
+    for level, kind, data in ancillary:
+        if level == socket.SOL_SOCKET and kind == socket.SCM_RIGHTS:
+            fds.frombytes(data[:len(data) - len(data) % fds.itemsize])
+    try:
+        if not header:
+            raise ConnectionError('connection closed')
+        header += _recv_exactly(sock, _LENGTH.size - len(header))
+        length, = _LENGTH.unpack(header)
+        request = json.loads(_recv_exactly(sock, length).decode('utf-8'))
+    except BaseException:
+        close_fds(fds)
+        raise
+    return request, list(fds)
+
+def close_fds(fds):
+    for fd in fds:
+        try:
+            os.close(fd)
+        except OSError:
+            pass
+
+def send_int(sock, value):
+    sock.sendall(_INT.pack(value))
+
+def recv_int(sock):
+    value, = _INT.unpack(_recv_exactly(sock, _INT.size))
+    return value
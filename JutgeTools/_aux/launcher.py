@@ -0,0 +1,155 @@
+import hashlib
+import math
+import os
+import shutil
+import subprocess
+import threading
+from .paths import user_cache_dir
+
+# A small program that runs each case: it sets the limits in the child
+# before exec (not after it started, as prlimit would) and reports the
+# rusage of the program alone. The ru_maxrss that wait4 gives for a child of
+# this process also counts the memory of this process, which the child
+# starts as a copy of (or shares, with vfork) until exec. The program is
+# forked from the launcher instead, which is tiny.
+#
+# launcher CPU_SECONDS AS_BYTES FD PROGRAM... ("-" for no limit). The wait
+# status and peak RSS (in KiB) of the program are written to FD. On SIGTERM
+# it kills the program and still reports.
+SOURCE = r'''
+#ifndef _GNU_SOURCE
+#define _GNU_SOURCE
+#endif
+#include <errno.h>
+#include <signal.h>
+#include <stdio.h>
+#include <stdlib.h>
+#include <string.h>
+#include <sys/prctl.h>
+#include <sys/resource.h>
+#include <sys/wait.h>
+#include <unistd.h>
+
+static volatile sig_atomic_t child = 0;
+static volatile sig_atomic_t stop = 0;
+
+static void on_term(int sig) {
+    (void)sig;
+    stop = 1;
+    if (child > 0)
+        kill(child, SIGKILL);
+}
+
+static int set_limit(int resource, const char *value, int slack) {
+    struct rlimit rl;
+    if (strcmp(value, "-") == 0)
+        return 0;
+    rl.rlim_cur = strtoull(value, NULL, 10);
+    rl.rlim_max = rl.rlim_cur + slack;
+    return setrlimit(resource, &rl);
+}
+
+int main(int argc, char **argv) {
+    struct sigaction sa;
+    sigset_t term, old;
+    struct rusage ru;
+    int status, fd;
+    pid_t pid;
+
+    if (argc < 5)
+        return 126;
+    fd = atoi(argv[3]);
+    memset(&sa, 0, sizeof sa);
+    sa.sa_handler = on_term;
+    sigaction(SIGTERM, &sa, NULL);
+    sigemptyset(&term);
+    sigaddset(&term, SIGTERM);
+    sigprocmask(SIG_BLOCK, &term, &old);
+    pid = fork();
+    if (pid == 0) {
+        close(fd);
+        prctl(PR_SET_PDEATHSIG, SIGKILL);
+        signal(SIGTERM, SIG_DFL);
+        sigprocmask(SIG_SETMASK, &old, NULL);
+        /* SIGXCPU at the soft limit, SIGKILL one second later */
+        if (set_limit(RLIMIT_CPU, argv[1], 1) ||
+                set_limit(RLIMIT_AS, argv[2], 0)) {
+            perror("setrlimit");
+            _exit(126);
+        }
+        execv(argv[4], argv + 4);
+        perror(argv[4]);
+        _exit(127);
+    }
+    if (pid < 0)
+        return 126;
+    child = pid;
+    if (stop)
+        kill(pid, SIGKILL);
+    sigprocmask(SIG_SETMASK, &old, NULL);
+    while (wait4(pid, &status, 0, &ru) < 0)
+        if (errno != EINTR)
+            return 126;
+    dprintf(fd, "%d %ld\n", status, (long)ru.ru_maxrss);
+    return 0;
+}
+'''
+
+# Any of these can build it (the source is also valid C++)
+COMPILERS = ('cc', 'gcc', 'clang', 'g++', 'clang++')
+
+_launcher = None
+_failed = False
+_lock = threading.Lock()
+
+def _build():
+    digest = hashlib.sha256(SOURCE.encode('utf-8')).hexdigest()[:16]
+    path = user_cache_dir('launcher') / ('launcher-' + digest)
+    if path.exists():
+        return path
+    compiler = next(filter(None, map(shutil.which, COMPILERS)), None)
+    if compiler is None:
+        return None
+    suffix = '.{}.tmp'.format(os.getpid())
+    src = path.with_name(path.name + '.c' + suffix)
+    tmp = path.with_name(path.name + suffix)
+    try:
+        with src.open('w') as f:
+            f.write(SOURCE)
+        language = 'c++' if compiler.endswith('++') else 'c'
+        subprocess.check_call(
+            [compiler, '-O2', '-x', language, str(src), '-o', str(tmp)],
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        os.replace(str(tmp), str(path))
+    except (subprocess.CalledProcessError, OSError):
+        return None
+    finally:
+        for f in (src, tmp):
+            if f.exists():
+                f.unlink()
+    return path
+
+# Path of the launcher, built on first use (or if the cache was cleared
+# since), or None if it cannot be built. A failure is only remembered by
+# this process, not in the cache: the next one tries again.
+def launcher():
+    global _launcher, _failed
+    with _lock:
+        if not _failed and (_launcher is None or not _launcher.exists()):
+            _launcher = _build()
+            _failed = _launcher is None
+        return _launcher
+
+def argv(path, limits, fd, executable):
+    cpu = '-' if limits.cpu is None else str(int(math.ceil(limits.cpu)))
+    memory = '-' if limits.memory is None else str(int(limits.memory))
+    return [str(path), cpu, memory, str(fd), str(executable)]
+
+# (wait status, peak RSS in bytes) from what the launcher wrote, or None if
+# it did not get to write it (e.g. it was killed)
+def parse_report(data):
+    try:
+        status, rss = data.split()
+        return int(status), int(rss) * 1024
+    except ValueError:
+        return None
@@ -0,0 +1,47 @@
+import os
+from collections import OrderedDict
+
+MAX_ENTRIES = 4096
+
+_memos = {}
+
+class FileMemo:
+    # Values computed from the contents of a file, reused while its stat
+    # signature does not change. Only worth it in a long-lived process
+    # (`serve`), which also merges back what its forked children computed
+    # (see export and merge).
+    def __init__(self, name):
+        self.entries = OrderedDict()
+        _memos[name] = self
+
+    def get(self, path, compute):
+        path = str(path)
+        try:
+            st = os.stat(path)
+        except OSError:
+            return compute(path)
+        signature = (st.st_ino, st.st_size, st.st_mtime_ns)
+        entry = self.entries.get(path)
+        if entry is not None and entry[0] == signature:
+            self.entries.move_to_end(path)
+            return entry[1]
+        value = compute(path)
+        self.entries[path] = (signature, value)
+        self.entries.move_to_end(path)
+        return value
+
+    def update(self, entries):
+        for path, entry in entries.items():
+            self.entries[path] = entry
+            self.entries.move_to_end(path)
+        # Least recently used first
+        while len(self.entries) > MAX_ENTRIES:
+            self.entries.popitem(last=False)
+
+def export():
+    return {name: memo.entries for name, memo in _memos.items()}
+
+def merge(state):
+    for name, entries in state.items():
+        if name in _memos:
+            _memos[name].update(entries)
@@ -0,0 +1,12 @@
+import os
+from pathlib import Path
+
+# Per-user cache shared by every exercise dir (follows the XDG spec)
+def user_cache_dir(*parts):
+    base = os.environ.get('XDG_CACHE_HOME')
+    if not base:
+        base = os.path.join(os.path.expanduser('~'), '.cache')
+    path = Path(base, 'jutge-tools', *parts)
+    if not path.exists():
+        path.mkdir(parents=True)
+    return path
@@ -0,0 +1,162 @@
+import hashlib
+import os
+import re
+import shlex
+import shutil
+import subprocess
+import threading
+import time
+from .memo import FileMemo
+from .paths import user_cache_dir
+
+_SYSTEM_INCLUDE = re.compile(rb'#\s*include\s*<([^>]+)>')
+
+_includes = FileMemo('leading_includes')
+
+# A failure to precompile may be transient (e.g. a full disk or an
+# interrupted compiler), so it is only remembered for this long
+FAILED_TTL = 60 * 60
+
+def _strip_comments(line, in_comment):
+    code = bytearray()
+    i = 0
+    while i < len(line):
+        if in_comment:
+            end = line.find(b'*/', i)
+            if end < 0:
+                break
+            in_comment = False
+            i = end + 2
+        elif line.startswith(b'/*', i):
+            in_comment = True
+            i += 2
+        elif line.startswith(b'//', i):
+            break
+        else:
+            code.append(line[i])
+            i += 1
+    return bytes(code).strip(), in_comment
+
+# The `#include <...>` lines a source starts with (comments and blank lines
+# aside), up to the first line of anything else. Only these can be
+# precompiled without changing the meaning of the source: a header it does
+# not include itself would hide a missing include, and one after a #define
+# or any other code might be affected by it.
+def _scan_includes(path):
+    headers = []
+    in_comment = False
+    with open(path, 'rb') as f:
+        for line in f:
+            code, in_comment = _strip_comments(line, in_comment)
+            if not code:
+                continue
+            m = _SYSTEM_INCLUDE.fullmatch(code)
+            if m is None:
+                break
+            header = m.group(1).decode('utf-8', 'replace').strip()
+            if header not in headers:
+                headers.append(header)
+    return headers
+
+# The headers that every source starts with, in the same order, so that
+# including them first does not change any of them
+def prelude_headers(sources):
+    common = None
+    for source in sources:
+        try:
+            headers = _includes.get(source, _scan_includes)
+        except OSError:
+            return []
+        if common is None:
+            common = list(headers)
+        else:
+            n = 0
+            while n < min(len(common), len(headers)) and \
+                    common[n] == headers[n]:
+                n += 1
+            del common[n:]
+    return common or []
+
+def _compiler_stamp(compiler_tpl):
+    # A compiler upgrade invalidates the PCH, so make it part of the key
+    try:
+        compiler = shutil.which(shlex.split(compiler_tpl.template)[0])
+        return str(os.stat(compiler).st_mtime) if compiler else ''
+    except (ValueError, IndexError, OSError):
+        return ''
+
+# One lock per prelude, so that parallel builds in this process (e.g. of
+# several exercises) precompile each one only once
+_locks = {}
+_locks_lock = threading.Lock()
+# Preludes whose failure was already retried on --force by this process
+_retried = set()
+
+def _prelude_lock(key):
+    with _locks_lock:
+        return _locks.setdefault(key, threading.Lock())
+
+# Return the prelude header to inject with -include, or None if it could not
+# be precompiled. `substitute` expands the compiler template. `force` tries
+# again a prelude that failed recently.
+def precompiled_prelude(compiler_tpl, flags, sources, substitute,
+                        verbose=True, force=False):
+    headers = prelude_headers(sources)
+    if not headers:
+        return None
+    key = hashlib.sha256('\0'.join(
+        [compiler_tpl.template, _compiler_stamp(compiler_tpl)] + flags +
+        headers
+    ).encode('utf-8')).hexdigest()[:16]
+    pch_dir = user_cache_dir('pch', key)
+    with _prelude_lock(key):
+        retry = force and key not in _retried
+        if retry:
+            _retried.add(key)
+        return _precompile(compiler_tpl, flags, headers, pch_dir, substitute,
+                           verbose, retry)
+
+def _failed_recently(failed):
+    try:
+        return time.time() - failed.stat().st_mtime < FAILED_TTL
+    except OSError:
+        return False
+
+def _precompile(compiler_tpl, flags, headers, pch_dir, substitute, verbose,
+                retry):
+    header = pch_dir / 'prelude.hh'
+    gch = pch_dir / 'prelude.hh.gch'
+    failed = pch_dir / 'failed'
+    if gch.exists():
+        return header
+    if not retry and _failed_recently(failed):
+        return None
+
+    if verbose:
+        print('Precompiling ' + ' '.join('<{}>'.format(h) for h in headers))
+    # Other builds may be using the same cache concurrently: write aside and
+    # move into place atomically
+    suffix = '.{}.tmp'.format(os.getpid())
+    tmp_header = header.with_name(header.name + suffix)
+    with tmp_header.open('w') as f:
+        f.writelines('#include <{}>\n'.format(h) for h in headers)
+    os.replace(str(tmp_header), str(header))
+    tmp = gch.with_name(gch.name + suffix)
+    cmd = substitute(compiler_tpl, tmp, flags + ['-x', 'c++-header'],
+                     [header])
+    try:
+        subprocess.check_call(cmd, shell=True, stdout=subprocess.DEVNULL,
+                              stderr=subprocess.DEVNULL)
+        os.replace(str(tmp), str(gch))
+    except (subprocess.CalledProcessError, OSError):
+        if verbose:
+            print('Could not precompile headers, continuing without them')
+        if tmp.exists():
+            tmp.unlink()
+        failed.touch()
+        return None
+    try:
+        failed.unlink()
+    except FileNotFoundError:
+        pass
+    return header
@@ -0,0 +1,165 @@
+import fcntl
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from .errors import DownloadError
+from .paths import user_cache_dir
+
+CACHE_SIZE = 512 * 1024 * 1024
+# Problems rarely change: within this many seconds of the last check, cached
+# files are used without asking the server
+CACHE_TTL = 24 * 60 * 60
+
+class _HashingWriter:
+    # Hash the data while it is written, instead of reading it back. Only
+    # rewinding to the start (what ConnectionPool does on retries) is allowed.
+    def __init__(self, f):
+        self.f = f
+        self.hash = hashlib.sha256()
+
+    def write(self, data):
+        self.hash.update(data)
+        return self.f.write(data)
+
+    def tell(self):
+        return self.f.tell()
+
+    def seekable(self):
+        return True
+
+    def seek(self, pos):
+        if pos != 0:
+            raise ValueError('can only rewind to the start')
+        self.hash = hashlib.sha256()
+        return self.f.seek(0)
+
+    def truncate(self):
+        return self.f.truncate()
+
+class ProblemCache:
+    # Downloaded files are stored once per content hash under objects/ and
+    # index.json maps each URL to its hash and validators. The whole URL is
+    # the key, so that the same problem from another server (--base-url)
+    # is cached on its own. The index is shared by concurrent processes, so
+    # it is always read and written under a file lock.
+    def __init__(self, root=None, max_size=CACHE_SIZE, ttl=CACHE_TTL):
+        self.root = Path(root) if root is not None else \
+            user_cache_dir('problems')
+        self.objects = self.root / 'objects'
+        if not self.objects.exists():
+            self.objects.mkdir(parents=True)
+        self.index_file = self.root / 'index.json'
+        self.max_size = max_size
+        self.ttl = ttl
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def _index(self):
+        with self._lock, (self.root / '.lock').open('a') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                with self.index_file.open('r') as f:
+                    index = json.load(f)
+            except (OSError, ValueError):
+                index = {}
+            yield index
+            tmp = self.index_file.with_name(
+                self.index_file.name + '.{}.tmp'.format(os.getpid()))
+            with tmp.open('w') as f:
+                json.dump(index, f, indent=1, sort_keys=True)
+            os.replace(str(tmp), str(self.index_file))
+
+    def _object(self, digest):
+        return self.objects / digest
+
+    # Return the path of the cached copy of `url`, downloading or
+    # revalidating it first if needed
+    def fetch(self, pool, url, offline=False, revalidate=False):
+        with self._index() as index:
+            entry = index.get(url)
+            if entry is not None and not self._object(entry['hash']).exists():
+                entry = None
+            if entry is not None and (offline or (
+                    not revalidate and
+                    time.time() - entry['checked'] < self.ttl)):
+                entry['used'] = time.time()
+                print('Using cached ' + url)
+                return self._object(entry['hash'])
+        if offline:
+            raise DownloadError('{} is not cached and --offline was'
+                                ' given'.format(url))
+
+        headers = {}
+        if entry is not None:
+            if entry.get('etag'):
+                headers['If-None-Match'] = entry['etag']
+            if entry.get('last_modified'):
+                headers['If-Modified-Since'] = entry['last_modified']
+        print('Downloading ' + url)
+        fd, tmp = tempfile.mkstemp(dir=str(self.objects), suffix='.tmp')
+        tmp = Path(tmp)
+        try:
+            with os.fdopen(fd, 'wb') as dest:
+                writer = _HashingWriter(dest)
+                response = pool.get(url, writer, headers)
+            if response.status == 304:
+                print('Not modified, using cached copy')
+                digest = entry['hash']
+            else:
+                digest = writer.hash.hexdigest()
+                os.replace(str(tmp), str(self._object(digest)))
+        finally:
+            if tmp.exists():
+                tmp.unlink()
+
+        now = time.time()
+        with self._index() as index:
+            index[url] = {
+                'hash': digest,
+                'size': self._object(digest).stat().st_size,
+                'etag': response.getheader('ETag',
+                                           entry and entry.get('etag')),
+                'last_modified': response.getheader(
+                    'Last-Modified', entry and entry.get('last_modified')),
+                'checked': now,
+                'used': now
+            }
+            self._evict(index, keep=digest)
+        return self._object(digest)
+
+    def forget(self, url):
+        with self._index() as index:
+            entry = index.pop(url, None)
+            if entry is not None and not any(
+                    e['hash'] == entry['hash'] for e in index.values()):
+                try:
+                    self._object(entry['hash']).unlink()
+                except OSError:
+                    pass
+
+    def _evict(self, index, keep):
+        # Least recently used first; a blob may be shared by several keys
+        blobs = {}
+        for key, entry in index.items():
+            blob = blobs.setdefault(entry['hash'], [entry['size'], 0, []])
+            blob[1] = max(blob[1], entry['used'])
+            blob[2].append(key)
+        total = sum(size for size, _, _ in blobs.values())
+        for digest, (size, _, keys) in sorted(blobs.items(),
+                                              key=lambda b: b[1][1]):
+            if total <= self.max_size:
+                break
+            if digest == keep:
+                continue
+            for key in keys:
+                del index[key]
+            try:
+                self._object(digest).unlink()
+            except OSError:
+                pass
+            total -= size
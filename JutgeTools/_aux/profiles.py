@@ -0,0 +1,73 @@
+import shlex
+from collections import namedtuple
+from .errors import BuildProfileError
+
+DEFAULT_PROFILE = 'debug'
+SECTION_PREFIX = 'profile:'
+
+# flags is a list of compiler flags. compiler, if not None, replaces the
+# compiler template for this profile.
+Profile = namedtuple('Profile', ['name', 'flags', 'compiler'])
+
+BUILTIN_PROFILES = {
+    'debug': Profile('debug', ['-g', '-O0'], None),
+    'release': Profile('release', ['-DNDEBUG', '-O2'], None),
+    'sanitize': Profile('sanitize', [
+        '-g', '-O1', '-fno-omit-frame-pointer',
+        '-fsanitize=address,undefined'
+    ], None),
+}
+
+# Built-in profiles plus those defined in the config file, as sections like:
+#
+#   [profile:fast]
+#   flags = -O3 -march=native -DNDEBUG
+#   compiler = clang++ -o $output $flags $sources
+def all_profiles(config=None):
+    profiles = dict(BUILTIN_PROFILES)
+    if config is not None:
+        for name, section in config.sections(SECTION_PREFIX).items():
+            profiles[name] = Profile(
+                name, shlex.split(section.get('flags', '')),
+                section.get('compiler')
+            )
+    return profiles
+
+def get(profile, config=None):
+    if isinstance(profile, Profile):
+        return profile
+    profiles = all_profiles(config)
+    try:
+        return profiles[profile]
+    except KeyError:
+        raise BuildProfileError(
+            'unknown profile "{}" (available: {})'.format(
+                profile, ', '.join(sorted(profiles))))
+
+# Each profile has its own executable, so that switching between them does
+# not throw the others away. The default one keeps the plain name.
+def artifact_name(directory, profile):
+    base = directory.name.split('_')[0]
+    if profile.name == DEFAULT_PROFILE:
+        return base + '.x'
+    return '{}.{}.x'.format(base, profile.name)
+
+# The profile given with --profile (or in the config), else debug or
+# release depending on --no-debug
+def from_config(config, default=None):
+    name = config.get('profile')
+    if name is None:
+        name = default
+    if name is None:
+        name = DEFAULT_PROFILE if config.getboolean('debug', True) else \
+            'release'
+    return get(name, config)
+
+def add_profile_argument(parser):
+    parser.add_argument(
+        '-p', '--profile',
+        metavar='NAME',
+        help='build profile: {} or one defined in the config file as'
+             ' [{}NAME]. Each profile has its own executable'.format(
+                 ', '.join(sorted(BUILTIN_PROFILES)), SECTION_PREFIX)
+    )
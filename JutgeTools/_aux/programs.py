@@ -0,0 +1,37 @@
+import subprocess
+from ..compilef import compilef
+from .errors import CompileError, ProgramError
+
+CPP_SUFFIXES = ('.cc', '.cpp')
+STDERR_TAIL = 1024
+
+# Helpers for the auxiliary programs (generators, reference solutions...)
+# that some subcommands run besides the exercise
+
+# Compile C++ sources to an executable next to them. Anything else (e.g. a
+# script) is used as it is.
+def build_program(path, force=False, pch=True):
+    if not path.exists():
+        raise ProgramError('{} does not exist'.format(path))
+    if path.suffix not in CPP_SUFFIXES:
+        return path
+    try:
+        # They need not be warning-free, but they should be fast
+        return compilef(strict=False, debug=False, sources=[path],
+                        force=force, pch=pch,
+                        output=path.with_suffix('.x')).resolve()
+    except CompileError as ex:
+        raise ProgramError(ex) from ex
+
+def run_program(argv, stdin, stdout, timeout, what):
+    try:
+        proc = subprocess.run(argv, stdin=stdin, stdout=stdout,
+                              stderr=subprocess.PIPE, timeout=timeout)
+    except subprocess.TimeoutExpired:
+        raise ProgramError('{} timed out'.format(what))
+    except OSError as ex:
+        raise ProgramError('cannot run {}: {}'.format(what, ex))
+    if proc.returncode != 0:
+        msg = '{} exited with status {}'.format(what, proc.returncode)
+        stderr = proc.stderr[-STDERR_TAIL:].decode('utf-8', 'replace')
+        raise ProgramError(msg + (':\n' + stderr if stderr else ''))
@@ -0,0 +1,257 @@
+import abc
+import json
+import os
+import time
+import xml.etree.ElementTree as ET
+from collections import OrderedDict
+from pathlib import Path
+from . import runner
+
+FORMATS = ('json', 'junit')
+DEFAULT_FILES = {'json': 'test-report.json', 'junit': 'test-report.xml'}
+
+def exit_status(returncode):
+    # Negative return codes are signals (as in subprocess)
+    if returncode is None or returncode >= 0:
+        return {'code': returncode, 'signal': None}
+    return {'code': None,
+            'signal': runner.SIGNALS.get(-returncode, str(-returncode))}
+
+def case_entry(result, cached=False):
+    return {
+        'case': result.case,
+        'verdict': result.verdict,
+        'exit': exit_status(result.returncode),
+        'wall': round(result.usage.wall, 6),
+        'cpu': round(result.usage.cpu, 6),
+        'rss': result.usage.rss,
+        'output_size': result.size,
+        'mismatch': result.mismatch,
+        'cached': cached
+    }
+
+def _write_atomic(path, data):
+    tmp = path.with_name(path.name + '.tmp')
+    with tmp.open('wb') as f:
+        f.write(data)
+    os.replace(str(tmp), str(path))
+
+def summary(cases):
+    verdicts = {}
+    for case in cases:
+        verdicts[case['verdict']] = verdicts.get(case['verdict'], 0) + 1
+    return {
+        'tests': len(cases),
+        'passed': verdicts.get(runner.ACCEPTED, 0),
+        'verdicts': verdicts,
+        'wall': round(sum(c['wall'] for c in cases), 6),
+        'cpu': round(sum(c['cpu'] for c in cases), 6)
+    }
+
+class Report(abc.ABC):
+    # The whole report is written again (atomically) after each case, so the
+    # file can be followed while a long run goes on and is always complete
+    # up to the last case that finished.
+    #
+    # A workspace report (test-all) has a suite per exercise, which may have
+    # failed to compile (`error`); otherwise there is only the one of `name`.
+    def __init__(self, path, name, profile, limits, output_limit,
+                 workspace=False):
+        self.path = Path(path)
+        self.name = name
+        self.workspace = workspace
+        self.started = time.time()
+        self.properties = {
+            'profile': profile,
+            'wall_limit': limits.wall,
+            'cpu_limit': limits.cpu,
+            'memory_limit': limits.memory,
+            'output_limit': output_limit
+        }
+        self.suites = OrderedDict()  # In the order they come
+        self.finished = False
+        if not workspace:
+            self._suite(name)
+        self.write()
+
+    def _suite(self, name):
+        if name not in self.suites:
+            self.suites[name] = {'name': name, 'error': None, 'cases': []}
+        return self.suites[name]
+
+    def add(self, result, cached=False, exercise=None):
+        self._suite(exercise or self.name)['cases'].append(
+            case_entry(result, cached))
+        self.write()
+
+    def error(self, exercise, message):
+        self._suite(exercise)['error'] = message
+        self.write()
+
+    def close(self):
+        self.finished = True
+        self.write()
+
+    def write(self):
+        _write_atomic(self.path, self.render())
+
+    # The whole report, as bytes
+    @abc.abstractmethod
+    def render(self):
+        pass
+
+class JsonReport(Report):
+    def render(self):
+        report = {
+            'name': self.name,
+            'started': self.started,
+            'finished': self.finished,
+            'properties': self.properties
+        }
+        if self.workspace:
+            suites = list(self.suites.values())
+            report['summary'] = dict(
+                summary([c for s in suites for c in s['cases']]),
+                exercises=len(suites),
+                errors=sum(s['error'] is not None for s in suites)
+            )
+            report['exercises'] = [dict(s, summary=summary(s['cases']))
+                                   for s in suites]
+        else:
+            cases = self.suites[self.name]['cases']
+            report['summary'] = summary(cases)
+            report['cases'] = cases
+        return json.dumps(report, indent=2).encode('utf-8')
+
+# Passed cases are plain <testcase>s, runtime errors are <error>s and every
+# other verdict is a <failure>. The rest of the fields go on <properties>.
+# Exercises that did not compile have a single "compile" <testcase> with an
+# <error>.
+class JUnitReport(Report):
+    def render(self):
+        if not self.workspace:
+            root = self._testsuite(self.suites[self.name])
+        else:
+            cases = [c for s in self.suites.values() for c in s['cases']]
+            total = summary(cases)
+            compile_errors = sum(s['error'] is not None
+                                 for s in self.suites.values())
+            errors = total['verdicts'].get(runner.RUNTIME_ERROR, 0)
+            root = ET.Element('testsuites', {
+                'name': self.name,
+                'tests': str(total['tests'] + compile_errors),
+                'failures': str(total['tests'] - total['passed'] - errors),
+                'errors': str(errors + compile_errors),
+                'time': '{:.6f}'.format(total['wall'])
+            })
+            for suite in self.suites.values():
+                root.append(self._testsuite(suite))
+        return ET.tostring(root, encoding='utf-8')
+
+    def _testsuite(self, suite):
+        total = summary(suite['cases'])
+        errors = total['verdicts'].get(runner.RUNTIME_ERROR, 0)
+        compile_error = suite['error'] is not None
+        element = ET.Element('testsuite', {
+            'name': suite['name'],
+            'tests': str(total['tests'] + compile_error),
+            'failures': str(total['tests'] - total['passed'] - errors),
+            'errors': str(errors + compile_error),
+            'time': '{:.6f}'.format(total['wall']),
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S',
+                                       time.localtime(self.started))
+        })
+        _properties(element, dict(self.properties, finished=self.finished))
+        if compile_error:
+            testcase = ET.SubElement(element, 'testcase', {
+                'classname': suite['name'],
+                'name': 'compile',
+                'time': '0'
+            })
+            ET.SubElement(testcase, 'error', {
+                'type': 'CE',
+                'message': suite['error']
+            })
+        for case in suite['cases']:
+            testcase = ET.SubElement(element, 'testcase', {
+                'classname': suite['name'],
+                'name': case['case'],
+                'time': '{:.6f}'.format(case['wall'])
+            })
+            _properties(testcase, {
+                'verdict': case['verdict'],
+                'exit_code': case['exit']['code'],
+                'signal': case['exit']['signal'],
+                'cpu': case['cpu'],
+                'rss': case['rss'],
+                'output_size': case['output_size'],
+                'mismatch': case['mismatch'],
+                'cached': case['cached']
+            })
+            if case['verdict'] == runner.ACCEPTED:
+                continue
+            tag = 'error' if case['verdict'] == runner.RUNTIME_ERROR \
+                else 'failure'
+            ET.SubElement(testcase, tag, {
+                'type': case['verdict'],
+                'message': _message(case)
+            })
+        return element
+
+def _properties(parent, values):
+    properties = ET.SubElement(parent, 'properties')
+    for name, value in values.items():
+        if value is None:
+            continue
+        if isinstance(value, bool):
+            value = 'true' if value else 'false'
+        ET.SubElement(properties, 'property',
+                      {'name': name, 'value': str(value)})
+
+def _message(case):
+    # Wrong answers are killed as soon as they differ: the signal is ours
+    if case['mismatch'] is not None and \
+            case['verdict'] == runner.WRONG_ANSWER:
+        return '{} (first difference at byte {})'.format(case['verdict'],
+                                                         case['mismatch'])
+    if case['exit']['signal'] is not None:
+        return '{} (signal {})'.format(case['verdict'],
+                                       case['exit']['signal'])
+    if case['exit']['code']:
+        return '{} (exit status {})'.format(case['verdict'],
+                                            case['exit']['code'])
+    return case['verdict']
+
+def open_report(fmt, path, name, profile, limits, output_limit,
+                workspace=False):
+    cls = JUnitReport if fmt == 'junit' else JsonReport
+    return cls(path, name, profile, limits, output_limit, workspace)
+
+# --report-file alone picks the format from its suffix
+def from_config(config):
+    fmt = config.get('report')
+    path = config.get('report_file')
+    if fmt is None and path is None:
+        return None, None
+    if fmt is None:
+        fmt = 'junit' if path.endswith('.xml') else 'json'
+    if path is None:
+        path = DEFAULT_FILES[fmt]
+    return fmt, path
+
+def add_report_arguments(parser):
+    parser.add_argument(
+        '--report',
+        choices=FORMATS,
+        help='write a machine-readable report of the cases (verdict, exit'
+             ' status, times, output size and first mismatch). It is'
+             ' updated as each case finishes'
+    )
+    parser.add_argument(
+        '--report-file',
+        metavar='PATH',
+        help='where to write the report. Default: {}. With no --report, the'
+             ' format is junit if it ends in .xml and json otherwise'.format(
+                 ', '.join('{} ({})'.format(v, k)
+                           for k, v in DEFAULT_FILES.items()))
+    )
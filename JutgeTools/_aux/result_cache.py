@@ -0,0 +1,75 @@
+import base64
+import hashlib
+import json
+import os
+from pathlib import Path
+from . import runner, checkers
+from .build_cache import file_digest
+
+CACHE_FILE = '.test_cache'
+
+# A case gives the same result as long as the executable, its input, the
+# expected output, the limits it ran with and how it was checked are the same
+def case_key(executable, inpfile, corfile, limits, output_limit,
+             checker=None):
+    parts = [
+        file_digest(executable),
+        file_digest(inpfile),
+        file_digest(corfile) if corfile.exists() else '',
+        repr(tuple(limits)),
+        repr(output_limit),
+        repr(tuple(checker or checkers.EXACT_CHECKER))
+    ]
+    return hashlib.sha256('\0'.join(parts).encode('utf-8')).hexdigest()
+
+def _encode(result):
+    entry = result._asdict()
+    # The output of passed cases is not needed for anything
+    out = result.out if result.verdict != runner.ACCEPTED else b''
+    entry['out'] = base64.b64encode(out).decode('ascii')
+    entry['cor'] = base64.b64encode(result.cor).decode('ascii')
+    entry['usage'] = list(result.usage)
+    return entry
+
+def _decode(entry):
+    try:
+        return runner.CaseResult(**dict(
+            entry,
+            out=base64.b64decode(entry['out']),
+            cor=base64.b64decode(entry['cor']),
+            usage=runner.Usage(*entry['usage'])
+        ))
+    except (KeyError, TypeError, ValueError):
+        return None  # Written by another version
+
+class ResultCache:
+    # Results of the cases of one exercise dir, stored on `.test_cache`
+    def __init__(self, directory):
+        self.file = Path(directory) / CACHE_FILE
+        try:
+            with self.file.open('r') as f:
+                self.entries = json.load(f)
+        except (OSError, ValueError):
+            self.entries = {}
+
+    def get(self, key):
+        entry = self.entries.get(key)
+        return _decode(entry) if entry is not None else None
+
+    def put(self, key, result):
+        # Only the last result of each case is kept
+        for old in [k for k, e in self.entries.items()
+                    if e.get('case') == result.case]:
+            del self.entries[old]
+        self.entries[key] = _encode(result)
+
+    # Cases whose last result was not AC
+    def failed(self):
+        return {e['case'] for e in self.entries.values()
+                if e.get('verdict') != runner.ACCEPTED}
+
+    def save(self):
+        tmp = self.file.with_name(self.file.name + '.tmp')
+        with tmp.open('w') as f:
+            json.dump(self.entries, f, sort_keys=True)
+        os.replace(str(tmp), str(self.file))
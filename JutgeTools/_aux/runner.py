@@ -0,0 +1,372 @@
+import math
+import mmap
+import os
+import selectors
+import signal
+import subprocess
+import sys
+import time
+from collections import namedtuple
+from . import checkers, launcher
+
+CHUNK_SIZE = 64 * 1024
+# Bytes kept on each side of the first mismatch, to be shown on the diff
+DIFF_WINDOW = 16 * 1024
+OUTPUT_LIMIT = 64 * 1024 * 1024
+STDERR_TAIL = 4 * 1024
+RSS_SAMPLE_INTERVAL = 0.01
+# How a program that runs out of memory under a limit usually dies
+MEMORY_SIGNALS = (signal.SIGSEGV, signal.SIGBUS, signal.SIGABRT,
+                  signal.SIGKILL)
+
+# Verdicts
+ACCEPTED = 'AC'
+WRONG_ANSWER = 'WA'
+RUNTIME_ERROR = 'RE'
+OUTPUT_LIMIT_EXCEEDED = 'OLE'
+TIME_LIMIT_EXCEEDED = 'TLE'
+MEMORY_LIMIT_EXCEEDED = 'MLE'
+
+# Ugly hack to get signal name from signal code
+SIGNALS = dict((k, v) for v, k in reversed(sorted(signal.__dict__.items()))
+     if v.startswith('SIG') and not v.startswith('SIG_'))
+
+# wall and cpu in seconds, memory (address space) in bytes. None: no limit
+Limits = namedtuple('Limits', ['wall', 'cpu', 'memory'])
+DEFAULT_LIMITS = Limits(wall=10.0, cpu=None, memory=None)
+
+# wall and cpu in seconds, peak resident set size in bytes (None if it
+# could not be measured)
+Usage = namedtuple('Usage', ['wall', 'cpu', 'rss'])
+
+# out and cor are only windows around `mismatch` (the offset of the first
+# differing byte), never the whole outputs. `line` lines come before them,
+# and `truncated` tells whether both outputs go on after them.
+CaseResult = namedtuple('CaseResult', [
+    'case', 'verdict', 'returncode', 'out', 'cor', 'mismatch', 'size',
+    'line', 'truncated', 'usage'
+])
+
+def _open_expected(corfile):
+    if corfile is None:
+        return None
+    with corfile.open('rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return b''
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+def _first_difference(a, b):
+    n = min(len(a), len(b))
+    # Bisect on slice equality, which runs in C, instead of a byte loop
+    lo, hi = 0, n
+    while lo < hi:
+        mid = (lo + hi) // 2
+        if a[lo:mid + 1] == b[lo:mid + 1]:
+            lo = mid + 1
+        else:
+            hi = mid
+    return lo
+
+class _Comparator:
+    def __init__(self, expected, window):
+        self.expected = expected
+        self.window = window
+        self.size = 0
+        self.before = bytearray()  # Tail of the output before the mismatch
+        self.after = bytearray()  # Output from the mismatch onwards
+        self.mismatch = None
+        self.newlines = 0  # Lines before the mismatch
+
+    # Returns False once enough output has been seen to build the diff
+    def feed(self, chunk):
+        if self.expected is None:
+            self._keep(chunk)
+        elif self.mismatch is None:
+            expected = self.expected[self.size:self.size + len(chunk)]
+            if chunk == expected:
+                self._keep(chunk)
+                self.newlines += chunk.count(b'\n')
+            else:
+                i = _first_difference(chunk, expected)
+                self._keep(chunk[:i])
+                self.newlines += chunk.count(b'\n', 0, i)
+                self.mismatch = self.size + i
+                self.after += chunk[i:i + self.window]
+        else:
+            self.after += chunk[:self.window - len(self.after)]
+        self.size += len(chunk)
+        return self.mismatch is None or len(self.after) < self.window
+
+    def _keep(self, data):
+        self.before += data
+        if len(self.before) > self.window:
+            del self.before[:len(self.before) - self.window]
+
+    def finish(self):
+        if self.expected is None:
+            return True
+        if self.mismatch is None and self.size != len(self.expected):
+            self.mismatch = self.size
+        return self.mismatch is None
+
+    # Windows of both outputs around the mismatch, the number of lines that
+    # come before them, and whether both were cut before their end
+    def windows(self):
+        if self.mismatch is None:
+            return bytes(self.before), b'', 0, False
+        start = self.mismatch - len(self.before)
+        before = bytes(self.before)
+        if start > 0:
+            # Start the windows on a line boundary; this is the common prefix
+            # so it is the same for both
+            nl = before.find(b'\n')
+            if nl != -1:
+                before = before[nl + 1:]
+                start += nl + 1
+        out = before + bytes(self.after)
+        end = self.mismatch + self.window
+        cor = bytes(self.expected[start:end])
+        # Do not end on partial lines when the outputs go on
+        out_cut = len(self.after) >= self.window
+        cor_cut = end < len(self.expected)
+        if out_cut:
+            out = out[:out.rfind(b'\n') + 1] or out
+        if cor_cut:
+            cor = cor[:cor.rfind(b'\n') + 1] or cor
+        return (out, cor, self.newlines - before.count(b'\n'),
+                out_cut and cor_cut)
+
+# Without the launcher, a shell sets the limits before exec instead
+def _shell_argv(limits, executable):
+    script = []
+    if limits.cpu is not None:
+        script.append('ulimit -t {}'.format(int(math.ceil(limits.cpu))))
+    if limits.memory is not None:
+        script.append('ulimit -v {}'.format(limits.memory // 1024))
+    script.append('exec "$0"')
+    return ['sh', '-c', ' && '.join(script), str(executable)]
+
+# Only used without the launcher, which measures the peak RSS exactly: it
+# is sampled from /proc while the program runs. Until the child is running
+# `executable` (a resolved path) it is not the program yet, and is not
+# sampled. None if it could not be sampled.
+def _sample_rss(pid, executable):
+    try:
+        if os.readlink('/proc/{}/exe'.format(pid)) != executable:
+            return None
+        with open('/proc/{}/status'.format(pid), 'rb') as f:
+            for line in f:
+                if line.startswith(b'VmHWM:'):
+                    return int(line.split()[1]) * 1024
+    except (OSError, ValueError, IndexError):
+        pass
+    return None
+
+def _exit_code(status):
+    if os.WIFSIGNALED(status):
+        return -os.WTERMSIG(status)
+    return os.WEXITSTATUS(status)
+
+def _limit_verdict(limits, timed_out, returncode, usage, stderr):
+    if timed_out:
+        return TIME_LIMIT_EXCEEDED
+    if returncode == 0:
+        return None
+    if limits.cpu is not None and (returncode == -signal.SIGXCPU or
+                                   usage.cpu >= limits.cpu):
+        return TIME_LIMIT_EXCEEDED
+    # The address space limit makes allocations fail, which usually ends in
+    # an uncaught std::bad_alloc. Memory that is not allocated but mapped
+    # (e.g. big static arrays, or the stack) kills the program instead.
+    if limits.memory is not None and (
+            b'bad_alloc' in stderr or -returncode in MEMORY_SIGNALS or
+            (usage.rss is not None and usage.rss >= 0.9 * limits.memory)):
+        return MEMORY_LIMIT_EXCEEDED
+    return None
+
+# Run `executable` with `inpfile` as stdin. Its output is streamed and
+# compared against `corfile` (if given) as it is produced, so memory use is
+# bounded no matter how much the program prints.
+#
+# stderr is still forwarded to ours (unless forward_stderr is False), but its
+# tail is kept to help telling apart memory limit errors.
+#
+# `checker` (see checkers) tells how outputs are compared. Default: exactly.
+def run_case(executable, inpfile, corfile=None, output_limit=OUTPUT_LIMIT,
+             window=DIFF_WINDOW, limits=DEFAULT_LIMITS, forward_stderr=True,
+             checker=None):
+    expected = _open_expected(corfile)
+    comparator = checkers.comparator(checker, expected, window)
+    if comparator is None:
+        comparator = _Comparator(expected, window)
+    verdict = None
+    timed_out = False
+    stderr = bytearray()
+    peak_rss = None
+    target = os.path.realpath(str(executable))
+    path = launcher.launcher()
+    report_r = report_w = None
+    if path is not None:
+        report_r, report_w = os.pipe()
+        argv = launcher.argv(path, limits, report_w, executable)
+    else:
+        argv = _shell_argv(limits, target)
+    start = time.monotonic()
+    try:
+        with inpfile.open('rb') as inp:
+            proc = subprocess.Popen(
+                argv, stdin=inp, stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
+                pass_fds=() if report_w is None else (report_w,)
+            )
+    except BaseException:
+        if report_r is not None:
+            os.close(report_r)
+        raise
+    finally:
+        if report_w is not None:
+            os.close(report_w)
+
+    def kill():
+        # The launcher kills the program and still reports its usage
+        if report_r is not None:
+            proc.send_signal(signal.SIGTERM)
+        else:
+            proc.kill()
+
+    try:
+        deadline = None if limits.wall is None else start + limits.wall
+        with selectors.DefaultSelector() as sel:
+            sel.register(proc.stdout, selectors.EVENT_READ)
+            sel.register(proc.stderr, selectors.EVENT_READ)
+            while verdict is None and sel.get_map():
+                timeout = None
+                if report_r is None:
+                    rss = _sample_rss(proc.pid, target)
+                    if rss is not None:
+                        peak_rss = max(peak_rss or 0, rss)
+                    timeout = RSS_SAMPLE_INTERVAL
+                if deadline is not None:
+                    remaining = deadline - time.monotonic()
+                    timeout = remaining if timeout is None else \
+                        min(timeout, remaining)
+                    if timeout <= 0:
+                        timed_out = True
+                        break
+                for key, _ in sel.select(timeout):
+                    chunk = os.read(key.fd, CHUNK_SIZE)
+                    if not chunk:
+                        sel.unregister(key.fileobj)
+                    elif key.fileobj is proc.stderr:
+                        if forward_stderr:
+                            _stderr_write(chunk)
+                        stderr += chunk
+                        del stderr[:-STDERR_TAIL]
+                    elif not comparator.feed(chunk):
+                        verdict = WRONG_ANSWER
+                    elif (output_limit is not None and
+                          comparator.size > output_limit):
+                        verdict = OUTPUT_LIMIT_EXCEEDED
+    except BaseException:
+        kill()
+        raise
+    finally:
+        if verdict is not None or timed_out:
+            kill()
+        proc.stdout.close()
+        proc.stderr.close()
+        _, status, rusage = os.wait4(proc.pid, 0)
+        if report_r is not None:
+            with os.fdopen(report_r, 'rb') as f:
+                report = launcher.parse_report(f.read())
+            if report is not None:
+                status, peak_rss = report
+        proc.returncode = returncode = _exit_code(status)
+
+    usage = Usage(
+        wall=time.monotonic() - start,
+        cpu=rusage.ru_utime + rusage.ru_stime,
+        rss=peak_rss
+    )
+    if verdict is None:
+        verdict = _limit_verdict(limits, timed_out, returncode, usage,
+                                 stderr)
+    if verdict is None:
+        if returncode != 0:
+            verdict = RUNTIME_ERROR
+        elif comparator.finish():
+            verdict = ACCEPTED
+        else:
+            verdict = WRONG_ANSWER
+    if verdict == WRONG_ANSWER:
+        out, cor, line, truncated = comparator.windows()
+    else:
+        out, cor, line, truncated = bytes(comparator.before), b'', None, False
+    if isinstance(expected, mmap.mmap):
+        expected.close()
+    return CaseResult(case=inpfile.stem, verdict=verdict,
+                      returncode=returncode, out=out, cor=cor,
+                      mismatch=comparator.mismatch, size=comparator.size,
+                      line=line, truncated=truncated, usage=usage)
+
+def _stderr_write(data):
+    try:
+        sys.stderr.buffer.write(data)
+        sys.stderr.flush()
+    except (AttributeError, ValueError):
+        pass
+
+def format_usage(usage):
+    rss = '? MiB' if usage.rss is None else \
+        '{:.1f} MiB'.format(usage.rss / (1024 * 1024))
+    return '{:.3f}s, cpu {:.3f}s, {}'.format(usage.wall, usage.cpu, rss)
+
+# Limits given as 0 (or less) disable the default
+def _seconds(value, default):
+    if value is None:
+        return default
+    return value if value > 0 else None
+
+def _mib(value, default):
+    if value is None:
+        return default
+    return int(value * 1024 * 1024) if value > 0 else None
+
+def limits_from_config(config):
+    return Limits(
+        wall=_seconds(config.getfloat('time_limit'), DEFAULT_LIMITS.wall),
+        cpu=_seconds(config.getfloat('cpu_limit'), DEFAULT_LIMITS.cpu),
+        memory=_mib(config.getfloat('memory_limit'), DEFAULT_LIMITS.memory)
+    )
+
+def output_limit_from_config(config):
+    return _mib(config.getfloat('output_limit'), OUTPUT_LIMIT)
+
+# Command-line options shared by every subcommand that runs cases
+def add_limit_arguments(parser):
+    parser.add_argument(
+        '--time-limit',
+        type=float,
+        metavar='SECONDS',
+        help='wall time limit for each case (0 for no limit).'
+             ' Default: {}'.format(DEFAULT_LIMITS.wall)
+    )
+    parser.add_argument(
+        '--cpu-limit',
+        type=float,
+        metavar='SECONDS',
+        help='CPU time limit for each case. Default: no limit'
+    )
+    parser.add_argument(
+        '--memory-limit',
+        type=float,
+        metavar='MIB',
+        help='address space limit for each case. Default: no limit'
+    )
+    parser.add_argument(
+        '--output-limit',
+        type=float,
+        metavar='MIB',
+        help='stop a case once it has written this many MiB (0 for no limit).'
+             ' Default: {}'.format(OUTPUT_LIMIT // (1024 * 1024))
+    )
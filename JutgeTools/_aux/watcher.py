@@ -0,0 +1,125 @@
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import sys
+import time
+from pathlib import Path
+
+DEBOUNCE = 0.2  # Seconds without events before reporting the changes
+POLL_INTERVAL = 0.5
+
+# inotify(7) flags
+_IN_MODIFY = 0x002
+_IN_CLOSE_WRITE = 0x008
+_IN_MOVED_FROM = 0x040
+_IN_MOVED_TO = 0x080
+_IN_CREATE = 0x100
+_IN_DELETE = 0x200
+_IN_NONBLOCK = os.O_NONBLOCK
+_IN_CLOEXEC = os.O_CLOEXEC
+_MASK = (_IN_CLOSE_WRITE | _IN_MOVED_FROM | _IN_MOVED_TO | _IN_CREATE |
+         _IN_DELETE | _IN_MODIFY)
+_EVENT = struct.Struct('iIII')
+
+def _ignored(name):
+    # Our own build products and editor temporaries
+    return (name.startswith('.') or name.endswith('~') or
+            name.endswith('.x') or name.endswith('.swp'))
+
+class _InotifyWatcher:
+    def __init__(self, path):
+        libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+        self.fd = libc.inotify_init1(_IN_NONBLOCK | _IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), 'inotify_init1 failed')
+        if libc.inotify_add_watch(self.fd, os.fsencode(str(path)),
+                                  _MASK) < 0:
+            os.close(self.fd)
+            raise OSError(ctypes.get_errno(), 'inotify_add_watch failed')
+        self.path = path
+
+    def poll(self, timeout):
+        changed = set()
+        if not select.select([self.fd], [], [], timeout)[0]:
+            return changed
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return changed
+        offset = 0
+        while offset < len(data):
+            _, _, _, length = _EVENT.unpack_from(data, offset)
+            offset += _EVENT.size
+            name = data[offset:offset + length].rstrip(b'\0')
+            offset += length
+            if name:
+                changed.add(os.fsdecode(name))
+        return changed
+
+    def close(self):
+        os.close(self.fd)
+
+class _PollingWatcher:
+    def __init__(self, path):
+        self.path = path
+        self.snapshot = self._snapshot()
+
+    def _snapshot(self):
+        snapshot = {}
+        for entry in os.scandir(str(self.path)):
+            try:
+                st = entry.stat()
+            except OSError:
+                continue
+            snapshot[entry.name] = (st.st_mtime_ns, st.st_size)
+        return snapshot
+
+    def poll(self, timeout):
+        time.sleep(min(timeout, POLL_INTERVAL) if timeout is not None
+                   else POLL_INTERVAL)
+        new = self._snapshot()
+        old = self.snapshot
+        self.snapshot = new
+        return {name for name in set(old) | set(new)
+                if old.get(name) != new.get(name)}
+
+    def close(self):
+        pass
+
+class Watcher:
+    # Report changed files in a directory (not recursive), using inotify on
+    # Linux and polling elsewhere
+    def __init__(self, path, debounce=DEBOUNCE):
+        self.path = Path(path)
+        self.debounce = debounce
+        self._impl = None
+        if sys.platform.startswith('linux'):
+            try:
+                self._impl = _InotifyWatcher(self.path)
+            except (OSError, AttributeError):
+                pass
+        if self._impl is None:
+            self._impl = _PollingWatcher(self.path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self._impl.close()
+
+    # Block until something changes, then keep collecting until there has
+    # been no event for `debounce` seconds (editors often write a file in
+    # several steps). Returns the changed paths.
+    def wait(self):
+        changed = set()
+        while not changed:
+            changed = {n for n in self._impl.poll(None) if not _ignored(n)}
+        while True:
+            more = {n for n in self._impl.poll(self.debounce)
+                    if not _ignored(n)}
+            if not more:
+                break
+            changed |= more
+        return sorted(self.path / name for name in changed)
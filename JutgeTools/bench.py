@@ -0,0 +1,240 @@
+from pathlib import Path
+import json
+import math
+import statistics
+from .compilef import compilef
+from ._aux.errors import BenchError, CompileError
+from ._aux import runner, profiles, checkers
+
+DEFAULT_RUNS = 10
+DEFAULT_WARMUP = 1
+DEFAULT_THRESHOLD = 10.0  # Percent
+
+def _percentile(values, p):
+    # Nearest-rank percentile
+    values = sorted(values)
+    return values[max(int(math.ceil(p / 100 * len(values))) - 1, 0)]
+
+def _summary(values):
+    return {
+        'min': min(values),
+        'median': statistics.median(values),
+        'p95': _percentile(values, 95)
+    }
+
+def _bench_case(executable, inpfile, runs, warmup, limits, output_limit,
+                checker):
+    corfile = inpfile.with_suffix('.cor')
+    if not corfile.exists():
+        corfile = None
+    wall = []
+    cpu = []
+    for i in range(warmup + runs):
+        result = runner.run_case(executable, inpfile, corfile, output_limit,
+                                 limits=limits, checker=checker)
+        if result.verdict != runner.ACCEPTED:
+            raise BenchError('case "{}" failed with verdict {}'.format(
+                result.case, result.verdict))
+        if i >= warmup:
+            wall.append(result.usage.wall)
+            cpu.append(result.usage.cpu)
+    return {'wall': _summary(wall), 'cpu': _summary(cpu)}
+
+def _compare(results, baseline, threshold):
+    regressions = []
+    print()
+    print('Comparison against baseline (median wall time):')
+    for case, stats in sorted(results.items()):
+        base = baseline.get('cases', {}).get(case)
+        if base is None:
+            print('{:<20} (not in baseline)'.format(case))
+            continue
+        old = base['wall']['median']
+        new = stats['wall']['median']
+        change = (new - old) / old * 100 if old > 0 else 0.0
+        regressed = change > threshold
+        print('{:<20} {:>9.4f}s -> {:>9.4f}s {:>+7.1f}%{}'.format(
+            case, old, new, change, '  REGRESSION' if regressed else ''))
+        if regressed:
+            regressions.append(case)
+    if regressions:
+        raise BenchError('{} case(s) regressed by more than {}%: {}'.format(
+            len(regressions), threshold, ', '.join(regressions)))
+
+def _select_cases(cwd, cases):
+    inpfiles = sorted(cwd.glob('*.inp'))
+    if not cases:
+        return inpfiles
+    selected = set()
+    for case in cases:
+        if case.endswith(('.inp', '.cor')):
+            case = case[:-len('.inp')]
+        inpfile = cwd / (case + '.inp')
+        if not inpfile.exists():
+            raise BenchError('case "{}" does not exist'.format(case))
+        selected.add(inpfile)
+    return sorted(selected)
+
+def bench(cases=None, runs=DEFAULT_RUNS, warmup=DEFAULT_WARMUP, compile=True,
+          strict=True, force=False, incremental=False, pch=True, save=None,
+          compare=None, threshold=DEFAULT_THRESHOLD,
+          limits=runner.DEFAULT_LIMITS, output_limit=runner.OUTPUT_LIMIT,
+          profile='release', checker=None):
+    if runs < 1:
+        raise BenchError('at least one run per case is needed')
+    if warmup < 0:
+        raise BenchError('the number of warm-up runs cannot be negative')
+    cwd = Path.cwd()
+    # Fail before compiling if a case is missing
+    inpfiles = _select_cases(cwd, cases)
+    if not inpfiles:
+        raise BenchError('no test cases to benchmark')
+    profile = profiles.get(profile)
+    executable = cwd / profiles.artifact_name(cwd, profile)
+    if compile or not executable.exists():
+        try:
+            compilef(strict=strict, profile=profile, force=force,
+                     incremental=incremental, pch=pch)
+        except CompileError as ex:
+            raise BenchError(ex) from ex
+    assert(executable.exists())
+
+    baseline = None
+    if compare is not None:
+        try:
+            with Path(compare).open('r') as f:
+                baseline = json.load(f)
+        except (OSError, ValueError) as ex:
+            raise BenchError('cannot read baseline {}: {}'.format(compare, ex))
+
+    print('Benchmarking {} run(s) per case after {} warm-up run(s)'.format(
+        runs, warmup))
+    print('{:<20} {:>30} {:>30}'.format('', 'wall (min/median/p95)',
+                                        'cpu (min/median/p95)'))
+    results = {}
+    for inpfile in inpfiles:
+        # Cases are run one at a time so that they do not disturb each other
+        stats = _bench_case(executable, inpfile, runs, warmup, limits,
+                            output_limit, checker)
+        results[inpfile.stem] = stats
+        print('{:<20} {:>30} {:>30}'.format(inpfile.stem, *(
+            '{min:.4f}/{median:.4f}/{p95:.4f}'.format(**stats[k])
+            for k in ('wall', 'cpu')
+        )))
+
+    if save is not None:
+        with Path(save).open('w') as f:
+            json.dump({
+                'executable': executable.name,
+                'profile': profile.name,
+                'runs': runs,
+                'warmup': warmup,
+                'cases': results
+            }, f, indent=2, sort_keys=True)
+        print('Baseline saved to ' + str(save))
+
+    if baseline is not None:
+        _compare(results, baseline, threshold)
+
+def _parse_args(config):
+    d = {
+        'cases': config['case'],
+        'runs': config.getint('runs', DEFAULT_RUNS),
+        'warmup': config.getint('warmup', DEFAULT_WARMUP),
+        'compile': config.getboolean('compile', True),
+        'strict': config.getboolean('strict', True),
+        'force': config.getboolean('force', False),
+        'incremental': config.getboolean('incremental', False),
+        'pch': config.getboolean('pch', True),
+        'save': config.get('save'),
+        'compare': config.get('compare'),
+        'threshold': config.getfloat('threshold', DEFAULT_THRESHOLD),
+        'limits': runner.limits_from_config(config),
+        'output_limit': runner.output_limit_from_config(config)
+    }
+
+    def exc():
+        # An optimized build unless told otherwise
+        return bench(profile=profiles.from_config(config, 'release'),
+                     checker=checkers.from_config(config, Path.cwd()), **d)
+    return exc
+
+def _setup_parser(parent):
+    bench_parser = parent.add_parser(
+        'bench',
+        description='Time repeated runs of each test case with an optimized'
+                    ' build, and optionally save or compare against a'
+                    ' baseline.',
+        help='benchmark the current exercise'
+    )
+    bench_parser.set_defaults(action=_parse_args)
+
+    bench_parser.add_argument(
+        'case',
+        nargs='*',
+        help='benchmark only this case(s). By default all cases are used.'
+             ' Specify without extension: `sample1`...'
+    )
+
+    bench_parser.add_argument(
+        '-n', '--runs',
+        type=int,
+        metavar='N',
+        help='timed runs per case. Default: {}'.format(DEFAULT_RUNS)
+    )
+
+    bench_parser.add_argument(
+        '-w', '--warmup',
+        type=int,
+        metavar='N',
+        help='untimed runs per case before the timed ones.'
+             ' Default: {}'.format(DEFAULT_WARMUP)
+    )
+
+    bench_compile_group = bench_parser.add_mutually_exclusive_group()
+    bench_compile_group.add_argument(
+        '-C', '--no-compile',
+        action='store_false',
+        dest='compile',
+        help='do not recompile. Ignored if there is not an executable'
+    )
+    bench_compile_group.add_argument(
+        '--no-strict',
+        action='store_false',
+        dest='strict',
+        help='compile with the --no-strict flag'
+    )
+
+    bench_parser.add_argument(
+        '--force',
+        action='store_true',
+        help='recompile even if the build cache is up to date'
+    )
+
+    bench_parser.add_argument(
+        '-s', '--save',
+        metavar='FILE',
+        help='save the results as a JSON baseline'
+    )
+
+    bench_parser.add_argument(
+        '-c', '--compare',
+        metavar='FILE',
+        help='compare the results against a JSON baseline and fail if a case'
+             ' got slower than the threshold'
+    )
+
+    bench_parser.add_argument(
+        '-t', '--threshold',
+        type=float,
+        metavar='PERCENT',
+        help='maximum allowed increase of the median wall time.'
+             ' Default: {}'.format(DEFAULT_THRESHOLD)
+    )
+
+    profiles.add_profile_argument(bench_parser)
+
+    runner.add_limit_arguments(bench_parser)
+    checkers.add_checker_arguments(bench_parser)
+
+    return bench_parser
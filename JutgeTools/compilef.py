@@ -1,48 +1,196 @@
 from string import Template
 from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+import hashlib
+import json
+import os
 import shlex
 import subprocess
 from ._aux.errors import CompileError
+from ._aux import build_cache, profiles
+from ._aux.pch import precompiled_prelude
 
 COMPILE_FLAGS = ('-ansi -Wall -Wextra -Werror -Wno-uninitialized'
                  ' -Wno-sign-compare -Wshadow')
 
+# Per translation unit objects for incremental builds
+BUILD_DIR = '.build'
+
+def _substitute(compiler_tpl, output, flags, sources):
+    try:
+        return compiler_tpl.substitute(
+            output=shlex.quote(str(output)), flags=' '.join(flags),
+            sources=' '.join(shlex.quote(str(f)) for f in sources)
+        )
+    except KeyError as ex:
+        raise CompileError('{} is not a valid variable'.format(ex))
+
+# Unless verbose, the compiler output is only shown (as part of the error)
+# if it fails
+def _run_compiler(cmd, verbose=True):
+    if verbose:
+        print('> ' + cmd)
+        returncode = subprocess.call(cmd, shell=True)
+        output = ''
+    else:
+        proc = subprocess.run(cmd, shell=True, stdout=subprocess.PIPE,
+                              stderr=subprocess.STDOUT)
+        returncode = proc.returncode
+        output = proc.stdout.decode('utf-8', 'replace').rstrip()
+    if returncode != 0:
+        msg = 'compiler exited with status ' + str(returncode)
+        if output:
+            msg += ':\n' + output
+        raise CompileError(msg)
+
+def _read_deps(depfile):
+    # Prerequisites of the first rule of a -MMD dependency file
+    try:
+        with depfile.open('r') as f:
+            text = f.read()
+    except OSError:
+        return None
+    rule = text.replace('\\\n', ' ').split('\n', 1)[0]
+    _, _, prereqs = rule.partition(': ')
+    deps = prereqs.replace('\\ ', '\0').split()
+    return [Path(d.replace('\0', ' ')) for d in deps]
+
+def _tu_key(source, depfile, flags):
+    deps = _read_deps(depfile)
+    if deps is None:
+        return None
+    h = hashlib.sha256(' '.join(flags).encode('utf-8'))
+    for dep in [source] + deps:
+        try:
+            h.update(b'\0' + build_cache.file_digest(dep).encode('ascii'))
+        except OSError:
+            return None
+    return h.hexdigest()
+
+def _compile_objects(compiler_tpl, output, flags, sources, jobs, cwd,
+                     pch, force, verbose):
+    # Build dirs are keyed by flags, so that switching between debug and
+    # non-debug builds does not throw away the other set of objects
+    flags_id = hashlib.sha256(
+        (compiler_tpl.template + '\0' + ' '.join(flags)).encode('utf-8')
+    ).hexdigest()[:12]
+    build_dir = cwd / BUILD_DIR / flags_id
+    if not build_dir.exists():
+        build_dir.mkdir(parents=True)
+    manifest_file = build_dir / 'manifest.json'
+    try:
+        with manifest_file.open('r') as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        manifest = {}
+
+    units = []
+    stale = []
+    for source in sources:
+        obj = build_dir / (source.name + '.o')
+        dep = build_dir / (source.name + '.d')
+        units.append(obj)
+        key = _tu_key(source, dep, flags)
+        if (not obj.exists() or key is None or
+                manifest.get(str(source)) != key):
+            stale.append((source, obj, dep))
+
+    def compile_unit(unit):
+        source, obj, dep = unit
+        # Each unit gets the prelude of its own includes. It only depends on
+        # the source, so it is left out of the key.
+        unit_flags = flags + _prelude_flags(compiler_tpl, flags, [source],
+                                            pch, force, verbose)
+        _run_compiler(_substitute(
+            compiler_tpl, obj,
+            unit_flags + ['-c', '-MMD', '-MP', '-MF', shlex.quote(str(dep))],
+            [source]
+        ), verbose)
+        return source, _tu_key(source, dep, flags)
+
+    if verbose:
+        print('{} of {} translation units out of date'.format(
+            len(stale), len(sources)))
+    if jobs is None:
+        jobs = os.cpu_count() or 1
+    with ThreadPoolExecutor(max_workers=max(jobs, 1)) as executor:
+        futures = [executor.submit(compile_unit, u) for u in stale]
+        try:
+            for f in futures:
+                source, key = f.result()
+                manifest[str(source)] = key
+        finally:
+            for f in futures:
+                f.cancel()
+            with manifest_file.open('w') as f:
+                json.dump(manifest, f, indent=1, sort_keys=True)
+
+    _run_compiler(_substitute(compiler_tpl, output, flags, units), verbose)
+
+def _prelude_flags(compiler_tpl, flags, sources, pch, force, verbose):
+    if not pch:
+        return []
+    prelude = precompiled_prelude(compiler_tpl, flags, sources, _substitute,
+                                  verbose, force)
+    if prelude is None:
+        return []
+    return ['-include', shlex.quote(str(prelude))]
+
 # Avoid clash with built-in "compile"
-def compilef(strict=True, debug=True, compiler=None, sources=''):
+def compilef(strict=True, debug=True, compiler=None, sources='',
+             force=False, incremental=False, jobs=None, pch=True,
+             output=None, profile=None, directory=None, verbose=True):
+    # `debug` only chooses between the debug and release profiles
+    if profile is None:
+        profile = profiles.DEFAULT_PROFILE if debug else 'release'
+    profile = profiles.get(profile)
+    if profile.compiler is not None:
+        compiler = profile.compiler
     if compiler is None:
         compiler = 'g++ -o $output $flags $sources'
-    print('Compiling...')
-    cwd = Path.cwd()
+    if verbose and profile.name == profiles.DEFAULT_PROFILE:
+        print('Compiling...')
+    elif verbose:
+        print('Compiling ({})...'.format(profile.name))
+    # The exercise dir: the current one unless given
+    cwd = Path.cwd() if directory is None else Path(directory).resolve()
     if not sources:
         sources = list(cwd.glob('*.cc'))
     if not sources:
         raise CompileError('no C++ files (must end in .cc)')
+    sources = [Path(f).resolve() for f in sources]
     compiler_tpl = Template(compiler)
-    output = Path(cwd.name.split('_')[0]).with_suffix('.x')
-    if debug:
-        flags = shlex.split('-g -O0')
-    else:
-        flags = shlex.split('-DNDEBUG -O2')
+    if output is None:
+        output = profiles.artifact_name(cwd, profile)
+    output = Path(output)
+    if directory is not None:
+        output = cwd / output
+    flags = list(profile.flags)
 
     if strict:
         flags += shlex.split(COMPILE_FLAGS)
 
-    sources_subs = map(lambda f: shlex.quote(str(Path(f).resolve())), sources)
+    if not incremental:
+        # The headers all the sources start with, as they share the command
+        flags += _prelude_flags(compiler_tpl, flags, sources, pch, force,
+                                verbose)
 
-    try:
-        compiler_cmd = compiler_tpl.substitute(
-            output=shlex.quote(str(output)), flags=' '.join(flags),
-            sources=' '.join(sources_subs)
-        )
-    except KeyError as ex:
-        raise CompileError('{} is not a valid variable'.format(ex))
+    compiler_cmd = _substitute(compiler_tpl, output, flags, sources)
 
-    print('> ' + compiler_cmd)
-    try:
-        subprocess.check_call(compiler_cmd, shell=True)
-    except subprocess.CalledProcessError as ex:
-        raise CompileError('compiled exited with status ' +
-                           str(ex.returncode))
+    mode = ['(incremental)'] if incremental else []
+    cache_key = build_cache.build_key(compiler_cmd, sources, flags + mode)
+    if not force and build_cache.is_fresh(output, cache_key):
+        if verbose:
+            print('Build cache hit: {} is up to date'.format(output))
+        return output
+    if verbose:
+        print('Build cache miss')
+
+    if incremental:
+        _compile_objects(compiler_tpl, output, flags, sources, jobs, cwd,
+                         pch, force, verbose)
+    else:
+        _run_compiler(compiler_cmd, verbose)
     # try:
     #     subprocess.check_call(args)
     # except subprocess.CalledProcessError as ex:
@@ -52,18 +200,43 @@ def compilef(strict=True, debug=True, compiler=None, sources=''):
     #     raise CompileError(compiler +
     #                        ' not installed; try specifying a different'
     #                        ' compiler')
-    print('Compiled successfully')
+    build_cache.record(output, cache_key)
+    if verbose:
+        print('Compiled successfully')
+    return output
+
+# Build every profile at the same time
+def compile_all(profile_list, **kwargs):
+    failed = []
+    with ThreadPoolExecutor(max_workers=max(len(profile_list), 1)) as executor:
+        futures = [(p.name, executor.submit(compilef, profile=p, **kwargs))
+                   for p in profile_list]
+        for name, future in futures:
+            try:
+                future.result()
+            except CompileError as ex:
+                print('Profile {} failed: {}'.format(name, ex))
+                failed.append(name)
+    if failed:
+        raise CompileError('{} of {} profiles failed: {}'.format(
+            len(failed), len(profile_list), ', '.join(failed)))
 
 def _parse_args(config):
     d = {
         'strict': config.getboolean('strict', True),
-        'debug': config.getboolean('debug', True),
         'compiler': config.get('compiler'),
-        'sources': config['source']
+        'sources': config['source'],
+        'force': config.getboolean('force', False),
+        'incremental': config.getboolean('incremental', False),
+        'jobs': config.getint('jobs'),
+        'pch': config.getboolean('pch', True)
     }
 
     def exc():
-        return compilef(**d)
+        if config.getboolean('all_profiles', False):
+            return compile_all(
+                sorted(profiles.all_profiles(config).values()), **d)
+        return compilef(profile=profiles.from_config(config), **d)
     return exc
 
 def _setup_parser(parent):
@@ -86,11 +259,51 @@ def _setup_parser(parent):
         help='compiler to be used. Must support g++-like flags. Default: g++'
     )
 
-    compile_parser.add_argument(
+    compile_profile_group = compile_parser.add_mutually_exclusive_group()
+    compile_profile_group.add_argument(
         '--no-debug',
         action='store_false',
         dest='debug',
-        help='do not include debugging symbols (and add -DNDEBUG -O2)'
+        help='do not include debugging symbols (and add -DNDEBUG -O2). Same'
+             ' as --profile release'
+    )
+    profiles.add_profile_argument(compile_profile_group)
+    compile_profile_group.add_argument(
+        '-a', '--all-profiles',
+        action='store_true',
+        default=None,
+        help='build every profile, in parallel'
+    )
+
+    compile_parser.add_argument(
+        '--no-pch',
+        action='store_false',
+        dest='pch',
+        default=None,
+        help='do not precompile the standard headers the sources start with'
+    )
+
+    compile_parser.add_argument(
+        '-f', '--force',
+        action='store_true',
+        help='compile even if the build cache says the executable is'
+             ' up to date, and try again to precompile headers that failed'
+    )
+
+    compile_parser.add_argument(
+        '-i', '--incremental',
+        action='store_true',
+        default=None,
+        help='compile each source to its own object (in {}) and link them,'
+             ' recompiling only what changed'.format(BUILD_DIR)
+    )
+
+    compile_parser.add_argument(
+        '-j', '--jobs',
+        type=int,
+        metavar='N',
+        help='with --incremental, compile up to N sources at the same time.'
+             ' Default: number of CPUs'
     )
 
     compile_parser.add_argument(
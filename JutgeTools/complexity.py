@@ -0,0 +1,322 @@
+from pathlib import Path
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import math
+import os
+import subprocess
+import tempfile
+from .compilef import compilef
+from ._aux.errors import ComplexityError, CompileError
+from ._aux.programs import build_program, run_program
+from ._aux import runner, profiles, checkers
+
+DEFAULT_MIN_N = 100
+DEFAULT_FACTOR = 2.0
+DEFAULT_RUNS = 3
+DEFAULT_BUDGET = 1.0  # Seconds of cpu at which to stop growing n
+# Times under this are mostly startup and clock resolution
+MIN_FIT_TIME = 0.01
+MIN_FIT_POINTS = 3
+
+# Growth of the running time of each model, besides a constant term that
+# stands for the startup and the reading of the input
+MODELS = OrderedDict([
+    ('O(1)', None),
+    ('O(log n)', lambda n: math.log2(n)),
+    ('O(n)', lambda n: n),
+    ('O(n log n)', lambda n: n * math.log2(n)),
+    ('O(n^2)', lambda n: n ** 2),
+    ('O(n^2 log n)', lambda n: n ** 2 * math.log2(n)),
+    ('O(n^3)', lambda n: n ** 3),
+])
+
+def sizes(min_n, max_n, factor):
+    n = max(min(min_n, max_n), 1)
+    while n < max_n:
+        yield n
+        n = max(int(round(n * factor)), n + 1)
+    yield max_n
+
+# Fit t = a + c g(n), with a, c >= 0, minimizing the relative errors (times
+# span orders of magnitude). Returns (a, c, root mean square relative error)
+# or None if the model does not fit at all.
+def fit(ns, times, growth):
+    ws = [1 / t ** 2 for t in times]
+    if growth is None:
+        a = sum(w * t for w, t in zip(ws, times)) / sum(ws)
+        c = 0.0
+    else:
+        gs = [growth(n) for n in ns]
+        s = sum(ws)
+        sg = sum(w * g for w, g in zip(ws, gs))
+        sgg = sum(w * g * g for w, g in zip(ws, gs))
+        st = sum(w * t for w, t in zip(ws, times))
+        sgt = sum(w * g * t for w, g, t in zip(ws, gs, times))
+        det = s * sgg - sg * sg
+        a = (st * sgg - sg * sgt) / det if det else -1.0
+        c = (s * sgt - sg * st) / det if det else 0.0
+        if a < 0:
+            a, c = 0.0, sgt / sgg
+        if c <= 0:
+            return None
+    error = math.sqrt(sum(
+        ((predict(growth, a, c, n) - t) / t) ** 2
+        for n, t in zip(ns, times)) / len(times))
+    return a, c, error
+
+def predict(growth, a, c, n):
+    return a if growth is None else a + c * growth(n)
+
+def _time_size(n, seed, tmpdir, solution, generator, runs, limits,
+               output_limit):
+    inpfile = tmpdir / 'n{}.inp'.format(n)
+    with inpfile.open('wb') as inp:
+        run_program([str(generator), str(n), str(seed)], subprocess.DEVNULL,
+                    inp, limits.wall, 'the generator (n = {})'.format(n))
+    best = None
+    for _ in range(runs):
+        result = runner.run_case(solution, inpfile, None, output_limit,
+                                 limits=limits, forward_stderr=False)
+        if result.verdict != runner.ACCEPTED:
+            best = result
+            break
+        if best is None or result.usage.cpu < best.usage.cpu:
+            best = result
+    inpfile.unlink()
+    return n, best
+
+# The time limit of the problem, to compare the projection with:
+# --cpu-limit or --time-limit if given, else time_limit in its section of
+# the config file (as for checkers), else the limits in the defaults of the
+# file. None if it has none: the default limit of the runs is only there so
+# that they end.
+def problem_time_limit(config, directory):
+    for key in ('cpu_limit', 'time_limit'):
+        value = config.given(key)
+        if value is not None and value > 0:
+            return value
+    sections = config.sections(checkers.SECTION_PREFIX)
+    name = Path(directory).name
+    section = sections.get(name, sections.get(name.split('_')[0], {}))
+    if 'time_limit' in section:
+        try:
+            return float(section['time_limit'])
+        except ValueError:
+            raise ComplexityError('time_limit must be a number, not'
+                                  ' "{}"'.format(section['time_limit']))
+    for key in ('cpu_limit', 'time_limit'):
+        value = config.getfloat(key)
+        if value is not None and value > 0:
+            return value
+    return None
+
+def _print_fits(fits, best):
+    print()
+    print('{:<14} {:>10}'.format('model', 'error'))
+    for name, (a, c, error) in sorted(fits.items(), key=lambda f: f[1][2]):
+        print('{:<14} {:>9.1f}%{}'.format(name, error * 100,
+                                          '  <- best' if name == best else ''))
+
+# Run the solution on inputs of geometrically growing size n (printed by the
+# generator, given n and a seed as its arguments) until a run takes `budget`
+# seconds or n reaches max_n, and fit the times against each of MODELS
+def complexity(generator, max_n, min_n=DEFAULT_MIN_N, factor=DEFAULT_FACTOR,
+               runs=DEFAULT_RUNS, budget=DEFAULT_BUDGET, seed=1, jobs=None,
+               strict=True, force=False, pch=True,
+               limits=runner.DEFAULT_LIMITS, output_limit=runner.OUTPUT_LIMIT,
+               profile='release', time_limit=None):
+    if max_n < 1 or min_n < 1:
+        raise ComplexityError('sizes must be positive')
+    if factor <= 1:
+        raise ComplexityError('the factor must be greater than 1')
+    cwd = Path.cwd()
+    if jobs is None:
+        jobs = os.cpu_count() or 1
+    generator = Path(generator).resolve()
+
+    # The solution is every other source in the dir
+    sources = [f for f in cwd.glob('*.cc') if f.resolve() != generator]
+    if not sources:
+        raise ComplexityError('no C++ files (must end in .cc) for the'
+                              ' solution')
+    try:
+        solution = compilef(strict=strict, sources=sources, force=force,
+                            pch=pch, profile=profile).resolve()
+    except CompileError as ex:
+        raise ComplexityError(ex) from ex
+    generator = build_program(generator, force, pch)
+
+    print('Timing n = {} to {} (x{:g}), best cpu time of {} run(s)'.format(
+        min(min_n, max_n), max_n, factor, runs))
+    print('{:>12} {:>10} {:>10}'.format('n', 'cpu (s)', 'wall (s)'))
+    measured = []
+    failed = None
+    over_budget = False
+    pending = iter(sizes(min_n, max_n, factor))
+    with tempfile.TemporaryDirectory(prefix='jutge-complexity-') as tmpdir, \
+            ThreadPoolExecutor(max_workers=max(jobs, 1)) as executor:
+        # Sizes are timed `jobs` at a time, smallest first, so that no more
+        # than a batch is run past the budget
+        while failed is None and not over_budget:
+            batch = [executor.submit(_time_size, n, seed, Path(tmpdir),
+                                     solution, generator, runs, limits,
+                                     output_limit)
+                     for _, n in zip(range(max(jobs, 1)), pending)]
+            if not batch:
+                break
+            for future in batch:
+                n, result = future.result()
+                if failed is not None:
+                    continue  # Larger than a size that failed
+                if result.verdict != runner.ACCEPTED:
+                    failed = 'verdict {} at n = {}'.format(result.verdict, n)
+                    continue
+                measured.append((n, result.usage.cpu))
+                print('{:>12} {:>10.4f} {:>10.4f}'.format(
+                    n, result.usage.cpu, result.usage.wall))
+                over_budget = over_budget or result.usage.cpu >= budget
+    if failed is not None:
+        print('Stopped on ' + failed)
+    elif over_budget:
+        print('Stopped after the budget of {:g}s'.format(budget))
+    if measured and measured[-1][0] == max_n:
+        print('Took {:.4f}s of cpu at the maximum n'.format(measured[-1][1]))
+
+    points = [(n, t) for n, t in measured if t >= MIN_FIT_TIME]
+    if len(points) < MIN_FIT_POINTS:
+        if measured and measured[-1][0] == max_n:
+            print('Too fast to tell the complexity apart')
+            return
+        msg = 'only {} size(s) took {}s or more, {} are needed to fit'.format(
+            len(points), MIN_FIT_TIME, MIN_FIT_POINTS)
+        if failed is None:
+            msg += ': try a smaller --factor or a larger --budget'
+        raise ComplexityError(msg)
+    ns = [n for n, _ in points]
+    times = [t for _, t in points]
+    fits = OrderedDict()
+    for name, growth in MODELS.items():
+        result = fit(ns, times, growth)
+        if result is not None:
+            fits[name] = result
+    best = min(fits, key=lambda name: fits[name][2])
+    _print_fits(fits, best)
+
+    a, c, _ = fits[best]
+    projected = predict(MODELS[best], a, c, max_n)
+    print()
+    if MODELS[best] is None:
+        print('Best fit: {} (t = {:.3g}s)'.format(best, a))
+    else:
+        print('Best fit: {} (t = {:.3g}s + {:.3g}s * {})'.format(
+            best, a, c, best[2:-1]))
+    if time_limit is None:
+        print('Projected at n = {}: {:.3g}s (the problem has no time limit'
+              ' set: use --cpu-limit or time_limit in [{}ID])'.format(
+                  max_n, projected, checkers.SECTION_PREFIX))
+    else:
+        print('Projected at n = {}: {:.3g}s ({} the limit of {:g}s)'.format(
+            max_n, projected,
+            'over' if projected > time_limit else 'within', time_limit))
+
+def _parse_args(config):
+    d = {
+        'generator': config['generator'],
+        'max_n': config.getint('max_n'),
+        'min_n': config.getint('min_n', DEFAULT_MIN_N),
+        'factor': config.getfloat('factor', DEFAULT_FACTOR),
+        'runs': config.getint('runs', DEFAULT_RUNS),
+        'budget': config.getfloat('budget', DEFAULT_BUDGET),
+        'seed': config.getint('seed', 1),
+        'jobs': config.getint('jobs'),
+        'strict': config.getboolean('strict', True),
+        'force': config.getboolean('force', False),
+        'pch': config.getboolean('pch', True),
+        'limits': runner.limits_from_config(config),
+        'output_limit': runner.output_limit_from_config(config)
+    }
+
+    def exc():
+        # An optimized build unless told otherwise
+        return complexity(profile=profiles.from_config(config, 'release'),
+                          time_limit=problem_time_limit(config, Path.cwd()),
+                          **d)
+    return exc
+
+def _setup_parser(parent):
+    complexity_parser = parent.add_parser(
+        'complexity', aliases=['cx'],
+        description='Time the exercise in the current dir on inputs of'
+                    ' growing size n, printed by a generator that gets n and'
+                    ' a seed as its arguments, fit the times to O(n),'
+                    ' O(n log n), O(n^2)... and project the time at the'
+                    ' maximum n of the problem',
+        help='estimate the time complexity'
+    )
+    complexity_parser.set_defaults(action=_parse_args)
+
+    complexity_parser.add_argument(
+        'generator',
+        help='generator source (.cc or .cpp, compiled) or executable'
+    )
+    complexity_parser.add_argument(
+        'max_n',
+        type=int,
+        metavar='MAX_N',
+        help='maximum n of the problem, where the time is projected'
+    )
+
+    complexity_parser.add_argument(
+        '--min-n',
+        type=int,
+        metavar='N',
+        help='first n. Default: {}'.format(DEFAULT_MIN_N)
+    )
+    complexity_parser.add_argument(
+        '--factor',
+        type=float,
+        help='n grows by this factor each time. Default: {:g}'.format(
+            DEFAULT_FACTOR)
+    )
+    complexity_parser.add_argument(
+        '-b', '--budget',
+        type=float,
+        metavar='SECONDS',
+        help='stop growing n once a run takes this long.'
+             ' Default: {:g}'.format(DEFAULT_BUDGET)
+    )
+    complexity_parser.add_argument(
+        '-n', '--runs',
+        type=int,
+        metavar='N',
+        help='runs per size, of which the fastest is kept.'
+             ' Default: {}'.format(DEFAULT_RUNS)
+    )
+    complexity_parser.add_argument(
+        '-s', '--seed',
+        type=int,
+        help='seed given to the generator. Default: 1'
+    )
+    complexity_parser.add_argument(
+        '-j', '--jobs',
+        type=int,
+        metavar='N',
+        help='time up to N sizes at the same time. Default: number of CPUs'
+    )
+
+    complexity_parser.add_argument(
+        '--no-strict',
+        action='store_false',
+        dest='strict',
+        help='compile with the --no-strict flag'
+    )
+    profiles.add_profile_argument(complexity_parser)
+    complexity_parser.add_argument(
+        '--force',
+        action='store_true',
+        help='recompile even if the build cache is up to date'
+    )
+
+    runner.add_limit_arguments(complexity_parser)
+
+    return complexity_parser
@@ -4,17 +4,21 @@ import subprocess
 import shlex
 from ._aux.errors import DebugError, CompileError
 from .compilef import compilef
+from ._aux import profiles
 
-def debug(debugger=None, compile=True, strict=True):
+def debug(debugger=None, compile=True, strict=True, force=False,
+          incremental=False, pch=True, profile=profiles.DEFAULT_PROFILE):
     if debugger is None:
         debugger = 'gdb -tui $exe'  # GDB with GUI
     debugger_tpl = Template(debugger)
     cwd = Path.cwd()
 
-    executable = cwd / (cwd.name.split('_')[0] + '.x')
+    profile = profiles.get(profile)
+    executable = cwd / profiles.artifact_name(cwd, profile)
     if compile or not executable.exists():
         try:
-            compilef(strict=strict)
+            compilef(strict=strict, force=force, incremental=incremental,
+                     pch=pch, profile=profile)
         except CompileError as ex:
             raise DebugError(ex) from ex
     assert(executable.exists())
@@ -32,11 +36,14 @@ def debug(debugger=None, compile=True, strict=True):
 def _parse_args(config):
     d = {
         'debugger': config.get('debugger', None),
-        'strict': config.getboolean('strict', True)
+        'strict': config.getboolean('strict', True),
+        'force': config.getboolean('force', False),
+        'incremental': config.getboolean('incremental', False),
+        'pch': config.getboolean('pch', True)
     }
 
     def exc():
-        return debug(**d)
+        return debug(profile=profiles.from_config(config), **d)
     return exc
 
 def _setup_parser(parent):
@@ -61,4 +68,12 @@ def _setup_parser(parent):
         help='compile with the --no-strict flag'
     )
 
+    profiles.add_profile_argument(debug_parser)
+
+    debug_parser.add_argument(
+        '--force',
+        action='store_true',
+        help='recompile even if the build cache is up to date'
+    )
+
     return debug_parser
@@ -1,80 +1,111 @@
-from urllib.request import urlopen
-from urllib.error import HTTPError
 from pathlib import Path
 from zipfile import ZipFile, BadZipfile
-from ._aux.errors import DownloadError
+from tempfile import SpooledTemporaryFile
+from concurrent.futures import ThreadPoolExecutor
+from collections import OrderedDict
+import shutil
+import sys
+import time
+from ._aux.errors import DownloadError, SkelError
+from ._aux.http import ConnectionPool
+from ._aux.problem_cache import ProblemCache, CACHE_SIZE, CACHE_TTL
 from .skel import skel
 
-def _download(exercise):
-    url = "https://jutge.org/problems/{}/zip".format(exercise)
-    print('Downloading ' + url)
-    with open(exercise + '.zip', 'wb') as dest:
-        try:
-            orig = urlopen(url)
-            data = orig.read(128)
-            while data:
-                dest.write(data)
-                data = orig.read(128)
-        except HTTPError as ex:
-            raise DownloadError('download failed with code {} {}'.format(
-                ex.code, ex.reason
-            ))
-        finally:
-            orig.close()
+BASE_URL = 'https://jutge.org/problems'
+DEFAULT_CONNECTIONS = 4
+# Downloads bigger than this are spooled to a temporary file
+SPOOL_SIZE = 16 * 1024 * 1024
 
-def _download_cpp(exercise):
-    url = "https://jutge.org/problems/{}/main/cc".format(exercise)
+# Return a seekable file object with the contents of `url`. Without a cache,
+# small files stay in memory and only big ones are spooled to disk.
+def _fetch(url, pool, cache=None, offline=False, revalidate=False):
+    if cache is not None:
+        return cache.fetch(pool, url, offline, revalidate).open('rb')
     print('Downloading ' + url)
-    path = Path.cwd() / exercise / 'main.cc'
-    with path.open('wb') as dest:
-        try:
-            orig = urlopen(url)
-            data = orig.read(128)
-            while data:
-                dest.write(data)
-                data = orig.read(128)
-        except HTTPError as ex:
-            raise DownloadError('download failed with code {} {}'.format(
-                ex.code, ex.reason
-            ))
-        finally:
-            orig.close()
+    buf = SpooledTemporaryFile(max_size=SPOOL_SIZE)
+    try:
+        pool.get(url, buf)
+    except BaseException:
+        buf.close()
+        raise
+    buf.seek(0)
+    return buf
 
+def _close_result(future):
+    if not future.cancelled() and future.exception() is None:
+        future.result().close()
 
-def download(exercise, keep_zip=False, cc=False, skel_files=-1):
+def _extract(archive, exercise):
+    try:
+        with ZipFile(archive, 'r') as exczip:
+            exczip.extractall()
+    except BadZipfile:
+        raise DownloadError(exercise + '.zip is not a valid zip file.' +
+                            ' This may be because exercise does not ' +
+                            ' exists or because the download failed')
+
+def download(exercise, keep_zip=False, cc=False, skel_files=-1,
+             base_url=BASE_URL, pool=None, cache=None, offline=False,
+             revalidate=False):
+    if pool is None:
+        with ConnectionPool() as pool:
+            return download(exercise, keep_zip, cc, skel_files, base_url,
+                            pool, cache, offline, revalidate)
+    if offline and cache is None:
+        raise DownloadError('cannot work offline without the cache')
     cwd = Path.cwd()
     zipf = cwd / (exercise + '.zip')
+    zip_url = '{}/{}/zip'.format(base_url, exercise)
+    cc_url = '{}/{}/main/cc'.format(base_url, exercise)
 
-    if zipf.exists():
-        print(exercise + '.zip exists, skipping download')
-        zip_downloaded = False
-    else:
-        _download(exercise)
-        zip_downloaded = True
-    assert zipf.exists()
-
-    if (cwd / exercise).exists():
-        print('dir "{}" already exists, skipping unzip'.format(exercise))
-    else:
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        # main.cc is fetched (into memory) while the archive is processed
+        if cc:
+            cc_future = executor.submit(_fetch, cc_url, pool, cache,
+                                        offline, revalidate)
         try:
-            with ZipFile(str(zipf), 'r') as exczip:
-                exczip.extractall()
-        except BadZipfile:
-            if zip_downloaded and not keep_zip:
-                zipf.unlink()
-            raise DownloadError(zipf.name + ' is not a valid zip file.' +
-                                ' This may be because exercise does not ' +
-                                ' exists or because the download failed')
+            cached = False
+            if zipf.exists():
+                print(exercise + '.zip exists, skipping download')
+                archive = zipf.open('rb')
+                zip_written = False
+            else:
+                archive = _fetch(zip_url, pool, cache, offline,
+                                 revalidate)
+                cached = cache is not None
+                zip_written = keep_zip
+            with archive:
+                if zip_written:
+                    with zipf.open('wb') as dest:
+                        shutil.copyfileobj(archive, dest)
+                    archive.seek(0)
+                if (cwd / exercise).exists():
+                    print('dir "{}" already exists, skipping unzip'.format(
+                        exercise))
+                else:
+                    try:
+                        _extract(archive, exercise)
+                    except DownloadError:
+                        if zip_written:
+                            zipf.unlink()
+                        if cached:
+                            cache.forget(zip_url)
+                        raise
 
-    assert (cwd / exercise).exists()
+            assert (cwd / exercise).exists()
 
-    if not keep_zip:
-        print('Removing zip file')
-        zipf.unlink()
+            if not keep_zip and zipf.exists():
+                print('Removing zip file')
+                zipf.unlink()
 
-    if cc:
-        _download_cpp(exercise)
-        return
+            if cc:
+                with cc_future.result() as src, \
+                        (cwd / exercise / 'main.cc').open('wb') as dest:
+                    shutil.copyfileobj(src, dest)
+                return
+        finally:
+            if cc:
+                cc_future.add_done_callback(_close_result)
 
     if skel_files is None:
         return
@@ -84,6 +115,42 @@ def download(exercise, keep_zip=False, cc=False, skel_files=-1):
         skel_files = None
     skel(exercise, skel_files)
 
+def download_many(exercises, jobs=DEFAULT_CONNECTIONS, **kwargs):
+    exercises = list(OrderedDict.fromkeys(exercises))  # Drop duplicates
+    start = time.monotonic()
+    failed = []
+    with ConnectionPool() as pool, \
+            ThreadPoolExecutor(max_workers=max(jobs, 1)) as executor:
+        futures = [
+            executor.submit(download, exercise, pool=pool, **kwargs)
+            for exercise in exercises
+        ]
+        for exercise, future in zip(exercises, futures):
+            try:
+                future.result()
+            except (DownloadError, SkelError) as ex:
+                print('{}: {}'.format(exercise, ex), file=sys.stderr)
+                failed.append(exercise)
+        bytes_read = pool.bytes_read
+
+    elapsed = time.monotonic() - start
+    print('Downloaded {} of {} exercises ({:.1f} MiB in {:.1f}s)'.format(
+        len(exercises) - len(failed), len(exercises),
+        bytes_read / (1024 * 1024), elapsed
+    ))
+    if failed:
+        raise DownloadError('{} download(s) failed: {}'.format(
+            len(failed), ', '.join(failed)))
+
+# One exercise ID per line; # starts a comment
+def read_exercise_list(path):
+    exercises = []
+    with open(path, 'r') as f:
+        for line in f:
+            line = line.split('#', 1)[0].strip()
+            if line:
+                exercises.append(line)
+    return exercises
 
 def _print_dest(exc):
     p = Path.cwd() / exc
@@ -95,31 +162,99 @@ def _print_dest(exc):
 
 def _parse_args(config):
     d = {
-        'exercise': config['exercise'],
         'keep_zip': config.getboolean('keep_zip', False),
         'cc': config.getboolean('cc', False),
         'skel_files': (config['skel_files']
-            if config.getboolean('skel') else None)
+            if config.getboolean('skel') else None),
+        'base_url': config.get('base_url', BASE_URL).rstrip('/'),
+        'offline': config.getboolean('offline', False),
+        'revalidate': config.getboolean('revalidate', False)
     }
 
     def exc():
+        if config.getboolean('cache', True):
+            cache_size = config.getfloat('cache_size')
+            d['cache'] = ProblemCache(
+                max_size=(CACHE_SIZE if cache_size is None
+                          else int(cache_size * 1024 * 1024)),
+                ttl=config.getfloat('cache_ttl', CACHE_TTL)
+            )
+        exercises = list(config['exercise'])
+        if config.get('from_file'):
+            exercises += read_exercise_list(config['from_file'])
+        if not exercises:
+            raise DownloadError('no exercise given')
         if config['get_dest']:
-            _print_dest(d['exercise'])
+            _print_dest(exercises[0])
             return
-        return download(**d)
+        if len(exercises) == 1:
+            return download(exercises[0], **d)
+        return download_many(
+            exercises, jobs=config.getint('jobs', DEFAULT_CONNECTIONS), **d)
     return exc
 
 def _setup_parser(parent):
     download_parser = parent.add_parser(
         'download', aliases=['dl'],
-        description='Download and extract a problem file into the current dir',
+        description='Download and extract problem files into the current dir',
         help='download an exercise and its test cases'
     )
     download_parser.set_defaults(action=_parse_args)
 
     download_parser.add_argument(
         'exercise',
-        help='exercise ID. E.g.: P51126_en'
+        nargs='*',
+        help='exercise ID(s). E.g.: P51126_en'
+    )
+
+    download_parser.add_argument(
+        '-f', '--from-file',
+        metavar='FILE',
+        help='also download the exercises listed in FILE, one per line'
+    )
+
+    download_parser.add_argument(
+        '-j', '--jobs',
+        type=int,
+        metavar='N',
+        help='with several exercises, download up to N at the same time.'
+             ' Default: {}'.format(DEFAULT_CONNECTIONS)
+    )
+
+    download_parser.add_argument(
+        '--base-url',
+        help='URL problems are downloaded from. Default: ' + BASE_URL
+    )
+
+    download_cache_group = download_parser.add_mutually_exclusive_group()
+    download_cache_group.add_argument(
+        '--offline',
+        action='store_true',
+        default=None,
+        help='do not use the network, only the local problem cache'
+    )
+    download_cache_group.add_argument(
+        '--revalidate',
+        action='store_true',
+        default=None,
+        help='check with the server that cached files are up to date, even'
+             ' if they were checked recently'
+    )
+    download_cache_group.add_argument(
+        '--no-cache',
+        action='store_false',
+        dest='cache',
+        default=None,
+        help='do not use the local problem cache'
+    )
+
+    download_parser.add_argument(
+        '--cache-size',
+        type=float,
+        metavar='MIB',
+        help='maximum size of the local problem cache; least recently used'
+             ' problems are evicted first.'
+             ' Default: {}'.format(CACHE_SIZE // (1024 * 1024))
     )
 
     download_parser.add_argument(
@@ -4,10 +4,9 @@ def genconfig(config, compiler, diff_tool, debugger):
     else:
         config['compiler'] = 'g++ -o $output $flags $sources'
 
+    # Without a diff tool, test shows its own per-case diff
     if diff_tool:
         config['diff_tool'] = diff_tool
-    else:
-        config['diff_tool'] = 'diff -y $output $correct'
 
     if debugger:
         config['debugger'] = debugger
@@ -40,8 +39,8 @@ def _setup_parser(parent):
     )
     genconfig_parser.add_argument(
         '-diff', '--diff-tool',
-        help='diff tool to use. "$output" and "$correct" will be substituted'
-             ' (they are already quoted)'
+        help='external diff tool to use. "$output" and "$correct" will be'
+             ' substituted (they are already quoted)'
     )
     genconfig_parser.add_argument(
         '-dbg', '--debugger',
@@ -0,0 +1,287 @@
+from pathlib import Path
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import hashlib
+import itertools
+import os
+import re
+import shutil
+import tempfile
+import threading
+from .compilef import compilef
+from ._aux.errors import MinimizeError, CompileError, ProgramError
+from ._aux.programs import build_program, run_program
+from ._aux import runner, profiles, checkers
+
+# Each token keeps the whitespace after it, so that what is left after
+# removing some of them still has its lines apart
+_TOKEN = re.compile(rb'\S+\s*')
+
+def _split_lines(data):
+    return data.splitlines(keepends=True)
+
+def _split_tokens(data):
+    stripped = data.lstrip()
+    prefix = data[:len(data) - len(stripped)]
+    return ([prefix] if prefix else []) + _TOKEN.findall(stripped)
+
+class _Checker:
+    # Runs candidate inputs, remembering the verdict of each one. Without a
+    # reference, the expected output is always corfile.
+    def __init__(self, solution, reference, corfile, tmpdir, limits,
+                 output_limit, checker):
+        self.solution = solution
+        self.reference = reference
+        self.corfile = corfile
+        self.tmpdir = tmpdir
+        self.limits = limits
+        self.output_limit = output_limit
+        self.checker = checker
+        self.verdict = None
+        self.runs = 0
+        self._seen = {}
+        self._lock = threading.Lock()
+        self._names = itertools.count()
+
+    def verdict_of(self, data):
+        digest = hashlib.sha256(data).digest()
+        with self._lock:
+            if digest in self._seen:
+                return self._seen[digest]
+            name = 'candidate{}'.format(next(self._names))
+            self.runs += 1
+        inpfile = self.tmpdir / (name + '.inp')
+        inpfile.write_bytes(data)
+        corfile = self.corfile
+        try:
+            if self.reference is not None:
+                corfile = inpfile.with_suffix('.cor')
+                with inpfile.open('rb') as inp, corfile.open('wb') as cor:
+                    run_program([str(self.reference)], inp, cor,
+                                self.limits.wall, 'the reference')
+            verdict = runner.run_case(
+                self.solution, inpfile, corfile, self.output_limit,
+                limits=self.limits, forward_stderr=False,
+                checker=self.checker
+            ).verdict
+        except ProgramError:
+            # The reference rejects it: not a valid input
+            verdict = None
+        finally:
+            for f in (inpfile, inpfile.with_suffix('.cor')):
+                if f.exists():
+                    f.unlink()
+        with self._lock:
+            self._seen[digest] = verdict
+        return verdict
+
+    # Whether the solution still fails in the same way
+    def __call__(self, data):
+        return self.verdict_of(data) == self.verdict
+
+# Index of the first candidate that is still failing, or None. Candidates
+# run in parallel, but only a few more than the workers are built at a
+# time (each one is a copy of the input).
+def _first_failing(executor, jobs, checker, candidates):
+    candidates = iter(enumerate(candidates))
+    pending = deque()
+
+    def fill():
+        for i, candidate in candidates:
+            pending.append((i, executor.submit(checker, b''.join(candidate))))
+            if len(pending) >= 2 * jobs:
+                break
+
+    try:
+        fill()
+        while pending:
+            i, future = pending.popleft()
+            if future.result():
+                return i
+            fill()
+    finally:
+        for _, future in pending:
+            future.cancel()
+    return None
+
+# Zeller's ddmin: remove chunks of items (or keep only one) while the
+# input still fails, halving the chunk size when nothing can be removed
+def _ddmin(items, executor, jobs, checker):
+    n = 2
+    while len(items) >= 2:
+        size = len(items)
+        bounds = [(i * size // n, (i + 1) * size // n) for i in range(n)]
+        subsets = (items[lo:hi] for lo, hi in bounds)
+        # With two chunks, the complements are the same as the subsets
+        complements = (items[:lo] + items[hi:] for lo, hi in bounds) \
+            if n > 2 else ()
+        found = _first_failing(executor, jobs, checker,
+                               itertools.chain(subsets, complements))
+        if found is None:
+            if n >= size:
+                break
+            n = min(2 * n, size)
+        elif found < n:
+            lo, hi = bounds[found]
+            items = items[lo:hi]
+            n = 2
+        else:
+            lo, hi = bounds[found - n]
+            items = items[:lo] + items[hi:]
+            n = max(n - 1, 2)
+    return items
+
+def _case_file(case):
+    inpfile = Path(case)
+    if inpfile.suffix != '.inp':
+        inpfile = Path(case + '.inp')
+    return inpfile.resolve()
+
+def minimize(case, reference=None, jobs=None, compile=True, strict=True,
+             debug=True, force=False, pch=True, limits=runner.DEFAULT_LIMITS,
+             output_limit=runner.OUTPUT_LIMIT, profile=None, checker=None):
+    cwd = Path.cwd()
+    if jobs is None:
+        jobs = os.cpu_count() or 1
+    inpfile = _case_file(case)
+    corfile = inpfile.with_suffix('.cor')
+    if not inpfile.exists():
+        raise MinimizeError('{} does not exist'.format(inpfile))
+    if reference is None and not corfile.exists():
+        raise MinimizeError('{} does not exist'.format(corfile))
+
+    if profile is None:
+        profile = profiles.DEFAULT_PROFILE if debug else 'release'
+    profile = profiles.get(profile)
+    executable = cwd / profiles.artifact_name(cwd, profile)
+    if compile or not executable.exists():
+        try:
+            compilef(strict=strict, profile=profile, force=force, pch=pch)
+        except CompileError as ex:
+            raise MinimizeError(ex) from ex
+    assert(executable.exists())
+    if reference is not None:
+        try:
+            reference = build_program(Path(reference).resolve(), force, pch)
+        except ProgramError as ex:
+            raise MinimizeError(ex) from ex
+
+    original = inpfile.read_bytes()
+    with tempfile.TemporaryDirectory(prefix='jutge-minimize-') as tmpdir, \
+            ThreadPoolExecutor(max_workers=max(jobs, 1)) as executor:
+        checker = _Checker(executable, reference, corfile, Path(tmpdir),
+                           limits, output_limit, checker)
+        verdict = checker.verdict_of(original)
+        if verdict is None:
+            raise MinimizeError('the reference fails on ' + inpfile.name)
+        if verdict == runner.ACCEPTED:
+            raise MinimizeError(inpfile.name + ' passes: nothing to minimize')
+        if verdict == runner.WRONG_ANSWER and reference is None:
+            # The .cor is only right for the original input
+            raise MinimizeError('a wrong answer can only be minimized'
+                                ' against a reference solution (--reference)')
+        checker.verdict = verdict
+        print('Minimizing {} ({} bytes, verdict {})'.format(
+            inpfile.name, len(original), verdict))
+
+        data = original
+        for unit, split in (('lines', _split_lines),
+                            ('tokens', _split_tokens)):
+            items = split(data)
+            kept = _ddmin(items, executor, jobs, checker)
+            data = b''.join(kept)
+            print('{}: {} -> {}'.format(unit, len(items), len(kept)))
+
+    output = inpfile.with_name(inpfile.stem + '.min.inp')
+    output.write_bytes(data)
+    output_cor = output.with_suffix('.cor')
+    if reference is not None:
+        with output.open('rb') as inp, output_cor.open('wb') as cor:
+            run_program([str(reference)], inp, cor, limits.wall,
+                        'the reference')
+    else:
+        # Crashes and timeouts do not depend on the expected output
+        shutil.copyfile(str(corfile), str(output_cor))
+    print('Minimized to {} bytes after {} runs: {} (and {})'.format(
+        len(data), checker.runs, output.name, output_cor.name))
+
+def _parse_args(config):
+    d = {
+        'case': config['case'],
+        'reference': config.get('reference'),
+        'jobs': config.getint('jobs'),
+        'compile': config.getboolean('compile', True),
+        'strict': config.getboolean('strict', True),
+        'force': config.getboolean('force', False),
+        'pch': config.getboolean('pch', True),
+        'limits': runner.limits_from_config(config),
+        'output_limit': runner.output_limit_from_config(config)
+    }
+
+    def exc():
+        return minimize(profile=profiles.from_config(config),
+                        checker=checkers.from_config(config, Path.cwd()), **d)
+    return exc
+
+def _setup_parser(parent):
+    minimize_parser = parent.add_parser(
+        'minimize', aliases=['min'],
+        description='Shrink a failing test case by removing lines, then'
+                    ' tokens, while the exercise still fails on it with the'
+                    ' same verdict. The result is written next to it as'
+                    ' CASE.min.inp (and CASE.min.cor).',
+        help='shrink a failing test case'
+    )
+    minimize_parser.set_defaults(action=_parse_args)
+
+    minimize_parser.add_argument(
+        'case',
+        help='case to minimize: `sample1` or `sample1.inp`'
+    )
+
+    minimize_parser.add_argument(
+        '-r', '--reference',
+        help='reference solution source (.cc or .cpp, compiled) or'
+             ' executable, to get the expected output of each candidate.'
+             ' Needed to minimize wrong answers; without it only crashes'
+             ' and exceeded limits can be minimized'
+    )
+    minimize_parser.add_argument(
+        '-j', '--jobs',
+        type=int,
+        metavar='N',
+        help='try up to N candidates at the same time. Default: number of'
+             ' CPUs'
+    )
+
+    minimize_compile_group = minimize_parser.add_mutually_exclusive_group()
+    minimize_compile_group.add_argument(
+        '-C', '--no-compile',
+        action='store_false',
+        dest='compile',
+        help='do not recompile. Ignored if there is not an executable'
+    )
+    minimize_compile_group.add_argument(
+        '--no-strict',
+        action='store_false',
+        dest='strict',
+        help='compile with the --no-strict flag'
+    )
+    minimize_profile_group = minimize_parser.add_mutually_exclusive_group()
+    minimize_profile_group.add_argument(
+        '--no-debug',
+        action='store_false',
+        dest='debug',
+        help='compile with -DNDEBUG. Same as --profile release'
+    )
+    profiles.add_profile_argument(minimize_profile_group)
+    minimize_parser.add_argument(
+        '--force',
+        action='store_true',
+        help='recompile even if the build cache is up to date'
+    )
+
+    runner.add_limit_arguments(minimize_parser)
+    checkers.add_checker_arguments(minimize_parser)
+
+    return minimize_parser
@@ -0,0 +1,331 @@
+from pathlib import Path
+from collections import OrderedDict
+import os
+import queue
+import statistics
+import threading
+import time
+from .compilef import compilef
+from .download import download, read_exercise_list, BASE_URL, \
+    DEFAULT_CONNECTIONS
+from ._aux.errors import PipelineError, ProcessError
+from ._aux.http import ConnectionPool
+from ._aux.problem_cache import ProblemCache
+from ._aux import runner, result_cache, profiles, checkers
+
+DEFAULT_QUEUE_SIZE = 2
+
+_DONE = object()  # End of the stream, passed on from stage to stage
+
+class _Problem:
+    def __init__(self, exercise, directory):
+        self.exercise = exercise
+        self.directory = directory
+        self.start = time.monotonic()
+        self.end = None
+        self.times = OrderedDict()  # Stage -> seconds spent on it
+        self.executable = None
+        self.error = None
+        self.results = []
+
+    def latency(self):
+        return self.end - self.start
+
+class _Stage:
+    # `workers` threads take problems from `inbox`, run `fn` on them and put
+    # them on `outbox`. With a bounded outbox, a stage that gets ahead of the
+    # next one blocks instead of piling up work. Problems that failed on an
+    # earlier stage are passed on untouched.
+    def __init__(self, name, fn, workers, inbox, outbox):
+        self.name = name
+        self.fn = fn
+        self.inbox = inbox
+        self.outbox = outbox
+        self.count = 0
+        self.busy = 0.0
+        self.first = None  # When the first problem started
+        self.last = None  # When the last problem finished
+        self._lock = threading.Lock()
+        self._running = workers
+        self._threads = [threading.Thread(target=self._work, daemon=True)
+                         for _ in range(workers)]
+
+    def start(self):
+        for t in self._threads:
+            t.start()
+
+    def _work(self):
+        while True:
+            problem = self.inbox.get()
+            if problem is _DONE:
+                self.inbox.put(_DONE)  # For the other workers
+                with self._lock:
+                    self._running -= 1
+                    last = self._running == 0
+                if last:
+                    self.outbox.put(_DONE)
+                return
+            if problem.error is None:
+                self._process(problem)
+            self.outbox.put(problem)
+
+    def _process(self, problem):
+        start = time.monotonic()
+        try:
+            self.fn(problem)
+        except ProcessError as ex:
+            problem.error = '{}: {}'.format(self.name, ex)
+        except Exception as ex:
+            problem.error = '{}: {!r}'.format(self.name, ex)
+        end = time.monotonic()
+        problem.times[self.name] = end - start
+        with self._lock:
+            self.count += 1
+            self.busy += end - start
+            self.first = start if self.first is None else min(self.first,
+                                                              start)
+            self.last = end if self.last is None else max(self.last, end)
+
+    def throughput(self):
+        if not self.count or self.last <= self.first:
+            return 0.0
+        return self.count / (self.last - self.first)
+
+def _print_problem(problem):
+    times = ', '.join('{} {:.2f}s'.format(stage, t)
+                      for stage, t in problem.times.items())
+    if problem.error is not None:
+        status = 'failed on ' + problem.error
+    else:
+        passed = sum(r.verdict == runner.ACCEPTED for r in problem.results)
+        status = '{}/{} passed'.format(passed, len(problem.results))
+        failed = ['{} ({})'.format(r.case, r.verdict)
+                  for r in problem.results if r.verdict != runner.ACCEPTED]
+        if failed:
+            status += ', failed: ' + ', '.join(failed)
+    print('{}: {} [{:.2f}s: {}]'.format(problem.exercise, status,
+                                         problem.latency(), times))
+
+def _print_stats(stages, problems, elapsed):
+    print()
+    print('{:<10} {:>8} {:>10} {:>12} {:>10}'.format(
+        'stage', 'problems', 'busy (s)', 'problems/s', 'mean (s)'))
+    for stage in stages:
+        print('{:<10} {:>8} {:>10.2f} {:>12.2f} {:>10.3f}'.format(
+            stage.name, stage.count, stage.busy, stage.throughput(),
+            stage.busy / stage.count if stage.count else 0.0))
+    latencies = [p.latency() for p in problems]
+    print('Latency per problem: min {:.2f}s, median {:.2f}s, max {:.2f}s'
+          .format(min(latencies), statistics.median(latencies),
+                  max(latencies)))
+    print('{} problem(s) in {:.2f}s ({:.2f}/s)'.format(
+        len(problems), elapsed, len(problems) / elapsed if elapsed else 0.0))
+
+# Download, compile and test each exercise, with the three stages running at
+# the same time on different exercises. Exercises that are already there are
+# not downloaded again (nor get their skel files overwritten).
+def pipeline(exercises, connections=DEFAULT_CONNECTIONS, jobs=None,
+             queue_size=DEFAULT_QUEUE_SIZE, base_url=BASE_URL, cache=None,
+             offline=False, strict=True, debug=True, force=False, pch=True,
+             limits=runner.DEFAULT_LIMITS, output_limit=runner.OUTPUT_LIMIT,
+             rerun=False, profile=None, checker=None, problem_checkers=None):
+    exercises = list(OrderedDict.fromkeys(exercises))  # Drop duplicates
+    if not exercises:
+        raise PipelineError('no exercise given')
+    cwd = Path.cwd()
+    if jobs is None:
+        jobs = os.cpu_count() or 1
+    if profile is None:
+        profile = profiles.DEFAULT_PROFILE if debug else 'release'
+    profile = profiles.get(profile)
+
+    with ConnectionPool() as pool:
+        def fetch(problem):
+            if not problem.directory.is_dir():
+                download(problem.exercise, base_url=base_url, pool=pool,
+                         cache=cache, offline=offline)
+
+        def build(problem):
+            problem.executable = compilef(
+                strict=strict, profile=profile, force=force, pch=pch, jobs=1,
+                directory=problem.directory, verbose=False)
+
+        def check(problem):
+            # `checker` unless the problem has its own in problem_checkers
+            problem_checker = checkers.for_problem(
+                problem.directory, problem_checkers, checker)
+            cases = result_cache.ResultCache(problem.directory)
+            try:
+                for inpfile in sorted(problem.directory.glob('*.inp')):
+                    corfile = inpfile.with_suffix('.cor')
+                    key = result_cache.case_key(
+                        problem.executable, inpfile, corfile, limits,
+                        output_limit, problem_checker)
+                    result = cases.get(key) if not rerun else None
+                    if result is None:
+                        result = runner.run_case(
+                            problem.executable, inpfile, corfile,
+                            output_limit, limits=limits, forward_stderr=False,
+                            checker=problem_checker)
+                        cases.put(key, result)
+                    problem.results.append(result)
+            finally:
+                cases.save()
+
+        # Only the queues between stages are bounded: all the exercises are
+        # known from the start, and the results are consumed as they come
+        queues = [queue.Queue()] + \
+            [queue.Queue(maxsize=max(queue_size, 1)) for _ in range(2)] + \
+            [queue.Queue()]
+        stages = [
+            _Stage('download', fetch, max(connections, 1), queues[0],
+                   queues[1]),
+            _Stage('compile', build, max(jobs, 1), queues[1], queues[2]),
+            _Stage('test', check, max(jobs, 1), queues[2], queues[3])
+        ]
+        start = time.monotonic()
+        for exercise in exercises:
+            queues[0].put(_Problem(exercise, cwd / exercise))
+        queues[0].put(_DONE)
+        for stage in stages:
+            stage.start()
+
+        problems = []
+        while True:
+            problem = queues[-1].get()
+            if problem is _DONE:
+                break
+            problem.end = time.monotonic()
+            problems.append(problem)
+            _print_problem(problem)
+        elapsed = time.monotonic() - start
+
+    _print_stats(stages, problems, elapsed)
+    failed = [p.exercise for p in problems
+              if p.error is not None or
+              any(r.verdict != runner.ACCEPTED for r in p.results)]
+    if failed:
+        raise PipelineError('{} of {} exercises failed: {}'.format(
+            len(failed), len(problems), ', '.join(failed)))
+
+def _parse_args(config):
+    d = {
+        'connections': config.getint('connections', DEFAULT_CONNECTIONS),
+        'jobs': config.getint('jobs'),
+        'queue_size': config.getint('queue_size', DEFAULT_QUEUE_SIZE),
+        'base_url': config.get('base_url', BASE_URL).rstrip('/'),
+        'offline': config.getboolean('offline', False),
+        'strict': config.getboolean('strict', True),
+        'force': config.getboolean('force', False),
+        'pch': config.getboolean('pch', True),
+        'limits': runner.limits_from_config(config),
+        'output_limit': runner.output_limit_from_config(config),
+        'rerun': config.getboolean('rerun', False)
+    }
+
+    def exc():
+        if config.getboolean('cache', True):
+            d['cache'] = ProblemCache()
+        exercises = list(config['exercise'])
+        if config.get('from_file'):
+            exercises += read_exercise_list(config['from_file'])
+        return pipeline(exercises, profile=profiles.from_config(config),
+                        checker=checkers.default_checker(config),
+                        problem_checkers=checkers.problem_checkers(config),
+                        **d)
+    return exc
+
+def _setup_parser(parent):
+    pipeline_parser = parent.add_parser(
+        'pipeline',
+        description='Download, compile and test several exercises into the'
+                    ' current dir. The stages overlap: while an exercise is'
+                    ' being compiled, the next ones are downloading and the'
+                    ' previous ones are running their cases. Exercises that'
+                    ' are already there are not downloaded again.',
+        help='download, compile and test several exercises'
+    )
+    pipeline_parser.set_defaults(action=_parse_args)
+
+    pipeline_parser.add_argument(
+        'exercise',
+        nargs='*',
+        help='exercise ID(s). E.g.: P51126_en'
+    )
+    pipeline_parser.add_argument(
+        '-f', '--from-file',
+        metavar='FILE',
+        help='also process the exercises listed in FILE, one per line'
+    )
+
+    pipeline_parser.add_argument(
+        '-c', '--connections',
+        type=int,
+        metavar='N',
+        help='download up to N exercises at the same time.'
+             ' Default: {}'.format(DEFAULT_CONNECTIONS)
+    )
+    pipeline_parser.add_argument(
+        '-j', '--jobs',
+        type=int,
+        metavar='N',
+        help='compile up to N exercises, and test up to N, at the same time.'
+             ' Default: number of CPUs'
+    )
+    pipeline_parser.add_argument(
+        '-q', '--queue-size',
+        type=int,
+        metavar='N',
+        help='exercises that can wait between two stages before the first'
+             ' one stops. Default: {}'.format(DEFAULT_QUEUE_SIZE)
+    )
+
+    pipeline_parser.add_argument(
+        '--base-url',
+        help='URL problems are downloaded from. Default: ' + BASE_URL
+    )
+    pipeline_cache_group = pipeline_parser.add_mutually_exclusive_group()
+    pipeline_cache_group.add_argument(
+        '--offline',
+        action='store_true',
+        default=None,
+        help='do not use the network, only the local problem cache'
+    )
+    pipeline_cache_group.add_argument(
+        '--no-cache',
+        action='store_false',
+        dest='cache',
+        default=None,
+        help='do not use the local problem cache'
+    )
+
+    pipeline_parser.add_argument(
+        '--no-strict',
+        action='store_false',
+        dest='strict',
+        help='compile with the --no-strict flag'
+    )
+    pipeline_parser.add_argument(
+        '--force',
+        action='store_true',
+        help='recompile even if the build cache is up to date'
+    )
+    pipeline_profile_group = pipeline_parser.add_mutually_exclusive_group()
+    pipeline_profile_group.add_argument(
+        '--no-debug',
+        action='store_false',
+        dest='debug',
+        help='test with -DNDEBUG. Same as --profile release'
+    )
+    profiles.add_profile_argument(pipeline_profile_group)
+    pipeline_parser.add_argument(
+        '-r', '--rerun',
+        action='store_true',
+        default=None,
+        help='run every case, even those with a cached result'
+    )
+
+    runner.add_limit_arguments(pipeline_parser)
+    checkers.add_checker_arguments(pipeline_parser)
+
+    return pipeline_parser
@@ -0,0 +1,295 @@
+from string import Template
+from collections import namedtuple
+from pathlib import Path
+import re
+import shlex
+import shutil
+import subprocess
+import tempfile
+from ._aux.errors import ProfilerError, CompileError
+from .compilef import compilef
+from ._aux import profiles
+
+DEFAULT_TOP = 15
+
+# Optimized, but with symbols and frame pointers so that the profilers can
+# tell the functions apart and walk the stack
+PROFILING_FLAGS = ['-O2', '-g', '-fno-omit-frame-pointer', '-DNDEBUG']
+
+# template: how to run the executable ($exe) on the input ($input) so that
+# the profile is written to $data. report: what reads it back.
+Tool = namedtuple('Tool', ['template', 'report', 'flags', 'cost'])
+
+TOOLS = {
+    'perf': Tool(
+        'perf record -g -o $data $exe < $input > /dev/null',
+        ['perf', 'report', '-i', '$data', '--stdio', '--no-children',
+         '--show-nr-samples', '--sort', 'symbol', '-g', 'none'],
+        [], 'samples'
+    ),
+    'gprof': Tool(
+        # gmon.out is written to the working dir, which is that of $data
+        '$exe < $input > /dev/null',
+        ['gprof', '-b', '-p', '$exe', '$data'],
+        ['-pg'], 'self (s)'
+    ),
+    'callgrind': Tool(
+        'valgrind --tool=callgrind --callgrind-out-file=$data $exe'
+        ' < $input > /dev/null',
+        ['callgrind_annotate', '--auto=no', '$data'],
+        [], 'Ir'
+    ),
+}
+DATA_FILES = {'perf': 'perf.data', 'gprof': 'gmon.out',
+              'callgrind': 'callgrind.out'}
+
+# cost is in the unit of the tool; calls is None unless it counts them
+Hotspot = namedtuple('Hotspot', ['function', 'percent', 'cost', 'calls'])
+
+#    45.23%          1234  [.] solve(int)
+_PERF_LINE = re.compile(r'^\s*([\d.]+)%\s+(\d+)\s+\[.\]\s+(.+?)\s*$')
+#  60.00      0.03     0.03        1    30.00    50.00  solve(int)
+_GPROF_LINE = re.compile(
+    r'^\s*([\d.]+)\s+([\d.]+)\s+([\d.]+)\s+'
+    r'(?:(\d+)\s+([\d.]+)\s+([\d.]+)\s+)?(\S.*?)\s*$')
+# 18,000,000 (69.14%)  ???:solve(int) [/path/to/P12345.profiling.x]
+_CALLGRIND_LINE = re.compile(
+    r'^[>\s]*([\d,]+)\s+(?:\(\s*([\d.]+)%[^)]*\)\s+)?(.+?)\s*$')
+_CALLGRIND_OBJECT = re.compile(r'\s+\[[^\]]*\]$')
+
+def _parse_perf(report):
+    hotspots = []
+    for line in report.splitlines():
+        m = _PERF_LINE.match(line)
+        if m is not None:
+            hotspots.append(Hotspot(m.group(3), float(m.group(1)),
+                                    int(m.group(2)), None))
+    return hotspots
+
+def _parse_gprof(report):
+    hotspots = []
+    for line in report.splitlines():
+        m = _GPROF_LINE.match(line)
+        if m is not None:
+            calls = int(m.group(4)) if m.group(4) is not None else None
+            hotspots.append(Hotspot(m.group(7), float(m.group(1)),
+                                    float(m.group(3)), calls))
+    return hotspots
+
+def _parse_callgrind(report):
+    total = None
+    costs = {}
+    function_first = False  # file:function or function:file
+    for line in report.splitlines():
+        if 'file:function' in line or 'function:file' in line:
+            function_first = 'function:file' in line
+            continue
+        m = _CALLGRIND_LINE.match(line)
+        if m is None:
+            continue
+        cost = int(m.group(1).replace(',', ''))
+        name = _CALLGRIND_OBJECT.sub('', m.group(3))
+        if name.startswith('PROGRAM TOTALS'):
+            total = cost
+        elif ':' in name and not name.endswith(':'):
+            # Newer versions list the functions both by file (where the
+            # lines without a file are skipped) and on their own
+            if function_first:
+                function = name.rsplit(':', 1)[0]
+            else:
+                function = name.split(':', 1)[1]
+            costs.setdefault(function, cost)
+    if not total:
+        total = sum(costs.values()) or 1
+    return [Hotspot(function, cost * 100 / total, cost, None)
+            for function, cost in costs.items()]
+
+PARSERS = {'perf': _parse_perf, 'gprof': _parse_gprof,
+           'callgrind': _parse_callgrind}
+
+# Tools with flags of their own get their own executable too
+def _build_profile(tool):
+    return profiles.Profile(
+        tool if TOOLS[tool].flags else 'profiling',
+        PROFILING_FLAGS + TOOLS[tool].flags, None)
+
+def _default_tool():
+    for name in ('perf', 'gprof', 'callgrind'):
+        if shutil.which(TOOLS[name].report[0]) is not None:
+            return name
+    return 'gprof'
+
+def _inpfile(case, cwd):
+    if case is None:
+        # The largest case is the likeliest to show where the time goes
+        cases = sorted(cwd.glob('*.inp'), key=lambda p: p.stat().st_size)
+        if not cases:
+            raise ProfilerError('no test cases (.inp files)')
+        return cases[-1]
+    inpfile = Path(case if case.endswith('.inp') else case + '.inp')
+    if not inpfile.is_file():
+        raise ProfilerError('{} does not exist'.format(inpfile))
+    return inpfile.resolve()
+
+def print_hotspots(hotspots, cost, top=DEFAULT_TOP):
+    hotspots = sorted(hotspots, key=lambda h: (-h.percent, -h.cost))[:top]
+    print('{:>3} {:>7} {:>14} {:>10}  {}'.format('#', '%', cost, 'calls',
+                                                 'function'))
+    for rank, h in enumerate(hotspots, 1):
+        cost_value = '{:.2f}'.format(h.cost) if isinstance(h.cost, float) \
+            else str(h.cost)
+        print('{:>3} {:>7.2f} {:>14} {:>10}  {}'.format(
+            rank, h.percent, cost_value,
+            h.calls if h.calls is not None else '-', h.function))
+
+def profile(case=None, tool=None, profiler=None, top=DEFAULT_TOP, raw=False,
+            compile=True, strict=True, force=False, pch=True):
+    if tool is None:
+        tool = _default_tool()
+    if tool not in TOOLS:
+        raise ProfilerError('unknown tool "{}" (available: {})'.format(
+            tool, ', '.join(sorted(TOOLS))))
+    spec = TOOLS[tool]
+    if profiler is None:
+        profiler = spec.template
+    profiler_tpl = Template(profiler)
+    if shutil.which(spec.report[0]) is None:
+        raise ProfilerError('{} not found, which {} needs'.format(
+            spec.report[0], tool))
+    cwd = Path.cwd()
+    inpfile = _inpfile(case, cwd)
+
+    build = _build_profile(tool)
+    executable = cwd / profiles.artifact_name(cwd, build)
+    if compile or not executable.exists():
+        try:
+            compilef(strict=strict, force=force, pch=pch, profile=build)
+        except CompileError as ex:
+            raise ProfilerError(ex) from ex
+    assert(executable.exists())
+
+    with tempfile.TemporaryDirectory(prefix='jutge-profile-') as tmp:
+        data = Path(tmp) / DATA_FILES[tool]
+        variables = {
+            'exe': shlex.quote(str(executable)),
+            'input': shlex.quote(str(inpfile)),
+            'data': shlex.quote(str(data))
+        }
+        try:
+            profiler_cmd = profiler_tpl.substitute(variables)
+        except KeyError as ex:
+            raise ProfilerError('{} is not a valid variable'.format(ex))
+        print('Profiling {} with {}'.format(inpfile.name, tool))
+        print('> ' + profiler_cmd)
+        status = subprocess.call(profiler_cmd, shell=True, cwd=tmp)
+        if status != 0:
+            print('Warning: exited with status {}'.format(status))
+        if not data.exists():
+            msg = 'no profile was written to ' + DATA_FILES[tool]
+            if tool == 'gprof':
+                msg += ' (gprof needs the program to exit normally)'
+            raise ProfilerError(msg)
+
+        report_cmd = [Template(arg).substitute(exe=str(executable),
+                                               data=str(data))
+                      for arg in spec.report]
+        try:
+            report = subprocess.run(
+                report_cmd, cwd=tmp, stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE, universal_newlines=True, check=True
+            ).stdout
+        except subprocess.CalledProcessError as ex:
+            raise ProfilerError('{} failed: {}'.format(
+                report_cmd[0], ex.stderr.strip()))
+
+    if raw:
+        print(report, end='')
+        return
+    hotspots = PARSERS[tool](report)
+    if not hotspots:
+        raise ProfilerError('no functions in the profile (did the program'
+                            ' run long enough?)')
+    print()
+    print_hotspots(hotspots, spec.cost, top)
+
+def _parse_args(config):
+    d = {
+        'case': config.get('case'),
+        'tool': config.get('profiler_tool'),
+        'profiler': config.get('profiler'),
+        'top': config.getint('top', DEFAULT_TOP),
+        'raw': config.getboolean('raw', False),
+        'compile': config.getboolean('compile', True),
+        'strict': config.getboolean('strict', True),
+        'force': config.getboolean('force', False),
+        'pch': config.getboolean('pch', True)
+    }
+
+    def exc():
+        return profile(**d)
+    return exc
+
+def _setup_parser(parent):
+    profile_parser = parent.add_parser(
+        'profile', aliases=['prof'],
+        description='Build an optimized executable with symbols, run it on'
+                    ' a test case under a profiler and show the functions'
+                    ' where most of the time goes',
+        help='find the hot functions'
+    )
+    profile_parser.set_defaults(action=_parse_args)
+
+    profile_parser.add_argument(
+        'case',
+        nargs='?',
+        help='test case to run (with or without .inp). Default: the largest'
+    )
+    profile_parser.add_argument(
+        '--tool',
+        choices=sorted(TOOLS),
+        dest='profiler_tool',
+        help='profiler to use. Default: perf, gprof or callgrind, whichever'
+             ' is installed first'
+    )
+    profile_parser.add_argument(
+        '--profiler',
+        metavar='TEMPLATE',
+        help='command that runs the profiler. "$exe", "$input" and "$data"'
+             ' (where the profile must be written) will be substituted (they'
+             ' are already quoted). Default: ' + '; '.join(
+                 '`{}` ({})'.format(TOOLS[t].template, t)
+                 for t in sorted(TOOLS))
+    )
+    profile_parser.add_argument(
+        '-n', '--top',
+        type=int,
+        metavar='N',
+        help='show the N hottest functions. Default: {}'.format(DEFAULT_TOP)
+    )
+    profile_parser.add_argument(
+        '--raw',
+        action='store_true',
+        default=None,
+        help='print the report of the profiler as is'
+    )
+
+    profile_compile_group = profile_parser.add_mutually_exclusive_group()
+    profile_compile_group.add_argument(
+        '-C', '--no-compile',
+        action='store_false',
+        dest='compile',
+        help='do not recompile. Ignored if there is not an executable'
+    )
+    profile_compile_group.add_argument(
+        '--no-strict',
+        action='store_false',
+        dest='strict',
+        help='compile with the --no-strict flag'
+    )
+    profile_parser.add_argument(
+        '--force',
+        action='store_true',
+        help='recompile even if the build cache is up to date'
+    )
+
+    return profile_parser
@@ -0,0 +1,215 @@
+import importlib
+import os
+import pickle
+import selectors
+import signal
+import socket
+import sys
+import traceback
+from ._aux import ipc, memo
+from ._aux.commands import COMMANDS
+from ._aux.client import PROG, stop_server
+from ._aux.errors import ServeError
+
+def _listen(path):
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as probe:
+        try:
+            probe.connect(path)
+        except OSError:
+            pass
+        else:
+            raise ServeError('already serving on ' + path)
+    try:
+        os.unlink(path)  # Left behind by a server that did not exit cleanly
+    except FileNotFoundError:
+        pass
+    listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    listener.bind(path)
+    os.chmod(path, 0o600)
+    listener.listen(16)
+    return listener
+
+def _reopen_stdio():
+    # The std streams of this process were set up for the server's own
+    # stdio (e.g. block buffered if it went to a log)
+    sys.stdin = open(0, 'r', closefd=False)
+    sys.stdout = open(1, 'w', buffering=1 if os.isatty(1) else -1,
+                      closefd=False)
+    sys.stderr = open(2, 'w', buffering=1, closefd=False,
+                      errors='backslashreplace')
+
+def _run(request):
+    os.chdir(request['cwd'])
+    os.environ.clear()
+    os.environ.update(request['env'])
+    os.umask(request['umask'])
+    sys.argv = [PROG] + request['argv']
+    from ._aux.cli import main
+    try:
+        main()
+    except SystemExit as ex:
+        if ex.code is None or isinstance(ex.code, int):
+            return ex.code or 0
+        print(ex.code, file=sys.stderr)
+        return 1
+    except KeyboardInterrupt:
+        return 128 + signal.SIGINT
+    except Exception:
+        traceback.print_exc()
+        return 1
+    return 0
+
+# Runs on the forked child: serve the request with the client's stdio, and
+# send what was learnt (memo) back to the server through `state`
+def _child(conn, request, fds, state):
+    signal.signal(signal.SIGINT, signal.default_int_handler)
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    status = 1
+    try:
+        for fd, target in zip(fds, ipc.STDIO):
+            os.dup2(fd, target)
+        ipc.close_fds(fds)
+        _reopen_stdio()
+        ipc.send_int(conn, os.getpid())
+        status = _run(request)
+    except BaseException:
+        traceback.print_exc()
+    finally:
+        for stream in (sys.stdout, sys.stderr):
+            try:
+                stream.flush()
+            except (OSError, ValueError):
+                pass
+        # The status goes first: the server may be gone by now (e.g. after
+        # `serve --stop`), and then its state pipe cannot be written to
+        try:
+            ipc.send_int(conn, status)
+        except OSError:
+            pass
+        try:
+            with os.fdopen(state, 'wb') as f:
+                pickle.dump(memo.export(), f)
+        except (OSError, pickle.PicklingError):
+            pass
+        os._exit(status & 0xff)
+
+def _stop(signum, frame):
+    sys.exit(0)
+
+def serve(quiet=False):
+    path = ipc.socket_path()
+    listener = _listen(path)
+    # Import everything up front: each request runs on a fork of this
+    # process, so nothing has to be loaded again
+    for module, _, _, _ in COMMANDS:
+        importlib.import_module('.' + module, __package__)
+    if not quiet:
+        print('Serving on {} (pid {})'.format(path, os.getpid()))
+    signal.signal(signal.SIGTERM, _stop)
+
+    states = {}  # Read end of the state pipe of each child -> data so far
+    sel = selectors.DefaultSelector()
+    sel.register(listener, selectors.EVENT_READ)
+    try:
+        while True:
+            for key, _ in sel.select(1.0):
+                if key.fileobj is listener:
+                    if not _accept(listener, sel, states):
+                        return
+                    continue
+                data = os.read(key.fd, 64 * 1024)
+                if data:
+                    states[key.fd] += data
+                    continue
+                sel.unregister(key.fd)
+                os.close(key.fd)
+                try:
+                    memo.merge(pickle.loads(states.pop(key.fd)))
+                except Exception:
+                    pass  # The child died before sending it
+            _reap()
+    except KeyboardInterrupt:
+        print()
+    finally:
+        sel.close()
+        listener.close()
+        ipc.close_fds(states)
+        try:
+            os.unlink(path)
+        except OSError:
+            pass
+
+# Returns False when asked to stop
+def _accept(listener, sel, states):
+    conn, _ = listener.accept()
+    with conn:
+        try:
+            request, fds = ipc.recv_request(conn)
+        except (OSError, ValueError):
+            return True
+        if request.get('control') == 'stop':
+            ipc.close_fds(fds)
+            ipc.send_int(conn, 0)
+            return False
+        read_end, write_end = os.pipe()
+        sys.stdout.flush()
+        sys.stderr.flush()
+        pid = os.fork()
+        if pid == 0:
+            sel.close()
+            listener.close()
+            ipc.close_fds(list(states) + [read_end])
+            _child(conn, request, fds, write_end)
+        os.close(write_end)
+        ipc.close_fds(fds)
+    states[read_end] = bytearray()
+    sel.register(read_end, selectors.EVENT_READ)
+    return True
+
+def _reap():
+    while True:
+        try:
+            pid, _ = os.waitpid(-1, os.WNOHANG)
+        except ChildProcessError:
+            return
+        if pid == 0:
+            return
+
+def _parse_args(config):
+    d = {
+        'quiet': config.getboolean('quiet', False)
+    }
+    stop = config.getboolean('stop', False)
+
+    def exc():
+        if stop:
+            if not stop_server():
+                raise ServeError('not running')
+            return
+        return serve(**d)
+    return exc
+
+def _setup_parser(parent):
+    serve_parser = parent.add_parser(
+        'serve',
+        description='Keep the tool loaded and run the commands of'
+                    ' jutge-tools-client (used by the `shrc` aliases) on it,'
+                    ' so that they do not pay the startup time. Runs until'
+                    ' interrupted.',
+        help='run commands from jutge-tools-client faster'
+    )
+    serve_parser.set_defaults(action=_parse_args)
+
+    serve_group = serve_parser.add_mutually_exclusive_group()
+    serve_group.add_argument(
+        '-q', '--quiet',
+        action='store_true',
+        help='do not print where it is listening'
+    )
+    serve_group.add_argument(
+        '--stop',
+        action='store_true',
+        help='stop the running server'
+    )
+
+    return serve_parser
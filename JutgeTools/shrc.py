@@ -5,6 +5,10 @@ import os.path
 from textwrap import dedent as _dedent
 from .compilef import COMPILE_FLAGS
 
+# Runs the command on `jutge-tools serve` when it is running, and falls back
+# to running it itself
+CLIENT = 'jutge-tools-client'
+
 class Shells(Enum):
     BASH = 1
     TCSH = 2
@@ -62,18 +66,23 @@ def _header(shell, comment):
         return ':;: {} :;:'.format(comment)
 
 def shrc(shell, quiet=False, alias=None, p1_alias=True, config=None,
-         compiler='g++', dlalias=None):
+         compiler='g++', dlalias=None, client=True):
     if alias is None:
         alias = os.path.basename(sys.argv[0])
     if not quiet:
         print('Append the following to {}:'.format(_SHELL_CONFIGS[shell]),
                 file=sys.stderr)
+        if client:
+            print('Run `{} serve &` to make the aliases faster'.format(
+                os.path.basename(sys.argv[0])), file=sys.stderr)
     print(_header(shell, 'Jutge tools'))
     if p1_alias:
         print(_create_alias(shell, 'p1++', compiler + ' ' + COMPILE_FLAGS))
+    command = CLIENT if client else os.path.basename(sys.argv[0])
     if config is not None:
-        print(_create_alias(shell, alias,
-              os.path.basename(sys.argv[0]) + ' --config ' + config))
+        command += ' --config ' + config
+    if command != alias:
+        print(_create_alias(shell, alias, command))
     if dlalias is not None:
         print(_dl_function(shell) % {'fname': dlalias, 'jt': alias})
     print()
@@ -88,7 +97,8 @@ def _parse_args(config):
         'config': str(config.file) if config.file is not None else None,
         'alias': config.get('alias', os.path.basename(sys.argv[0])),
         'p1_alias': config.getboolean('p1_alias', True),
-        'dlalias': config.get('dlalias')
+        'dlalias': config.get('dlalias'),
+        'client': config.getboolean('client', True)
     }
 
     def exc():
@@ -145,4 +155,15 @@ def _setup_parser(parent):
         help='set an alias that will download and cd into a problem'
     )
 
+    shrc_parser.add_argument(
+        '--no-client',
+        action='store_false',
+        dest='client',
+        default=None,
+        help='make the aliases run {name} directly, instead of through'
+             ' {client} (which uses `{name} serve` when it is running)'.format(
+                name=os.path.basename(sys.argv[0]), client=CLIENT
+            )
+    )
+
     return shrc_parser
@@ -0,0 +1,187 @@
+from pathlib import Path
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import os
+import shutil
+import subprocess
+import tempfile
+from .compilef import compilef
+from ._aux.errors import StressError, CompileError
+from ._aux.programs import build_program, run_program
+from ._aux import runner, profiles, checkers
+
+DEFAULT_SEEDS = 1000
+CASE_PREFIX = 'stress'
+
+def _check_seed(seed, tmpdir, solution, generator, reference, limits,
+                output_limit, checker):
+    inpfile = tmpdir / '{}{}.inp'.format(CASE_PREFIX, seed)
+    corfile = inpfile.with_suffix('.cor')
+    with inpfile.open('wb') as inp:
+        run_program([str(generator), str(seed)], subprocess.DEVNULL, inp,
+                     limits.wall, 'the generator (seed {})'.format(seed))
+    with inpfile.open('rb') as inp, corfile.open('wb') as cor:
+        run_program([str(reference)], inp, cor, limits.wall,
+                     'the reference (seed {})'.format(seed))
+    result = runner.run_case(solution, inpfile, corfile, output_limit,
+                             limits=limits, checker=checker)
+    if result.verdict == runner.ACCEPTED:
+        inpfile.unlink()
+        corfile.unlink()
+    return seed, result
+
+# Run the generator with seeds start, start + 1... (as its only argument)
+# and compare the solution against the reference on each input, until
+# they disagree
+def stress(generator, reference, seeds=DEFAULT_SEEDS, start=1, jobs=None,
+           strict=True, debug=True, force=False, pch=True,
+           limits=runner.DEFAULT_LIMITS, output_limit=runner.OUTPUT_LIMIT,
+           profile=None, checker=None):
+    cwd = Path.cwd()
+    if jobs is None:
+        jobs = os.cpu_count() or 1
+    generator = Path(generator).resolve()
+    reference = Path(reference).resolve()
+
+    # The solution is every other source in the dir
+    sources = [f for f in cwd.glob('*.cc')
+               if f.resolve() not in (generator, reference)]
+    if not sources:
+        raise StressError('no C++ files (must end in .cc) for the solution')
+    try:
+        solution = compilef(strict=strict, debug=debug, sources=sources,
+                            force=force, pch=pch, profile=profile).resolve()
+    except CompileError as ex:
+        raise StressError(ex) from ex
+    generator = build_program(generator, force, pch)
+    reference = build_program(reference, force, pch)
+
+    print('Stress testing with seeds {} to {}'.format(start,
+                                                     start + seeds - 1))
+    failure = None
+    checked = 0
+    with tempfile.TemporaryDirectory(prefix='jutge-stress-') as tmpdir, \
+            ThreadPoolExecutor(max_workers=max(jobs, 1)) as executor:
+        # Seeds are submitted a few at a time, and checked in order, so that
+        # the failure reported is always the one with the lowest seed
+        remaining = iter(range(start, start + seeds))
+        pending = deque()
+
+        def fill():
+            for seed in remaining:
+                pending.append(executor.submit(
+                    _check_seed, seed, Path(tmpdir), solution, generator,
+                    reference, limits, output_limit, checker))
+                if len(pending) >= 2 * jobs:
+                    break
+
+        try:
+            fill()
+            while pending:
+                seed, result = pending.popleft().result()
+                checked += 1
+                if result.verdict != runner.ACCEPTED:
+                    failure = seed, result
+                    break
+                fill()
+        finally:
+            for f in pending:
+                f.cancel()
+
+        if failure is None:
+            print('All {} seeds passed'.format(checked))
+            return
+        seed, result = failure
+        case = '{}{}'.format(CASE_PREFIX, seed)
+        for suffix in ('.inp', '.cor'):
+            shutil.copyfile(str(Path(tmpdir, case + suffix)),
+                            str(cwd / (case + suffix)))
+
+    print('Seed {} failed with verdict {} after {} seed(s)'.format(
+        seed, result.verdict, checked))
+    print('Saved as {0}.inp and {0}.cor: run `test {0}` to see the'
+          ' difference'.format(case))
+
+def _parse_args(config):
+    d = {
+        'generator': config['generator'],
+        'reference': config['reference'],
+        'seeds': config.getint('seeds', DEFAULT_SEEDS),
+        'start': config.getint('start', 1),
+        'jobs': config.getint('jobs'),
+        'strict': config.getboolean('strict', True),
+        'force': config.getboolean('force', False),
+        'pch': config.getboolean('pch', True),
+        'limits': runner.limits_from_config(config),
+        'output_limit': runner.output_limit_from_config(config)
+    }
+
+    def exc():
+        return stress(profile=profiles.from_config(config),
+                      checker=checkers.from_config(config, Path.cwd()), **d)
+    return exc
+
+def _setup_parser(parent):
+    stress_parser = parent.add_parser(
+        'stress',
+        description='Compare the exercise in the current dir against a'
+                    ' reference solution on random inputs. The generator is'
+                    ' run with a seed as its only argument and must print'
+                    ' an input. The first input on which they disagree is'
+                    ' saved as a new test case.',
+        help='look for a failing input using a generator and a reference'
+    )
+    stress_parser.set_defaults(action=_parse_args)
+
+    stress_parser.add_argument(
+        'generator',
+        help='generator source (.cc or .cpp, compiled) or executable'
+    )
+    stress_parser.add_argument(
+        'reference',
+        help='reference solution source (.cc or .cpp, compiled) or executable'
+    )
+
+    stress_parser.add_argument(
+        '-n', '--seeds',
+        type=int,
+        metavar='N',
+        help='number of seeds to try. Default: {}'.format(DEFAULT_SEEDS)
+    )
+    stress_parser.add_argument(
+        '-s', '--start',
+        type=int,
+        metavar='SEED',
+        help='first seed. Default: 1'
+    )
+    stress_parser.add_argument(
+        '-j', '--jobs',
+        type=int,
+        metavar='N',
+        help='check up to N seeds at the same time. Default: number of CPUs'
+    )
+
+    stress_parser.add_argument(
+        '--no-strict',
+        action='store_false',
+        dest='strict',
+        help='compile the solution with the --no-strict flag'
+    )
+    stress_profile_group = stress_parser.add_mutually_exclusive_group()
+    stress_profile_group.add_argument(
+        '--no-debug',
+        action='store_false',
+        dest='debug',
+        help='compile the solution with -DNDEBUG. Same as --profile release'
+    )
+    profiles.add_profile_argument(stress_profile_group)
+    stress_parser.add_argument(
+        '--force',
+        action='store_true',
+        help='recompile even if the build cache is up to date'
+    )
+
+    runner.add_limit_arguments(stress_parser)
+    checkers.add_checker_arguments(stress_parser)
+
+    return stress_parser
@@ -2,92 +2,158 @@ from string import Template
 from pathlib import Path
 import subprocess
 from collections import namedtuple
+from concurrent.futures import Future, ThreadPoolExecutor
 import shlex
 import os
-import signal
 from .compilef import compilef
-from ._aux.errors import TestError, CompileError
+from ._aux.errors import TestError, CompileError, ProcessError
+from ._aux import runner, result_cache, profiles, report as case_report
+from ._aux import checkers, diff as line_diff
 
-# Ugly hack to get signal name from signal code
-SIGNALS = dict((k, v) for v, k in reversed(sorted(signal.__dict__.items()))
-     if v.startswith('SIG') and not v.startswith('SIG_'))
+SOURCE_SUFFIXES = ('.cc', '.cpp', '.hh', '.h', '.hpp')
 
-def test(cases=None, compile=True, strict=True, debug=True, diff=True,
-         diff_tool=None, verbose=False):
-    if diff_tool is None:
-        diff_tool = 'diff -y $output $correct'
-    diff_tpl = Template(diff_tool)
-    cwd = Path.cwd()
+_LIMIT_VERDICTS = {
+    runner.TIME_LIMIT_EXCEEDED: 'time limit exceeded',
+    runner.MEMORY_LIMIT_EXCEEDED: 'memory limit exceeded',
+    runner.OUTPUT_LIMIT_EXCEEDED: 'output limit exceeded'
+}
 
-    executable = cwd / (cwd.name.split('_')[0] + '.x')
-    if compile or not executable.exists():
-        try:
-            compilef(strict=strict, debug=debug)
-        except CompileError as ex:
-            raise TestError(ex) from ex
-    assert(executable.exists())
+def _case_crashed(result, verbose):
+    if verbose:
+        print()
+        print('=' * 10)
+        print('sample "{}" failed.'.format(result.case))
+        print('Output:')
+        print('-' * 10)
+        if result.out:
+            print(result.out.decode('utf-8', 'replace'))
+        else:
+            print('(No output)')
+        print('-' * 10)
+        print('Further information can be found on the error message')
+        print('=' * 10)
+    msg = ('sample exited with non-zero status, stopping: '
+        + str(result.returncode))
+    try:
+        if result.returncode < 0:
+            msg += (
+                ' (signal ' +
+                runner.SIGNALS.get(-result.returncode, "unknown signal") + ')'
+            )
+        else:
+            msg += ' (' + os.strerror(result.returncode) + ')'
+    except ValueError:
+        pass
 
-    FailedCase = namedtuple('FailedCase', ['case', 'out', 'cor'])
-    failed_cases = []
+    raise TestError(msg, out=result.out)
+
+FailedCase = namedtuple('FailedCase',
+                        ['case', 'out', 'cor', 'mismatch', 'line',
+                         'truncated'])
+
+def _submit(executor, cache, executable, inpfile, output_limit, limits,
+            checker, reuse, rerun_failed):
+    corfile = inpfile.with_suffix('.cor')
+    key = result_cache.case_key(executable, inpfile, corfile, limits,
+                                output_limit, checker)
+    cached = cache.get(key) if reuse else None
+    if cached is not None and not (rerun_failed and
+                                   cached.verdict != runner.ACCEPTED):
+        future = Future()
+        future.set_result(cached)
+        return key, future, True
+    future = executor.submit(runner.run_case, executable, inpfile, corfile,
+                             output_limit, limits=limits, checker=checker)
+    return key, future, False
 
-    for inpfile in sorted(cwd.glob('*.inp')):
-        corfile = inpfile.with_suffix('.cor')
+def _select_cases(cwd, cases):
+    if not cases:
+        return sorted(cwd.glob('*.inp'))
+    inpfiles = set()
+    for case in cases:
+        if case.endswith(('.inp', '.cor')):
+            case = case[:-len('.inp')]
+        inpfile = cwd / (case + '.inp')
+        if not inpfile.exists():
+            raise TestError('case "{}" does not exist'.format(case))
+        inpfiles.add(inpfile)
+    return sorted(inpfiles)
+
+# What failed last time is the most likely to fail again, so it runs first
+# (results are still shown in the order of the cases, but see fail_fast)
+def _failures_first(inpfiles, cache):
+    failed = cache.failed()
+    return sorted(inpfiles, key=lambda inpfile: inpfile.stem not in failed)
+
+def _run_cases(executable, inpfiles, jobs, output_limit, limits, verbose,
+               cache, checker=None, reuse=True, rerun_failed=False,
+               fail_fast=False, report=None, schedule=None):
+    failed_cases = []
+    # Cases run concurrently, in the order of `schedule` (default: inpfiles),
+    # but results are consumed in the order of inpfiles so that the report
+    # (and the diff bundle) follows it
+    with ThreadPoolExecutor(max_workers=max(jobs, 1)) as executor:
+        futures = {}
+        for inpfile in schedule if schedule is not None else inpfiles:
+            futures[inpfile] = _submit(executor, cache, executable, inpfile,
+                                       output_limit, limits, checker, reuse,
+                                       rerun_failed)
+        submitted = [futures[inpfile] for inpfile in inpfiles]
         try:
-            inp = inpfile.open('r')
-            out = subprocess.check_output([str(executable)], stdin=inp,
-                                          universal_newlines=True)
-        except subprocess.CalledProcessError as ex:
-            if verbose:
-                print()
-                print('=' * 10)
-                print('sample "{}" failed.'.format(inpfile.stem))
-                print('Output:')
-                print('-' * 10)
-            try:
-                if verbose:
-                    print(out)
-                else:
-                    out  # Ensure that 'out' is defined
-            except NameError:
-                if verbose:
-                    print('(No output)')
-                out = None
-            if verbose:
-                print('-' * 10)
-                print('Further information can be found on the error message')
-                print('=' * 10)
-            msg = ('sample exited with non-zero status, stopping: '
-                + str(ex.returncode))
-            try:
-                if ex.returncode < 0:
-                    msg += (
-                        ' (signal ' +
-                        SIGNALS.get(-ex.returncode, "unknown signal") + ')'
-                    )
-                else:
-                    msg += ' (' + os.strerror(ex.returncode) + ')'
-            except ValueError:
-                pass
+            for i, (key, future, cached) in enumerate(submitted):
+                result = future.result()
+                if not cached:
+                    cache.put(key, result)
+                if report is not None:
+                    report.add(result, cached)
+                if result.verdict == runner.RUNTIME_ERROR:
+                    _case_crashed(result, verbose)
 
-            raise TestError(msg, out=out)
+                usage = runner.format_usage(result.usage)
+                if cached:
+                    usage = 'cached: ' + usage
+                if result.verdict == runner.ACCEPTED:
+                    print('{} passed ({})'.format(result.case, usage))
+                elif result.verdict in _LIMIT_VERDICTS:
+                    print('{} failed: {} ({})'.format(
+                        result.case, _LIMIT_VERDICTS[result.verdict], usage))
+                else:
+                    print('{} failed ({})'.format(result.case, usage))
+                    failed_cases.append(FailedCase(
+                        case=result.case, out=result.out, cor=result.cor,
+                        mismatch=result.mismatch, line=result.line,
+                        truncated=result.truncated
+                    ))
+                if fail_fast and result.verdict != runner.ACCEPTED:
+                    skipped = len(submitted) - i - 1
+                    if skipped:
+                        print('Stopping at the first failure ({} case(s) not'
+                              ' checked)'.format(skipped))
+                    break
         finally:
-            inp.close()
+            for _, future, _ in submitted:
+                future.cancel()
+            cache.save()
+    return failed_cases
 
-        with corfile.open('rb') as corobj:
-                cor = corobj.read()
-        casename = inpfile.with_suffix('').name
-        if out == cor:
-            print(casename + ' passed')
-        else:
-            print(casename + ' failed')
-            failed_cases.append(FailedCase(
-                case=inpfile.with_suffix('').name,
-                out=out, cor=cor
-            ))
+def _lines(data):
+    return data.decode('utf-8', 'replace').splitlines()
 
-    if not failed_cases:
-        return
+def _print_diff(failed_cases):
+    for fc in failed_cases:
+        lines = line_diff.unified_diff(
+            _lines(fc.out), _lines(fc.cor), fc.case + ' (output)',
+            fc.case + ' (correct)', first_line=fc.line or 0,
+            truncated=fc.truncated
+        )
+        if not lines:
+            # Same lines: only line endings or the final newline differ
+            print('{}: outputs differ at byte {} (whitespace at the end of'
+                  ' a line?)'.format(fc.case, fc.mismatch))
+            continue
+        print('\n'.join(lines))
 
+def _show_diff(cwd, failed_cases, diff_tpl):
     all_output = cwd / '.all_output'
     all_correct = cwd / '.all_correct'
     try:
@@ -97,9 +163,12 @@ def test(cases=None, compile=True, strict=True, debug=True, diff=True,
         cor.write('## CORRECT ##\n'.encode('utf-8'))
 
         for fc in failed_cases:
-            out.write('\n# {} #\n'.format(fc.case).encode('utf-8'))
+            # Only a window around the first difference is kept
+            header = '\n# {} (first difference at byte {}) #\n'.format(
+                fc.case, fc.mismatch).encode('utf-8')
+            out.write(header)
             out.write(fc.out)
-            cor.write('\n# {} #\n'.format(fc.case).encode('utf-8'))
+            cor.write(header)
             cor.write(fc.cor)
     finally:
         out.close()
@@ -119,20 +188,140 @@ def test(cases=None, compile=True, strict=True, debug=True, diff=True,
     all_output.unlink()
     all_correct.unlink()
 
+def _watch(cwd, build, run):
+    from ._aux.watcher import Watcher  # Only needed with --watch
+    with Watcher(cwd) as watcher:
+        print('Watching {} for changes (Ctrl-C to stop)'.format(cwd))
+        while True:
+            changed = watcher.wait()
+            sources = [p for p in changed if p.suffix in SOURCE_SUFFIXES]
+            cases = sorted(p.with_suffix('.inp') for p in changed
+                           if p.suffix in ('.inp', '.cor'))
+            try:
+                if sources:
+                    print('\n{} changed'.format(
+                        ', '.join(p.name for p in sources)))
+                    build()
+                    run()
+                elif cases:
+                    cases = [c for c in sorted(set(cases)) if c.exists()]
+                    print('\n{} changed'.format(
+                        ', '.join(c.stem for c in cases)))
+                    run(cases)
+            except ProcessError as ex:
+                # Keep watching: the next save will probably fix it
+                print('error: {}'.format(ex))
+
+def test(cases=None, compile=True, strict=True, debug=True, diff=True,
+         diff_tool=None, verbose=False, jobs=None, force=False,
+         incremental=False, pch=True, output_limit=runner.OUTPUT_LIMIT,
+         limits=runner.DEFAULT_LIMITS, watch=False, rerun=False,
+         rerun_failed=False, fail_fast=False, profile=None, report=None,
+         report_file=None, directory=None, checker=None):
+    diff_tpl = Template(diff_tool) if diff_tool is not None else None
+    # The exercise dir: the current one unless given
+    cwd = Path.cwd() if directory is None else Path(directory).resolve()
+    if jobs is None:
+        jobs = os.cpu_count() or 1
+
+    if profile is None:
+        profile = profiles.DEFAULT_PROFILE if debug else 'release'
+    profile = profiles.get(profile)
+    executable = cwd / profiles.artifact_name(cwd, profile)
+
+    def build(force):
+        try:
+            # In watch mode only what changed is rebuilt
+            compilef(strict=strict, profile=profile, force=force,
+                     incremental=incremental or watch, pch=pch, jobs=jobs,
+                     directory=directory)
+        except CompileError as ex:
+            raise TestError(ex) from ex
+
+    def run(inpfiles=None):
+        if inpfiles is None:
+            inpfiles = _select_cases(cwd, cases)
+        cache = result_cache.ResultCache(cwd)
+        case_reporter = None
+        if report is not None:
+            case_reporter = case_report.open_report(
+                report, report_file, cwd.name, profile.name, limits,
+                output_limit)
+        try:
+            # With fail_fast, results go in the order the cases run, so
+            # that it stops at the first failure as soon as it is known
+            schedule = _failures_first(inpfiles, cache)
+            failed_cases = _run_cases(executable,
+                                      schedule if fail_fast else inpfiles,
+                                      jobs, output_limit, limits, verbose,
+                                      cache, checker=checker,
+                                      reuse=not rerun,
+                                      rerun_failed=rerun_failed,
+                                      fail_fast=fail_fast,
+                                      report=case_reporter, schedule=schedule)
+        finally:
+            if case_reporter is not None:
+                case_reporter.close()
+        if not failed_cases or not diff:
+            return
+        if diff_tpl is None:
+            _print_diff(failed_cases)
+        else:
+            _show_diff(cwd, failed_cases, diff_tpl)
+
+    _select_cases(cwd, cases)  # Fail before compiling if a case is missing
+    if checker is not None and checker.name != checkers.EXACT:
+        print('Checking with ' + checkers.describe(checker))
+    if report is not None:
+        if report not in case_report.FORMATS:
+            raise TestError('unknown report format "{}"'.format(report))
+        if report_file is None:
+            report_file = case_report.DEFAULT_FILES[report]
+        report_file = Path(report_file).resolve()
+    if compile or not executable.exists():
+        build(force)
+    assert(executable.exists())
+
+    if not watch:
+        run()
+        return
+
+    try:
+        try:
+            run()
+        except TestError as ex:
+            print('error: {}'.format(ex))
+        _watch(cwd, lambda: build(False), run)
+    except KeyboardInterrupt:
+        print()
+
 
 def _parse_args(config):
     d = {
         'cases': config['case'],
         'compile': config.getboolean('compile', True),
         'strict': config.getboolean('strict', True),
-        'debug': config.getboolean('debug', True),
         'diff': config.getboolean('diff', True),
         'diff_tool': config.get('diff_tool'),
-        'verbose': True
+        'verbose': True,
+        'jobs': config.getint('jobs'),
+        'force': config.getboolean('force', False),
+        'incremental': config.getboolean('incremental', False),
+        'pch': config.getboolean('pch', True),
+        'output_limit': runner.output_limit_from_config(config),
+        'limits': runner.limits_from_config(config),
+        'watch': config.getboolean('watch', False),
+        'rerun': config.getboolean('rerun', False),
+        'rerun_failed': config.getboolean('rerun_failed', False),
+        'fail_fast': config.getboolean('fail_fast', False)
     }
 
+    report, report_file = case_report.from_config(config)
+
     def exc():
-        return test(**d)
+        return test(profile=profiles.from_config(config), report=report,
+                    report_file=report_file,
+                    checker=checkers.from_config(config, Path.cwd()), **d)
     return exc
 
 def _setup_parser(parent):
@@ -166,10 +355,62 @@ def _setup_parser(parent):
     )
 
     test_parser.add_argument(
+        '--force',
+        action='store_true',
+        help='recompile even if the build cache is up to date'
+             ' (no effect with --no-compile)'
+    )
+
+    test_profile_group = test_parser.add_mutually_exclusive_group()
+    test_profile_group.add_argument(
         '--no-debug',
         action='store_false',
         dest='debug',
-        help='test with -DNDEBUG (no effect with --no-compile)'
+        help='test with -DNDEBUG. Same as --profile release'
+    )
+    profiles.add_profile_argument(test_profile_group)
+
+    test_parser.add_argument(
+        '-j', '--jobs',
+        type=int,
+        metavar='N',
+        help='run up to N cases at the same time. Default: number of CPUs'
+    )
+
+    test_rerun_group = test_parser.add_mutually_exclusive_group()
+    test_rerun_group.add_argument(
+        '-r', '--rerun',
+        action='store_true',
+        default=None,
+        help='run every case, even those with a cached result (a case is'
+             ' cached while the executable, its .inp/.cor and the limits'
+             ' do not change)'
+    )
+    test_rerun_group.add_argument(
+        '-R', '--rerun-failed',
+        action='store_true',
+        default=None,
+        help='run the cases that failed last time even if their result is'
+             ' cached'
+    )
+
+    test_parser.add_argument(
+        '-x', '--fail-fast',
+        action='store_true',
+        default=None,
+        help='stop at the first case that fails. Cases that failed last'
+             ' time always run first'
+    )
+
+    runner.add_limit_arguments(test_parser)
+    checkers.add_checker_arguments(test_parser)
+    case_report.add_report_arguments(test_parser)
+
+    test_parser.add_argument(
+        '-w', '--watch',
+        action='store_true',
+        help='keep running: rebuild and rerun every case when a source'
+             ' changes, or rerun a single case when its .inp/.cor changes'
     )
 
     test_diff_group = test_parser.add_mutually_exclusive_group()
@@ -181,9 +422,9 @@ def _setup_parser(parent):
     )
     test_diff_group.add_argument(
         '-d', '--diff-tool',
-        help='diff tool to use. "$output" and "$correct" will be substituted '
-             ' (they are already quoted).'
-             ' Default: `diff -y $output $correct`'
+        help='external diff tool to use, e.g. `diff -y $output $correct`.'
+             ' "$output" and "$correct" will be substituted (they are already'
+             ' quoted). Default: show a unified diff of each failed case'
     )
 
     return test_parser
@@ -0,0 +1,260 @@
+from pathlib import Path
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+import os
+from .compilef import compilef
+from ._aux.errors import TestError, CompileError
+from ._aux import runner, result_cache, profiles, checkers
+from ._aux import report as case_report
+
+# Every dir under root with test cases and C++ sources, skipping hidden ones
+def find_exercises(root):
+    for dirpath, dirnames, filenames in os.walk(str(root)):
+        dirnames[:] = sorted(d for d in dirnames if not d.startswith('.'))
+        if any(f.endswith('.inp') for f in filenames) and \
+                any(f.endswith('.cc') for f in filenames):
+            yield Path(dirpath)
+
+class _Exercise:
+    def __init__(self, directory, root, checker):
+        self.directory = directory
+        self.checker = checker
+        self.name = str(directory.relative_to(root)) \
+            if directory != root else directory.name
+        self.cache = result_cache.ResultCache(directory)
+        self.executable = None
+        self.keys = {}  # inpfile -> result cache key
+        self.results = []
+        self.error = None
+        self.remaining = 0
+
+    def passed(self):
+        return self.error is None and all(
+            r.verdict == runner.ACCEPTED for r in self.results)
+
+# Runs on the pool, so that hashing the executable and the cases for the
+# result cache does not hold the scheduler up
+def _build(exercise, strict, profile, force, pch, limits, output_limit):
+    executable = compilef(strict=strict, profile=profile, force=force,
+                          pch=pch, jobs=1, directory=exercise.directory,
+                          verbose=False)
+    keys = {}
+    for inpfile in sorted(exercise.directory.glob('*.inp')):
+        keys[inpfile] = result_cache.case_key(
+            executable, inpfile, inpfile.with_suffix('.cor'), limits,
+            output_limit, exercise.checker)
+    return executable, keys
+
+def _print_exercise(exercise):
+    if exercise.error is not None:
+        print('{}: did not compile'.format(exercise.name))
+        return
+    failed = ['{} ({})'.format(r.case, r.verdict) for r in exercise.results
+              if r.verdict != runner.ACCEPTED]
+    passed = len(exercise.results) - len(failed)
+    msg = '{}: {}/{} passed'.format(exercise.name, passed,
+                                    len(exercise.results))
+    if failed:
+        msg += ', failed: ' + ', '.join(failed)
+    print(msg)
+
+def test_all(root='.', jobs=None, strict=True, debug=True, force=False,
+             pch=True, output_limit=runner.OUTPUT_LIMIT,
+             limits=runner.DEFAULT_LIMITS, rerun=False, profile=None,
+             report=None, report_file=None, checker=None,
+             problem_checkers=None):
+    root = Path(root).resolve()
+    if jobs is None:
+        jobs = os.cpu_count() or 1
+    if profile is None:
+        profile = profiles.DEFAULT_PROFILE if debug else 'release'
+    profile = profiles.get(profile)
+    # `checker` unless the problem has its own in problem_checkers
+    exercises = [
+        _Exercise(d, root, checkers.for_problem(d, problem_checkers, checker))
+        for d in find_exercises(root)
+    ]
+    if not exercises:
+        raise TestError('no exercises (dirs with .inp and .cc files) under '
+                        + str(root))
+    if report is not None:
+        if report not in case_report.FORMATS:
+            raise TestError('unknown report format "{}"'.format(report))
+        if report_file is None:
+            report_file = case_report.DEFAULT_FILES[report]
+        report = case_report.open_report(
+            report, Path(report_file).resolve(), root.name, profile.name,
+            limits, output_limit, workspace=True)
+    print('Testing {} exercise(s) under {}'.format(len(exercises), root))
+
+    def finish(exercise):
+        exercise.cache.save()
+        _print_exercise(exercise)
+
+    def add_result(exercise, key, result, cached):
+        if not cached:
+            exercise.cache.put(key, result)
+        exercise.results.append(result)
+        if report is not None:
+            report.add(result, cached, exercise.name)
+        exercise.remaining -= 1
+        if exercise.remaining == 0:
+            finish(exercise)
+
+    # Builds and cases share the workers. Only up to `jobs` tasks are
+    # submitted at a time and cases go before builds, so that exercises are
+    # finished (and reported) as soon as possible instead of after every
+    # build is done.
+    to_build = deque(exercises)
+    to_run = deque()
+    pending = {}
+
+    def fill():
+        while len(pending) < jobs:
+            if to_run:
+                exercise, inpfile = to_run.popleft()
+                future = executor.submit(
+                    runner.run_case, exercise.executable, inpfile,
+                    inpfile.with_suffix('.cor'), output_limit,
+                    limits=limits, forward_stderr=False,
+                    checker=exercise.checker)
+                pending[future] = exercise, exercise.keys[inpfile]
+            elif to_build:
+                exercise = to_build.popleft()
+                future = executor.submit(_build, exercise, strict, profile,
+                                         force, pch, limits, output_limit)
+                pending[future] = exercise, None
+            else:
+                return
+
+    def built(exercise, future):
+        try:
+            exercise.executable, exercise.keys = future.result()
+        except CompileError as ex:
+            exercise.error = str(ex)
+            if report is not None:
+                report.error(exercise.name, exercise.error)
+            finish(exercise)
+            return
+        exercise.remaining = len(exercise.keys)
+        if not exercise.keys:
+            finish(exercise)  # The cases were removed meanwhile
+        for inpfile, key in exercise.keys.items():
+            cached = exercise.cache.get(key) if not rerun else None
+            if cached is not None:
+                add_result(exercise, key, cached, True)
+            else:
+                to_run.append((exercise, inpfile))
+
+    try:
+        with ThreadPoolExecutor(max_workers=max(jobs, 1)) as executor:
+            try:
+                fill()
+                while pending:
+                    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        exercise, key = pending.pop(future)
+                        if key is None:
+                            built(exercise, future)
+                        else:
+                            add_result(exercise, key, future.result(), False)
+                    fill()
+            finally:
+                for future in pending:
+                    future.cancel()
+    finally:
+        if report is not None:
+            report.close()
+
+    broken = [e for e in exercises if e.error is not None]
+    failed = [e for e in exercises if e.error is None and not e.passed()]
+    cases = [r for e in exercises for r in e.results]
+    print()
+    print('{} exercise(s): {} passed, {} failed, {} did not compile'.format(
+        len(exercises), len(exercises) - len(failed) - len(broken),
+        len(failed), len(broken)))
+    print('{}/{} cases passed ({:.3f}s of cpu)'.format(
+        sum(r.verdict == runner.ACCEPTED for r in cases), len(cases),
+        sum(r.usage.cpu for r in cases)))
+    if failed or broken:
+        raise TestError('{} of {} exercises failed: {}'.format(
+            len(failed) + len(broken), len(exercises),
+            ', '.join(e.name for e in failed + broken)))
+
+def _parse_args(config):
+    d = {
+        'root': config['root'],
+        'jobs': config.getint('jobs'),
+        'strict': config.getboolean('strict', True),
+        'force': config.getboolean('force', False),
+        'pch': config.getboolean('pch', True),
+        'output_limit': runner.output_limit_from_config(config),
+        'limits': runner.limits_from_config(config),
+        'rerun': config.getboolean('rerun', False)
+    }
+    report, report_file = case_report.from_config(config)
+
+    def exc():
+        return test_all(profile=profiles.from_config(config), report=report,
+                        report_file=report_file,
+                        checker=checkers.default_checker(config),
+                        problem_checkers=checkers.problem_checkers(config),
+                        **d)
+    return exc
+
+def _setup_parser(parent):
+    test_all_parser = parent.add_parser(
+        'test-all', aliases=['ta'],
+        description='Compile and test every exercise (every dir with .inp'
+                    ' and .cc files) under ROOT, sharing the workers between'
+                    ' builds and cases, and print a summary. Fails if any'
+                    ' exercise does not compile or fails a case.',
+        help='test every exercise under a dir'
+    )
+    test_all_parser.set_defaults(action=_parse_args)
+
+    test_all_parser.add_argument(
+        'root',
+        nargs='?',
+        default='.',
+        help='dir to look for exercises in. Default: the current one'
+    )
+
+    test_all_parser.add_argument(
+        '-j', '--jobs',
+        type=int,
+        metavar='N',
+        help='run up to N builds or cases at the same time. Default: number'
+             ' of CPUs'
+    )
+    test_all_parser.add_argument(
+        '--no-strict',
+        action='store_false',
+        dest='strict',
+        help='compile with the --no-strict flag'
+    )
+    test_all_parser.add_argument(
+        '--force',
+        action='store_true',
+        help='recompile even if the build cache is up to date'
+    )
+    test_all_profile_group = test_all_parser.add_mutually_exclusive_group()
+    test_all_profile_group.add_argument(
+        '--no-debug',
+        action='store_false',
+        dest='debug',
+        help='test with -DNDEBUG. Same as --profile release'
+    )
+    profiles.add_profile_argument(test_all_profile_group)
+    test_all_parser.add_argument(
+        '-r', '--rerun',
+        action='store_true',
+        default=None,
+        help='run every case, even those with a cached result'
+    )
+
+    runner.add_limit_arguments(test_all_parser)
+    checkers.add_checker_arguments(test_all_parser)
+    case_report.add_report_arguments(test_all_parser)
+
+    return test_all_parser
@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+# Startup time of jutge-tools, measured as the time to run a few cheap
+# commands minus the time to start a bare interpreter. Exits with status 1
+# if the median overhead of any command is above the target.
+#
+#   python benchmarks/startup.py [-n RUNS] [--target MS]
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+DEFAULT_RUNS = 20
+DEFAULT_TARGET = 150.0  # Milliseconds over a bare interpreter
+
+MAIN = 'from JutgeTools._aux.cli import main; main()'
+COMMANDS = [
+    ['--version'],
+    ['--help'],
+    ['compile', '--help'],
+    ['test', '--help'],
+    ['download', '--help'],
+]
+
+def _time(argv, runs, env):
+    times = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run(argv, env=env, stdout=subprocess.DEVNULL,
+                       stderr=subprocess.DEVNULL, check=False)
+        times.append((time.perf_counter() - start) * 1000)
+    return statistics.median(times)
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure the startup time'
+                                                 ' of jutge-tools')
+    parser.add_argument('-n', '--runs', type=int, default=DEFAULT_RUNS,
+                        help='runs per command. Default: {}'.format(
+                            DEFAULT_RUNS))
+    parser.add_argument('--target', type=float, default=DEFAULT_TARGET,
+                        metavar='MS',
+                        help='maximum median overhead over a bare interpreter,'
+                             ' in milliseconds. Default: {}'.format(
+                                 DEFAULT_TARGET))
+    args = parser.parse_args()
+
+    env = dict(os.environ)
+    env['PYTHONPATH'] = os.pathsep.join(
+        p for p in (str(ROOT), env.get('PYTHONPATH')) if p)
+    python = [sys.executable, '-c']
+
+    baseline = _time(python + ['pass'], args.runs, env)
+    print('{:<24} {:>8.1f} ms'.format('(interpreter)', baseline))
+    slow = False
+    for command in COMMANDS:
+        median = _time(python + [MAIN] + command, args.runs, env)
+        overhead = median - baseline
+        over = overhead > args.target
+        slow = slow or over
+        print('{:<24} {:>8.1f} ms  (+{:.1f} ms){}'.format(
+            ' '.join(command), median, overhead, '  SLOW' if over else ''))
+    if slow:
+        print('Startup overhead above the target of {} ms'.format(args.target))
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
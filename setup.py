@@ -3,11 +3,12 @@ from setuptools import setup, find_packages
 setup(
     name='jutge-tools',
     version='1.2.2',
-    packages=find_packages(),
-    python_requires='>=3.4',
+    packages=find_packages(exclude=['tests']),
+    python_requires='>=3.5',
     entry_points={
         'console_scripts': [
-            'jutge-tools = JutgeTools._aux.cli:main'
+            'jutge-tools = JutgeTools._aux.cli:main',
+            'jutge-tools-client = JutgeTools._aux.client:main'
         ]
     }
 )
@@ -0,0 +1,110 @@
+import hashlib
+import http.server
+import io
+import os
+import socketserver
+import tempfile
+import threading
+import unittest
+import zipfile
+from collections import Counter
+from pathlib import Path
+
+# A zip laid out like the ones from Jutge: every file under a dir named
+# after the exercise
+def problem_zip(exercise, files):
+    buf = io.BytesIO()
+    with zipfile.ZipFile(buf, 'w') as z:
+        for name, content in sorted(files.items()):
+            z.writestr('{}/{}'.format(exercise, name), content)
+    return buf.getvalue()
+
+class _Server(socketserver.ThreadingMixIn, http.server.HTTPServer):
+    daemon_threads = True
+
+class _Handler(http.server.BaseHTTPRequestHandler):
+    # Keep-alive, like the real server, so that the pool reuses connections
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        stub = self.server.stub
+        with stub.lock:
+            stub.requests[self.path] += 1
+            body = stub.files.get(self.path)
+        if body is None:
+            self._reply(404)
+            return
+        etag = '"{}"'.format(hashlib.sha1(body).hexdigest())
+        if self.headers.get('If-None-Match') == etag:
+            with stub.lock:
+                stub.not_modified[self.path] += 1
+            self._reply(304, etag=etag)
+            return
+        self._reply(200, body, etag)
+
+    def _reply(self, status, body=b'', etag=None):
+        self.send_response(status)
+        if etag is not None:
+            self.send_header('ETag', etag)
+        if status != 304:
+            self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+# Serve `files` ({path: bytes}) on localhost, counting the requests for
+# each path (and how many were answered with 304)
+class HTTPStub:
+    def __init__(self, files=None):
+        self.files = dict(files or {})
+        self.requests = Counter()
+        self.not_modified = Counter()
+        self.lock = threading.Lock()
+        self._server = _Server(('127.0.0.1', 0), _Handler)
+        self._server.stub = self
+        self._thread = threading.Thread(target=self._server.serve_forever,
+                                        args=(0.05,), daemon=True)
+
+    @property
+    def base_url(self):
+        return 'http://127.0.0.1:{}'.format(self._server.server_address[1])
+
+    def add_problem(self, exercise, files):
+        self.files['/{}/zip'.format(exercise)] = problem_zip(exercise, files)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._server.shutdown()
+        self._server.server_close()
+        self._thread.join()
+
+# Each test runs in a dir of its own (self.tmp / 'work'), with its own user
+# cache dir, against a fresh HTTPStub (self.stub)
+class StubTestCase(unittest.TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory(prefix='jutge-test-')
+        self.addCleanup(tmp.cleanup)
+        self.tmp = Path(tmp.name)
+        (self.tmp / 'work').mkdir()
+        old_cwd = os.getcwd()
+        os.chdir(str(self.tmp / 'work'))
+        self.addCleanup(os.chdir, old_cwd)
+        old_cache = os.environ.get('XDG_CACHE_HOME')
+        os.environ['XDG_CACHE_HOME'] = str(self.tmp / 'xdg')
+        self.addCleanup(self._restore_env, old_cache)
+
+        self.stub = HTTPStub()
+        self.stub.__enter__()
+        self.addCleanup(self.stub.__exit__, None, None, None)
+
+    @staticmethod
+    def _restore_env(old_cache):
+        if old_cache is None:
+            del os.environ['XDG_CACHE_HOME']
+        else:
+            os.environ['XDG_CACHE_HOME'] = old_cache
@@ -0,0 +1,36 @@
+import os
+import tempfile
+import unittest
+from pathlib import Path
+from JutgeTools.bench import bench
+from JutgeTools._aux.errors import BenchError
+
+class BenchArgumentsTest(unittest.TestCase):
+    # All of these fail before anything is compiled
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory(prefix='jutge-test-')
+        self.addCleanup(tmp.cleanup)
+        old_cwd = os.getcwd()
+        os.chdir(tmp.name)
+        self.addCleanup(os.chdir, old_cwd)
+        Path('sample.inp').write_bytes(b'1\n')
+
+    def test_no_runs(self):
+        with self.assertRaisesRegex(BenchError, 'at least one run'):
+            bench(runs=0)
+
+    def test_negative_warmup(self):
+        with self.assertRaisesRegex(BenchError, 'warm-up'):
+            bench(warmup=-1)
+
+    def test_unknown_case(self):
+        with self.assertRaisesRegex(BenchError, 'case "other" does not'):
+            bench(cases=['sample', 'other'])
+
+    def test_no_cases(self):
+        Path('sample.inp').unlink()
+        with self.assertRaisesRegex(BenchError, 'no test cases'):
+            bench()
+
+if __name__ == '__main__':
+    unittest.main()
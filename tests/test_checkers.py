@@ -0,0 +1,179 @@
+import argparse
+import tempfile
+import unittest
+from pathlib import Path
+from JutgeTools._aux import checkers
+from JutgeTools._aux.config_file import ConfigFile
+from JutgeTools._aux.errors import CheckerError
+
+TOKENS = checkers.make(checkers.TOKENS)
+NUMERIC = checkers.make(checkers.NUMERIC, abs_eps=1e-3, rel_eps=1e-6)
+
+# Feed `output` in chunks of `size` bytes, as the runner reads it, and
+# return the comparator once finished
+def _compare(checker, output, expected, size=None, window=64):
+    comparator = checkers.comparator(checker, expected, window)
+    size = size or max(len(output), 1)
+    for i in range(0, len(output), size):
+        if not comparator.feed(output[i:i + size]):
+            break
+    comparator.finish()
+    return comparator
+
+class CheckerTestCase(unittest.TestCase):
+    # The verdict must not depend on where the reads split the output
+    def assertVerdict(self, checker, output, expected, accepted):
+        for size in range(1, len(output) + 2):
+            comparator = _compare(checker, output, expected, size)
+            self.assertEqual(
+                comparator.mismatch is None, accepted,
+                '{!r} vs {!r} in chunks of {}'.format(output, expected,
+                                                      size))
+
+    def assertSame(self, checker, output, expected):
+        self.assertVerdict(checker, output, expected, True)
+
+    def assertDifferent(self, checker, output, expected):
+        self.assertVerdict(checker, output, expected, False)
+
+class MakeTest(unittest.TestCase):
+    def test_exact_has_no_comparator(self):
+        exact = checkers.make(checkers.EXACT)
+        self.assertIsNone(checkers.comparator(exact, b'1\n', 64))
+        self.assertIsNone(checkers.comparator(None, b'1\n', 64))
+        self.assertIsNone(checkers.comparator(TOKENS, None, 64))
+
+    def test_defaults(self):
+        numeric = checkers.make(checkers.NUMERIC)
+        self.assertEqual(numeric.abs_eps, checkers.DEFAULT_ABS_EPS)
+        self.assertEqual(numeric.rel_eps, checkers.DEFAULT_REL_EPS)
+
+    def test_unknown(self):
+        with self.assertRaises(CheckerError):
+            checkers.make('fuzzy')
+
+class TokensTest(CheckerTestCase):
+    def test_identical(self):
+        self.assertSame(TOKENS, b'1 2 3\n', b'1 2 3\n')
+        self.assertSame(TOKENS, b'', b'')
+
+    def test_whitespace(self):
+        self.assertSame(TOKENS, b'1  2\t3', b'1 2 3\n')
+        self.assertSame(TOKENS, b'\n\n1\r\n2\n3\n\n', b'1 2 3')
+        self.assertSame(TOKENS, b' \n', b'')
+        self.assertSame(TOKENS, b'', b'\n\n')
+
+    def test_different(self):
+        self.assertDifferent(TOKENS, b'1 2 4\n', b'1 2 3\n')
+        self.assertDifferent(TOKENS, b'12 3\n', b'1 23\n')
+        self.assertDifferent(TOKENS, b'1 2\n', b'1 2 3\n')
+        self.assertDifferent(TOKENS, b'1 2 3 4\n', b'1 2 3\n')
+        self.assertDifferent(TOKENS, b'1.0\n', b'1\n')
+
+    def test_token_goes_on(self):
+        # The output matches the expected one byte by byte, up to where a
+        # token of it goes on
+        self.assertDifferent(TOKENS, b'abc def\n', b'abc de\n')
+        self.assertDifferent(TOKENS, b'abc de\n', b'abc def\n')
+        self.assertDifferent(TOKENS, b'abc de', b'abc def')
+        self.assertSame(TOKENS, b'abc  def', b'abc def')
+
+    def test_mismatch_offsets(self):
+        comparator = _compare(TOKENS, b'1  2  x\n', b'1 2 3\n')
+        self.assertEqual(comparator.mismatch, 6)
+        self.assertEqual(comparator.expected_mismatch, 4)
+        out, cor, line, _ = comparator.windows()
+        self.assertEqual((out, cor, line), (b'1  2  x\n', b'1 2 3\n', 0))
+
+    def test_windows_start_on_last_equal_line(self):
+        comparator = _compare(TOKENS, b'a\nb\nc d\nx\n', b'a\nb\nc\nd\ne\n')
+        out, cor, line, _ = comparator.windows()
+        self.assertEqual(line, 2)
+        self.assertTrue(out.startswith(b'c d\n'))
+        self.assertTrue(cor.startswith(b'd\n'))
+
+    def test_stops_after_window(self):
+        comparator = checkers.comparator(TOKENS, b'1\n', 4)
+        self.assertTrue(comparator.feed(b'2'))
+        self.assertTrue(comparator.feed(b' 3'))
+        self.assertFalse(comparator.feed(b' 4 5 6'))
+        self.assertFalse(comparator.finish())
+
+class NumericTest(CheckerTestCase):
+    def test_absolute(self):
+        self.assertSame(NUMERIC, b'0.1005\n', b'0.1\n')
+        self.assertSame(NUMERIC, b'-2.999\n', b'-3\n')
+        self.assertDifferent(NUMERIC, b'0.102\n', b'0.1\n')
+
+    def test_relative(self):
+        self.assertSame(NUMERIC, b'1000000.5\n', b'1000000\n')
+        self.assertSame(NUMERIC, b'1.0000005e12\n', b'1e12\n')
+        self.assertDifferent(NUMERIC, b'1.00001e12\n', b'1e12\n')
+        # Relative to the expected value, not to the output
+        relative = checkers.make(checkers.NUMERIC, abs_eps=0, rel_eps=0.5)
+        self.assertSame(relative, b'15\n', b'10\n')
+        self.assertDifferent(relative, b'5\n', b'15\n')
+
+    def test_notation(self):
+        self.assertSame(NUMERIC, b'1e-1 +2 3.\n', b'0.1 2.0 3\n')
+        self.assertSame(NUMERIC, b'1 2.0000001 three\n', b'1 2 three\n')
+        self.assertDifferent(NUMERIC, b'1 2 four\n', b'1 2 three\n')
+        self.assertDifferent(NUMERIC, b'1 2 3\n', b'1 2 three\n')
+
+    def test_nan(self):
+        self.assertSame(NUMERIC, b'nan\n', b'NaN\n')
+        self.assertDifferent(NUMERIC, b'nan\n', b'0\n')
+        self.assertDifferent(NUMERIC, b'0\n', b'nan\n')
+        self.assertDifferent(NUMERIC, b'inf\n', b'nan\n')
+
+    def test_inf(self):
+        self.assertSame(NUMERIC, b'inf -inf\n', b'Infinity -inf\n')
+        self.assertDifferent(NUMERIC, b'inf\n', b'-inf\n')
+        self.assertDifferent(NUMERIC, b'1e308\n', b'inf\n')
+        self.assertDifferent(NUMERIC, b'inf\n', b'1e308\n')
+
+    def test_numbers_split_across_reads(self):
+        # Every chunk size splits some of the numbers somewhere
+        expected = b' '.join(str(i / 7).encode() for i in range(50)) + b'\n'
+        output = b'\n'.join('{:.5f}'.format(i / 7).encode()
+                            for i in range(50))
+        self.assertSame(NUMERIC, output, expected)
+        self.assertDifferent(NUMERIC, output.replace(b'3.57143', b'3.58'),
+                             expected)
+
+class ConfigTest(unittest.TestCase):
+    INI = '''\
+[DEFAULT]
+rel_eps = 0.5
+
+[problem:P20000]
+checker = numeric
+abs_eps = 0.25
+'''
+
+    def _config(self, **args):
+        tmp = tempfile.TemporaryDirectory(prefix='jutge-test-')
+        self.addCleanup(tmp.cleanup)
+        path = Path(tmp.name) / 'config.ini'
+        path.write_text(self.INI)
+        args = dict({'checker': None, 'abs_eps': None, 'rel_eps': None},
+                    **args)
+        return ConfigFile(argparse.Namespace(config=str(path), **args))
+
+    def test_problem_section(self):
+        config = self._config()
+        self.assertEqual(checkers.from_config(config, 'P20000_en'),
+                         checkers.Checker(checkers.NUMERIC, 0.25, 0.5))
+        self.assertEqual(checkers.from_config(config, 'P30000_en'),
+                         checkers.EXACT_CHECKER)
+
+    def test_command_line_wins(self):
+        config = self._config(checker=checkers.TOKENS)
+        self.assertEqual(checkers.from_config(config, 'P20000_en'),
+                         checkers.make(checkers.TOKENS))
+        config = self._config(abs_eps=0.125)
+        self.assertEqual(checkers.from_config(config, 'P20000_en'),
+                         checkers.Checker(checkers.NUMERIC, 0.125, 0.5))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,31 @@
+import signal
+import subprocess
+import sys
+import unittest
+from JutgeTools._aux import client, commands
+
+class InteractiveTest(unittest.TestCase):
+    def test_interactive(self):
+        self.assertTrue(commands.is_interactive(['debug']))
+        self.assertTrue(commands.is_interactive(['dbg', '-d', 'lldb $exe']))
+        self.assertTrue(commands.is_interactive(['--config', 'x', 'prof']))
+
+    def test_batch(self):
+        self.assertFalse(commands.is_interactive([]))
+        self.assertFalse(commands.is_interactive(['test', 'debug']))
+        self.assertFalse(commands.is_interactive(['--config=debug', 't']))
+
+class ForwarderTest(unittest.TestCase):
+    def test_signal_before_pid(self):
+        proc = subprocess.Popen([sys.executable, '-c',
+                                 'import time; time.sleep(30)'])
+        self.addCleanup(proc.kill)
+        forwarder = client._Forwarder()
+        # Before the server says which process runs the command
+        forwarder(signal.SIGTERM, None)
+        self.assertIsNone(proc.poll())
+        forwarder.start(proc.pid)
+        self.assertEqual(proc.wait(10), -signal.SIGTERM)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,119 @@
+import random
+import unittest
+from JutgeTools._aux.diff import opcodes, unified_diff
+
+# Rebuild b from a and the opcodes, checking that they cover both whole
+def _apply(a, b, ops):
+    out = []
+    i = j = 0
+    for tag, i1, i2, j1, j2 in ops:
+        assert (i1, j1) == (i, j)
+        if tag == 'equal':
+            assert a[i1:i2] == b[j1:j2]
+            out.extend(a[i1:i2])
+        else:
+            assert tag == 'replace' or (tag == 'insert') == (i1 == i2)
+            out.extend(b[j1:j2])
+        i, j = i2, j2
+    assert (i, j) == (len(a), len(b))
+    return out
+
+def _lcs(a, b):
+    row = [0] * (len(b) + 1)
+    for x in a:
+        prev = row[:]
+        for j, y in enumerate(b):
+            row[j + 1] = prev[j] + 1 if x == y else max(row[j], prev[j + 1])
+    return row[-1]
+
+def _edits(ops):
+    return sum(i2 - i1 + j2 - j1 for tag, i1, i2, j1, j2 in ops
+               if tag != 'equal')
+
+class OpcodesTest(unittest.TestCase):
+    def test_empty(self):
+        self.assertEqual(opcodes([], []), [])
+        self.assertEqual(opcodes([], ['a', 'b']),
+                         [('insert', 0, 0, 0, 2)])
+        self.assertEqual(opcodes(['a', 'b'], []),
+                         [('delete', 0, 2, 0, 0)])
+
+    def test_identical(self):
+        a = ['a', 'b', 'c']
+        self.assertEqual(opcodes(a, list(a)), [('equal', 0, 3, 0, 3)])
+
+    def test_disjoint(self):
+        self.assertEqual(opcodes(['a', 'b', 'c'], ['x', 'y']),
+                         [('replace', 0, 3, 0, 2)])
+
+    def test_middle(self):
+        self.assertEqual(opcodes(list('abcd'), list('axcd')), [
+            ('equal', 0, 1, 0, 1), ('replace', 1, 2, 1, 2),
+            ('equal', 2, 4, 2, 4)])
+        self.assertEqual(opcodes(list('abc'), list('axyc')), [
+            ('equal', 0, 1, 0, 1), ('replace', 1, 2, 1, 3),
+            ('equal', 2, 3, 3, 4)])
+        self.assertEqual(opcodes(list('abcd'), list('ad')), [
+            ('equal', 0, 1, 0, 1), ('delete', 1, 3, 1, 1),
+            ('equal', 3, 4, 1, 2)])
+
+    def test_too_many_edits(self):
+        a, b = list('ab' * 50), list('ba' * 50)
+        self.assertEqual(opcodes(a, b, max_edits=1),
+                         [('replace', 0, 100, 0, 100)])
+        self.assertEqual(_apply(a, b, opcodes(a, b)), b)
+
+    def test_random(self):
+        rng = random.Random(1)
+        for _ in range(300):
+            a = [rng.choice('abc') for _ in range(rng.randrange(12))]
+            b = [rng.choice('abc') for _ in range(rng.randrange(12))]
+            ops = opcodes(a, b)
+            self.assertEqual(_apply(a, b, ops), b)
+            # Myers finds a shortest edit script
+            self.assertEqual(_edits(ops), len(a) + len(b) - 2 * _lcs(a, b))
+
+    def test_shortest(self):
+        # One insert and one delete, not a replacement of everything
+        ops = opcodes(list('xabcdef'), list('abcdefy'))
+        self.assertEqual(_edits(ops), 2)
+
+class UnifiedDiffTest(unittest.TestCase):
+    def test_no_difference(self):
+        self.assertEqual(unified_diff(['a'], ['a'], 'out', 'cor'), [])
+
+    def test_context(self):
+        a = list('abcdefghij')
+        b = list('abcdXfghij')
+        self.assertEqual(
+            unified_diff(a, b, 'out', 'cor', context=2, first_line=10), [
+                '--- out', '+++ cor', '@@ -13,5 +13,5 @@',
+                ' c', ' d', '-e', '+X', ' f', ' g'])
+
+    def test_separate_hunks(self):
+        a = list('abcdefghijkl')
+        b = list('Xbcdefghijkm')
+        lines = unified_diff(a, b, 'out', 'cor', context=1)
+        self.assertEqual(lines, [
+            '--- out', '+++ cor',
+            '@@ -1,2 +1,2 @@', '-a', '+X', ' b',
+            '@@ -11,2 +11,2 @@', ' k', '-l', '+m'])
+
+    def test_long_blocks(self):
+        lines = unified_diff(['x'] * 100, ['1', '2'], 'out', 'cor',
+                             max_lines=5)
+        self.assertEqual(lines, [
+            '--- out', '+++ cor', '@@ -1,100 +1,2 @@',
+            '-x', '-x', '-x', '-x', '-x', '... 95 more lines', '+1', '+2'])
+
+    def test_truncated(self):
+        # Both windows were cut: a difference at the end is only where
+        self.assertEqual(unified_diff(list('abc'), list('abd'), 'out', 'cor',
+                                      truncated=True), [])
+        lines = unified_diff(list('abcde'), list('aXcdf'), 'out', 'cor',
+                             truncated=True)
+        self.assertIn('+X', lines)
+        self.assertNotIn('+f', lines)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,74 @@
+import os
+import unittest
+from pathlib import Path
+from JutgeTools.download import download, download_many
+from JutgeTools._aux.errors import DownloadError
+from JutgeTools._aux.problem_cache import ProblemCache
+from .http_stub import HTTPStub, StubTestCase
+
+SAMPLE = {'sample.inp': b'1 2\n', 'sample.cor': b'3\n'}
+
+class DownloadTest(StubTestCase):
+    def setUp(self):
+        super().setUp()
+        for exercise in ('P10001_en', 'P10002_en', 'P10003_en'):
+            self.stub.add_problem(exercise, SAMPLE)
+        self.cache = ProblemCache(root=self.tmp / 'cache')
+
+    def _download(self, exercise, **kwargs):
+        download(exercise, skel_files=None, base_url=self.stub.base_url,
+                 cache=self.cache, **kwargs)
+
+    def assertExtracted(self, exercise):
+        for name, content in SAMPLE.items():
+            self.assertEqual((Path(exercise) / name).read_bytes(), content)
+
+    def test_download(self):
+        self._download('P10001_en')
+        self.assertExtracted('P10001_en')
+        self.assertEqual(self.stub.requests['/P10001_en/zip'], 1)
+        self.assertFalse(Path('P10001_en.zip').exists())
+
+    def test_revalidate_not_modified(self):
+        self._download('P10001_en')
+        os.rename('P10001_en', str(self.tmp / 'first'))
+        self._download('P10001_en', revalidate=True)
+        self.assertEqual(self.stub.requests['/P10001_en/zip'], 2)
+        self.assertEqual(self.stub.not_modified['/P10001_en/zip'], 1)
+        self.assertExtracted('P10001_en')
+
+    def test_offline_cache_hit(self):
+        self._download('P10001_en')
+        os.rename('P10001_en', str(self.tmp / 'first'))
+        self._download('P10001_en', offline=True)
+        self.assertEqual(self.stub.requests['/P10001_en/zip'], 1)
+        self.assertExtracted('P10001_en')
+
+    def test_offline_not_cached(self):
+        with self.assertRaises(DownloadError):
+            self._download('P10001_en', offline=True)
+        self.assertEqual(sum(self.stub.requests.values()), 0)
+
+    def test_other_server_not_shared(self):
+        self._download('P10001_en')
+        os.rename('P10001_en', str(self.tmp / 'first'))
+        with HTTPStub() as other:
+            with self.assertRaises(DownloadError):
+                download('P10001_en', skel_files=None,
+                         base_url=other.base_url, cache=self.cache)
+            self.assertEqual(other.requests['/P10001_en/zip'], 1)
+
+    def test_many_partial_failure(self):
+        exercises = ['P10001_en', 'P99999_en', 'P10002_en', 'P10003_en']
+        with self.assertRaises(DownloadError) as cm:
+            download_many(exercises, jobs=2, skel_files=None,
+                          base_url=self.stub.base_url, cache=self.cache)
+        self.assertIn('1 download(s) failed: P99999_en', str(cm.exception))
+        for exercise in ('P10001_en', 'P10002_en', 'P10003_en'):
+            self.assertExtracted(exercise)
+        self.assertFalse(Path('P99999_en').exists())
+        # 404 is not worth retrying
+        self.assertEqual(self.stub.requests['/P99999_en/zip'], 1)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,69 @@
+import os
+import tempfile
+import time
+import unittest
+from pathlib import Path
+from string import Template
+from JutgeTools._aux import pch
+
+class PreludeTest(unittest.TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory(prefix='jutge-test-')
+        self.addCleanup(tmp.cleanup)
+        self.tmp = Path(tmp.name)
+        old_cache = os.environ.get('XDG_CACHE_HOME')
+        os.environ['XDG_CACHE_HOME'] = str(self.tmp / 'xdg')
+        self.addCleanup(self._restore_env, old_cache)
+        self.addCleanup(pch._retried.clear)
+        self.source = self.tmp / 'main.cc'
+        self.source.write_text('#include <vector>\nint main() {}\n')
+        self.commands = []
+        self.fail = True
+
+    @staticmethod
+    def _restore_env(old_cache):
+        if old_cache is None:
+            del os.environ['XDG_CACHE_HOME']
+        else:
+            os.environ['XDG_CACHE_HOME'] = old_cache
+
+    # Stands for the compiler: fails, or writes the output, as told
+    def _substitute(self, compiler_tpl, output, flags, sources):
+        self.commands.append(output)
+        return 'false' if self.fail else 'touch {}'.format(output)
+
+    def _prelude(self, force=False):
+        return pch.precompiled_prelude(Template('c++ -o $output'), [],
+                                       [self.source], self._substitute,
+                                       verbose=False, force=force)
+
+    def _marker(self):
+        markers = list((self.tmp / 'xdg').glob('jutge-tools/pch/*/failed'))
+        return markers[0] if markers else None
+
+    def test_failure_is_remembered(self):
+        self.assertIsNone(self._prelude())
+        self.assertIsNone(self._prelude())
+        self.assertEqual(len(self.commands), 1)
+
+    def test_failure_expires(self):
+        self.assertIsNone(self._prelude())
+        old = time.time() - pch.FAILED_TTL - 1
+        os.utime(str(self._marker()), (old, old))
+        self.fail = False
+        self.assertIsNotNone(self._prelude())
+        self.assertEqual(len(self.commands), 2)
+        self.assertIsNone(self._marker())
+
+    def test_force_retries_once(self):
+        self.assertIsNone(self._prelude())
+        self.assertIsNone(self._prelude(force=True))
+        self.assertIsNone(self._prelude(force=True))
+        self.assertEqual(len(self.commands), 2)
+        self.fail = False
+        pch._retried.clear()  # As on another run
+        self.assertIsNotNone(self._prelude(force=True))
+        self.assertIsNone(self._marker())
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,59 @@
+import os
+import shutil
+import unittest
+from pathlib import Path
+from JutgeTools.pipeline import pipeline
+from JutgeTools._aux.errors import PipelineError
+from JutgeTools._aux.problem_cache import ProblemCache
+from .http_stub import StubTestCase
+
+# The skel main.cc prints nothing, so it passes a case with an empty .cor
+# and fails any other
+PASSING = {'sample.inp': b'1 2\n', 'sample.cor': b''}
+FAILING = {'sample.inp': b'1 2\n', 'sample.cor': b'3\n'}
+
+@unittest.skipIf(shutil.which('g++') is None, 'g++ is needed')
+class PipelineTest(StubTestCase):
+    def setUp(self):
+        super().setUp()
+        self.stub.add_problem('P10001_en', PASSING)
+        self.stub.add_problem('P10002_en', PASSING)
+        self.stub.add_problem('P10003_en', FAILING)
+        self.cache = ProblemCache(root=self.tmp / 'cache')
+
+    def _pipeline(self, exercises, **kwargs):
+        pipeline(exercises, jobs=1, base_url=self.stub.base_url,
+                 cache=self.cache, **kwargs)
+
+    def test_pipeline(self):
+        self._pipeline(['P10001_en', 'P10002_en'])
+        for exercise in ('P10001_en', 'P10002_en'):
+            self.assertTrue((Path(exercise) / 'main.cc').exists())
+            self.assertEqual(self.stub.requests['/{}/zip'.format(exercise)],
+                             1)
+
+    def test_partial_failure(self):
+        with self.assertRaises(PipelineError) as cm:
+            self._pipeline(['P10001_en', 'P99999_en', 'P10003_en'])
+        # In the order they finish
+        message = str(cm.exception)
+        self.assertIn('2 of 3 exercises failed: ', message)
+        failed = message.split(': ', 1)[1].split(', ')
+        self.assertEqual(sorted(failed), ['P10003_en', 'P99999_en'])
+        # The failures do not stop the rest of the set
+        self.assertTrue((Path('P10001_en') / 'sample.inp').exists())
+
+    def test_existing_not_downloaded(self):
+        self._pipeline(['P10001_en'])
+        self._pipeline(['P10001_en'])
+        self.assertEqual(self.stub.requests['/P10001_en/zip'], 1)
+
+    def test_offline_cache_hit(self):
+        self._pipeline(['P10001_en'])
+        os.rename('P10001_en', str(self.tmp / 'first'))
+        self._pipeline(['P10001_en'], offline=True)
+        self.assertEqual(self.stub.requests['/P10001_en/zip'], 1)
+        self.assertTrue((Path('P10001_en') / 'sample.inp').exists())
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,86 @@
+import os
+import shutil
+import subprocess
+import tempfile
+import unittest
+from pathlib import Path
+from JutgeTools._aux import runner
+
+MIB = 1024 * 1024
+
+PROGRAMS = {
+    'echo': '#include <iostream>\n'
+            'int main() { int x; std::cin >> x; std::cout << x << "\\n"; }\n',
+    # Mapped at exec, not allocated
+    'static': 'static char a[1 << 30];\n'
+              'int main() { for (int i = 0; i < (1 << 30); i += 4096)'
+              ' a[i] = 1; return a[4096] - 1; }\n',
+    'alloc': '#include <vector>\n'
+             'int main() { std::vector<char> v(64 << 20, 1);'
+             ' return v[5] - 1; }\n',
+    'spin': 'int main() { volatile unsigned long x = 0; for (;;) ++x; }\n',
+}
+
+@unittest.skipIf(shutil.which('g++') is None, 'g++ is needed')
+class RunCaseTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        tmp = tempfile.TemporaryDirectory(prefix='jutge-test-')
+        cls._tmp = tmp
+        cls.tmp = Path(tmp.name)
+        cls._old_cache = os.environ.get('XDG_CACHE_HOME')
+        os.environ['XDG_CACHE_HOME'] = str(cls.tmp / 'xdg')
+        for name, source in PROGRAMS.items():
+            src = cls.tmp / (name + '.cc')
+            src.write_text(source)
+            subprocess.check_call(['g++', '-O1', '-o',
+                                   str(cls.tmp / (name + '.x')), str(src)])
+        (cls.tmp / 'case.inp').write_bytes(b'5\n')
+        (cls.tmp / 'case.cor').write_bytes(b'5\n')
+
+    @classmethod
+    def tearDownClass(cls):
+        if cls._old_cache is None:
+            del os.environ['XDG_CACHE_HOME']
+        else:
+            os.environ['XDG_CACHE_HOME'] = cls._old_cache
+        cls._tmp.cleanup()
+
+    def _run(self, name, limits=runner.DEFAULT_LIMITS, corfile=None):
+        return runner.run_case(self.tmp / (name + '.x'),
+                               self.tmp / 'case.inp', corfile,
+                               limits=limits, forward_stderr=False)
+
+    def test_short_run_has_rss(self):
+        # Only the program counts, not this process
+        for _ in range(20):
+            result = self._run('echo', corfile=self.tmp / 'case.cor')
+            self.assertEqual(result.verdict, runner.ACCEPTED)
+            self.assertIsNotNone(result.usage.rss)
+            self.assertLess(result.usage.rss, 16 * MIB)
+
+    def test_peak_rss(self):
+        result = self._run('alloc')
+        self.assertEqual(result.verdict, runner.ACCEPTED)
+        self.assertGreaterEqual(result.usage.rss, 64 * MIB)
+
+    def test_memory_limit_allocation(self):
+        result = self._run('alloc', runner.Limits(10.0, None, 32 * MIB))
+        self.assertEqual(result.verdict, runner.MEMORY_LIMIT_EXCEEDED)
+
+    def test_memory_limit_static(self):
+        result = self._run('static', runner.Limits(10.0, None, 256 * MIB))
+        self.assertEqual(result.verdict, runner.MEMORY_LIMIT_EXCEEDED)
+
+    def test_cpu_limit(self):
+        result = self._run('spin', runner.Limits(10.0, 1.0, None))
+        self.assertEqual(result.verdict, runner.TIME_LIMIT_EXCEEDED)
+        self.assertLess(result.usage.cpu, 3.0)
+
+    def test_wall_limit(self):
+        result = self._run('spin', runner.Limits(0.3, None, None))
+        self.assertEqual(result.verdict, runner.TIME_LIMIT_EXCEEDED)
+        self.assertIsNotNone(result.usage.rss)
+
+if __name__ == '__main__':
+    unittest.main()